@@ -0,0 +1,115 @@
+import contextlib
+import copy
+import json
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: bloqueo con msvcrt sobre el primer byte del archivo de bloqueo
+    fcntl = None
+    import msvcrt
+
+# Almacén compartido de los archivos JSON de configuración que edita config_app.py (pestañas de CLIENTS/dms,
+# configuración de cada cliente, database.json y config.json):
+# - las lecturas se guardan en memoria y se reutilizan mientras el archivo no cambie (mtime y tamaño)
+# - las escrituras se hacen en un archivo temporal que reemplaza al original con os.replace, bajo un bloqueo de archivo
+#   (<archivo>.lock), así los workers de gunicorn no mezclan sus escrituras y nadie lee un archivo a medio escribir
+carpeta_dms = os.path.join('CLIENTS', 'dms')
+cache = {}
+lock_cache = threading.Lock()
+
+# Función para obtener la ruta del JSON de una pestaña
+def ruta_tab(tab_name):
+    return os.path.join(carpeta_dms, f'{tab_name}.json')
+
+# Función para obtener la ruta del JSON de configuración de un cliente
+def ruta_cliente(client_name):
+    return os.path.join('CLIENTS', client_name, 'Config', 'config.json')
+
+# Función para obtener la versión de un archivo (mtime en nanosegundos y tamaño), o None si no existe
+def version_archivo(ruta):
+    try:
+        estado = os.stat(ruta)
+    except FileNotFoundError:
+        return None
+    return estado.st_mtime_ns, estado.st_size
+
+# Función para leer un JSON con cache en memoria. Regresa defecto si el archivo no existe.
+# Regresa una copia del objeto en cache, así una ruta que la modifique no altera lo que leen las demás peticiones
+# (para guardar cambios se usa editar_json)
+def leer_json(ruta, defecto=None):
+    version = version_archivo(ruta)
+    if version is None:
+        with lock_cache:
+            cache.pop(ruta, None)
+        return defecto
+    with lock_cache:
+        guardado = cache.get(ruta)
+    if guardado and guardado[0] == version:
+        return copy.deepcopy(guardado[1])
+    with open(ruta, 'r') as f:
+        datos = json.load(f)
+    with lock_cache:
+        cache[ruta] = (version, copy.deepcopy(datos))
+    return datos
+
+# Bloqueo exclusivo entre procesos sobre <ruta>.lock mientras dura el bloque
+@contextlib.contextmanager
+def bloquear_archivo(ruta):
+    with open(f'{ruta}.lock', 'a+') as archivo_lock:
+        if fcntl:
+            fcntl.flock(archivo_lock, fcntl.LOCK_EX)
+        else:
+            archivo_lock.seek(0)
+            msvcrt.locking(archivo_lock.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(archivo_lock, fcntl.LOCK_UN)
+            else:
+                archivo_lock.seek(0)
+                msvcrt.locking(archivo_lock.fileno(), msvcrt.LK_UNLCK, 1)
+
+# Función para escribir un JSON completo con un archivo temporal y os.replace. Se llama con el bloqueo del archivo tomado
+def escribir_json_sin_lock(ruta, datos):
+    temporal = f'{ruta}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(temporal, 'w') as f:
+            json.dump(datos, f, indent=4)
+        os.replace(temporal, ruta)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temporal)
+        raise
+    with lock_cache:
+        cache[ruta] = (version_archivo(ruta), copy.deepcopy(datos))
+
+# Función para reemplazar un JSON completo
+def escribir_json(ruta, datos):
+    with bloquear_archivo(ruta):
+        escribir_json_sin_lock(ruta, datos)
+
+# Leer, modificar y guardar un JSON sin que otro proceso escriba en medio. Entrega una copia recién leída del
+# archivo (o defecto si no existe) y al salir del bloque la guarda solo si cambió; si el bloque lanza una excepción
+# no se guarda nada:
+#     with editar_json(ruta_tab(tab_name)) as config:
+#         config['reportes'].append(reporte)
+@contextlib.contextmanager
+def editar_json(ruta, defecto=None):
+    # Sin archivo ni valor por defecto no hay nada que guardar, ni archivo de bloqueo que crear
+    if defecto is None and not os.path.exists(ruta):
+        yield None
+        return
+    with bloquear_archivo(ruta):
+        if os.path.exists(ruta):
+            with open(ruta, 'r') as f:
+                datos = json.load(f)
+        else:
+            datos = defecto
+        original = json.dumps(datos, indent=4)
+        yield datos
+        if datos is not None and json.dumps(datos, indent=4) != original:
+            escribir_json_sin_lock(ruta, datos)
@@ -1,12 +1,30 @@
 import pandas as pd
 import zipfile
+import io
 import os
+import shutil
 import re
 import json
+import argparse
+import codecs
+import gzip
+import hashlib
+import importlib.util
+import csv
+import contextlib
+import decimal
+import threading
+import time
+import queue
+import signal
+import chardet
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from datetime import datetime
 import psycopg2
 from psycopg2 import Error
+from psycopg2.pool import ThreadedConnectionPool
 import logging
+from metricas import MetricasReporte, MetricasZip, escribir_jsonl, escribir_prometheus
 
 # Configuración del logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -28,6 +46,44 @@ sandbx = config.get('sandbx')
 reportes = config.get('reportes', [])
 db_config = config.get('db', {})
 columnas_esperadas = config.get('columnas_esperadas', {})
+tamano_lote_copy = config.get('tamano_lote_copy', 50000)
+leer_zip_directo = config.get('leer_zip_directo', False)
+guardar_txt_extraido = config.get('guardar_txt_extraido', False)
+modo_lote = config.get('modo_lote', False)
+trabajadores_lote = config.get('trabajadores_lote') or os.cpu_count()
+reportes_paralelos = config.get('reportes_paralelos', 1)
+muestra_codificacion = config.get('muestra_codificacion', 65536)
+cache_codificaciones = config.get('cache_codificaciones', 'codificaciones.json')
+inferir_tipos = config.get('inferir_tipos', True)
+muestra_tipos = config.get('muestra_tipos', 1000)
+omitir_sin_cambios = config.get('omitir_sin_cambios', True)
+tablas_particionadas = config.get('tablas_particionadas', False)
+filas_por_insert_dump = config.get('filas_por_insert_dump', 1000)
+compresion_dump = config.get('compresion_dump')
+salida_parquet = config.get('salida_parquet')
+memoria_reporte_mb = config.get('memoria_reporte_mb')
+archivo_metricas = config.get('archivo_metricas', 'metricas.jsonl')
+carpeta_prometheus = config.get('carpeta_prometheus')
+modo_demonio = config.get('modo_demonio', False)
+intervalo_sondeo = config.get('intervalo_sondeo', 5)
+espera_archivo_estable = config.get('espera_archivo_estable', 1)
+cache_planes = config.get('cache_planes', 'planes_carga.json')
+motor_limpieza = config.get('motor_limpieza', 'pandas')
+motor_formulas = config.get('motor_formulas', 'pandas')
+particionar_por_fecha = config.get('particionar_por_fecha', False)
+
+# Si se indica una pestaña, los reportes y sus columnas se leen de CLIENTS/dms/<tab>.json (el archivo que edita config_app.py)
+tab = config.get('tab')
+if tab:
+    ruta_tab = os.path.join('CLIENTS', 'dms', f'{tab}.json')
+    try:
+        with open(ruta_tab, 'r', encoding='utf-8') as tab_file:
+            config_tab = json.load(tab_file)
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        logging.error(f"No se pudo leer la configuración de la pestaña '{ruta_tab}': {e}")
+        exit()
+    reportes = config_tab.get('reportes', [])
+    columnas_esperadas = config_tab.get('columnas_esperadas', {})
 
 if not workng_dir or not sandbx or not reportes or not db_config:
     logging.error("Configuración incompleta en 'config.json'.")
@@ -48,6 +104,23 @@ def conectar_db(host, usuario, contrasena, base_de_datos):
         logging.error(f"Error al conectar a la base de datos: {e}")
         return None
 
+# Función para crear un pool de conexiones acotado a 'maximo' conexiones (una por hilo)
+def conectar_pool(host, usuario, contrasena, base_de_datos, maximo):
+    try:
+        pool = ThreadedConnectionPool(
+            1,
+            maximo,
+            host=host,
+            user=usuario,
+            password=contrasena,
+            database=base_de_datos
+        )
+        logging.info(f"Pool de conexiones a la base de datos establecido ({maximo} conexiones).")
+        return pool
+    except Error as e:
+        logging.error(f"Error al conectar a la base de datos: {e}")
+        return None
+
 # Función para ejecutar una consulta SQL
 def ejecutar_consulta(conexion, consulta):
     #print(f'Consulta: {consulta}')
@@ -57,8 +130,285 @@ def ejecutar_consulta(conexion, consulta):
         conexion.commit()
         logging.info("Consulta ejecutada con éxito.")
     except Error as e:
+        conexion.rollback()
         logging.error(f"Error al ejecutar la consulta: {e}")
 
+# Función para crear la tabla del manifiesto de cargas si no existe. Se llama una sola vez al arrancar, antes de
+# los procesos del modo lote: CREATE TABLE IF NOT EXISTS concurrentes fallan con llave duplicada en pg_type.
+# El manifiesto va por tabla destino, porque los clientes de una misma sucursal cargan la misma tabla <reporte><sucursal>
+def crear_manifiesto(conexion):
+    # El manifiesto anterior, por (cliente, sucursal, reporte), no sabe quién cargó al último cada tabla: se
+    # descarta y cada reporte se vuelve a cargar una vez
+    columnas = tipos_tabla(conexion, 'manifiesto_carga')
+    if columnas and 'tabla' not in columnas:
+        ejecutar_consulta(conexion, "DROP TABLE manifiesto_carga;")
+    ejecutar_consulta(conexion, (
+        "CREATE TABLE IF NOT EXISTS manifiesto_carga (\n"
+        "    tabla VARCHAR(255) PRIMARY KEY,\n"
+        "    cliente VARCHAR(255) NOT NULL,\n"
+        "    sucursal VARCHAR(255) NOT NULL,\n"
+        "    reporte VARCHAR(255) NOT NULL,\n"
+        "    huella VARCHAR(64) NOT NULL,\n"
+        "    cargado_en TIMESTAMP NOT NULL DEFAULT now()\n"
+        ");"
+    ))
+
+# Función para saber si la última carga de la tabla fue este mismo reporte (cliente, sucursal y huella)
+# y la tabla sigue existiendo
+def reporte_sin_cambios(conexion, cliente, sucursal, reporte, nombre_tabla, huella):
+    try:
+        cursor = conexion.cursor()
+        cursor.execute(
+            "SELECT cliente = %s AND sucursal = %s AND reporte = %s AND huella = %s AND to_regclass(tabla) IS NOT NULL "
+            "FROM manifiesto_carga WHERE tabla = %s;",
+            (cliente, sucursal, reporte, huella, nombre_tabla)
+        )
+        fila = cursor.fetchone()
+        conexion.commit()
+        return bool(fila and fila[0])
+    except Error as e:
+        conexion.rollback()
+        logging.warning(f"No se pudo consultar el manifiesto de cargas: {e}")
+        return False
+
+# Función para registrar en el manifiesto quién cargó la tabla al último y con qué huella
+def registrar_carga(conexion, cliente, sucursal, reporte, nombre_tabla, huella):
+    try:
+        cursor = conexion.cursor()
+        cursor.execute(
+            "INSERT INTO manifiesto_carga (tabla, cliente, sucursal, reporte, huella) VALUES (%s, %s, %s, %s, %s) "
+            "ON CONFLICT (tabla) DO UPDATE SET cliente = EXCLUDED.cliente, sucursal = EXCLUDED.sucursal, "
+            "reporte = EXCLUDED.reporte, huella = EXCLUDED.huella, cargado_en = now();",
+            (nombre_tabla, cliente, sucursal, reporte, huella)
+        )
+        conexion.commit()
+    except Error as e:
+        conexion.rollback()
+        logging.warning(f"No se pudo registrar la carga en el manifiesto: {e}")
+
+# Función para crear el manifiesto de cargas con una conexión propia, antes de procesar los ZIP
+def preparar_manifiesto():
+    conexion = conectar_db(db_config.get('host', ''), db_config.get('usuario', ''), db_config.get('contrasena', ''), db_config.get('base_de_datos', ''))
+    if conexion:
+        try:
+            crear_manifiesto(conexion)
+        finally:
+            conexion.close()
+
+# Función para citar un identificador SQL solo cuando lo necesita (espacios, acentos, etc.)
+def identificador_sql(nombre):
+    if re.fullmatch(r'[A-Za-z_][A-Za-z0-9_$]*', nombre):
+        return nombre
+    return '"' + nombre.replace('"', '""') + '"'
+
+# Función para convertir un valor en una literal SQL (NULL para valores nulos)
+def literal_sql(valor):
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+        return 'NULL'
+    return "'" + str(valor).replace("'", "''") + "'"
+
+# Función para convertir una columna completa en literales SQL de forma vectorizada (NULL para valores nulos)
+def literales_sql(serie):
+    texto = serie.astype(str).str.replace("'", "''", regex=False)
+    return ("'" + texto + "'").where(serie.notna(), 'NULL')
+
+# Función para construir la sentencia COPY FROM STDIN de una tabla
+def sentencia_copy(nombre_tabla, columnas):
+    lista_columnas = ', '.join(identificador_sql(c) for c in columnas)
+    return f"COPY {nombre_tabla} ({lista_columnas}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+
+# Función para enviar un DataFrame con COPY FROM STDIN en lotes de tamano_lote filas, sin confirmar la transacción
+def copiar_lotes(cursor, nombre_tabla, df, tamano_lote=None):
+    tamano_lote = tamano_lote or tamano_lote_copy
+    consulta = sentencia_copy(nombre_tabla, df.columns)
+    for inicio in range(0, len(df), tamano_lote):
+        buffer = io.StringIO()
+        df.iloc[inicio:inicio + tamano_lote].to_csv(buffer, header=False, index=False, na_rep='\\N')
+        buffer.seek(0)
+        cursor.copy_expert(consulta, buffer)
+
+# Función para enviar con COPY un DataFrame o una secuencia de bloques de filas. Regresa el número de filas enviadas
+# Con expresiones ({columna: expresión SQL}, ver expresiones_sql) las filas se copian como texto a una tabla temporal
+# y se insertan con INSERT ... SELECT, aplicando la limpieza y las fórmulas dentro de la base de datos
+def copiar_datos(cursor, nombre_tabla, datos, expresiones=None):
+    bloques = [datos] if isinstance(datos, pd.DataFrame) else datos
+    destino = f"{nombre_tabla}_crudo" if expresiones else nombre_tabla
+    filas = 0
+    columnas = None
+    for df in bloques:
+        if expresiones and columnas is None:
+            definicion = ', '.join(f"{identificador_sql(c)} TEXT" for c in df.columns)
+            cursor.execute(f"CREATE TEMP TABLE {destino} ({definicion}) ON COMMIT DROP;")
+        copiar_lotes(cursor, destino, df)
+        filas += len(df)
+        columnas = df.columns
+    if expresiones and columnas is not None:
+        lista_columnas = ', '.join(identificador_sql(c) for c in expresiones)
+        seleccion = ', '.join(expresiones.values())
+        cursor.execute(f"INSERT INTO {nombre_tabla} ({lista_columnas}) SELECT {seleccion} FROM {destino};")
+    return filas
+
+# Función para cargar un reporte en una tabla de staging UNLOGGED y reemplazar la tabla final con un rename.
+# Todo ocurre en una sola transacción: los lectores ven la tabla anterior completa hasta el COMMIT
+# y, si algo falla, la tabla anterior queda intacta. df puede ser un DataFrame o una secuencia de bloques
+def cargar_con_staging(conexion, nombre_tabla, definicion_columnas, df, indices=(), expresiones=None):
+    staging = f"{nombre_tabla}_stg"
+    try:
+        cursor = conexion.cursor()
+        cursor.execute("SET LOCAL datestyle TO 'ISO, DMY';")
+        cursor.execute(f"DROP TABLE IF EXISTS {staging};")
+        cursor.execute(f"CREATE UNLOGGED TABLE {staging} (\n{definicion_columnas}\n);")
+        filas = copiar_datos(cursor, staging, df, expresiones)
+
+        # La tabla final debe sobrevivir a una caída del servidor: se registra en el WAL una sola vez, ya cargada
+        cursor.execute(f"ALTER TABLE {staging} SET LOGGED;")
+        for i, columnas_indice in enumerate(indices):
+            lista_columnas = ', '.join(identificador_sql(c) for c in columnas_indice)
+            cursor.execute(f"CREATE INDEX {staging}_idx{i} ON {staging} ({lista_columnas});")
+
+        # Intercambio: el bloqueo sobre la tabla final solo se toma en este punto y se libera con el COMMIT
+        cursor.execute(f"DROP TABLE IF EXISTS {nombre_tabla};")
+        cursor.execute(f"ALTER TABLE {staging} RENAME TO {nombre_tabla};")
+        for i in range(len(indices)):
+            cursor.execute(f"ALTER INDEX {staging}_idx{i} RENAME TO {nombre_tabla}_idx{i};")
+        conexion.commit()
+        logging.info(f"{filas} filas cargadas con COPY en {nombre_tabla} a través de {staging}.")
+        return True
+    except Error as e:
+        conexion.rollback()
+        logging.error(f"Error al cargar {nombre_tabla} a través de {staging}: {e}")
+        return False
+
+# Función para obtener el nombre con el que PostgreSQL guarda una columna (los identificadores sin comillas van en minúsculas)
+def nombre_catalogo(columna):
+    return columna.lower() if identificador_sql(columna) == columna else columna
+
+# Función para obtener los tipos de las columnas de una tabla existente ({} si la tabla no existe)
+def tipos_tabla(conexion, nombre_tabla):
+    try:
+        cursor = conexion.cursor()
+        cursor.execute(
+            "SELECT attname, format_type(atttypid, atttypmod) FROM pg_attribute "
+            "WHERE attrelid = to_regclass(%s) AND attnum > 0 AND NOT attisdropped;",
+            (nombre_tabla,)
+        )
+        tipos = dict(cursor.fetchall())
+        conexion.commit()
+        return tipos
+    except Error as e:
+        conexion.rollback()
+        logging.warning(f"No se pudieron consultar las columnas de {nombre_tabla}: {e}")
+        return {}
+
+# Función para armar el nombre de una partición a partir de un valor (solo letras, dígitos y guion bajo)
+def sufijo_particion(valor):
+    return re.sub(r'\W', '_', valor)
+
+# Función para ubicar la partición de una carga: regresa (tabla padre, partición, valor de la partición)
+def nombre_particion(reporte, cliente, sucursal, fecha_actual):
+    tabla_cliente = f"{reporte}_c{sufijo_particion(cliente)}"
+    tabla_sucursal = f"{tabla_cliente}_s{sufijo_particion(sucursal)}"
+    if particionar_por_fecha:
+        fecha_iso = datetime.strptime(fecha_actual, '%d/%m/%Y').strftime('%Y-%m-%d')
+        return tabla_sucursal, f"{tabla_sucursal}_d{fecha_iso.replace('-', '')}", fecha_iso
+    return tabla_cliente, tabla_sucursal, sucursal
+
+# Función para obtener el nombre de catálogo de la columna de una línea de definicion_columnas
+def columna_definicion(definicion):
+    nombre = re.match(r'\s*("(?:[^"]|"")*"|\S+)', definicion).group(1)
+    if nombre.startswith('"'):
+        return nombre[1:-1].replace('""', '"')
+    return nombre.lower()
+
+# Función para crear la tabla consolidada {reporte}, sus columnas nuevas, los niveles intermedios de cliente y sucursal
+# y los índices. Va en su propia transacción, serializada por reporte con un advisory lock: en el modo lote varios
+# procesos cargan el mismo reporte a la vez y CREATE TABLE IF NOT EXISTS concurrentes fallan con llave duplicada en
+# pg_type. El bloqueo se libera con el COMMIT, así que la carga de los datos sigue siendo concurrente
+def preparar_particion(conexion, reporte, cliente, sucursal, definicion_columnas, indices=()):
+    tabla_cliente = f"{reporte}_c{sufijo_particion(cliente)}"
+    tabla_sucursal = f"{tabla_cliente}_s{sufijo_particion(sucursal)}"
+    try:
+        cursor = conexion.cursor()
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s));", (reporte,))
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {reporte} (\n{definicion_columnas}\n) PARTITION BY LIST (Client);")
+
+        # Las columnas nuevas de la configuración se agregan a todas las particiones. Solo se altera la tabla si falta
+        # alguna: ALTER TABLE espera a las cargas en curso del reporte aunque la columna ya exista
+        cursor.execute(
+            "SELECT attname FROM pg_attribute WHERE attrelid = to_regclass(%s) AND attnum > 0 AND NOT attisdropped;",
+            (reporte,)
+        )
+        existentes = {fila[0] for fila in cursor.fetchall()}
+        for definicion in definicion_columnas.split(',\n'):
+            if columna_definicion(definicion) not in existentes:
+                cursor.execute(f"ALTER TABLE {reporte} ADD COLUMN IF NOT EXISTS {definicion.strip()};")
+
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {tabla_cliente} PARTITION OF {reporte} "
+            f"FOR VALUES IN ({literal_sql(cliente)}) PARTITION BY LIST (Branch);"
+        )
+        if particionar_por_fecha:
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {tabla_sucursal} PARTITION OF {tabla_cliente} "
+                f"FOR VALUES IN ({literal_sql(sucursal)}) PARTITION BY LIST (Date);"
+            )
+        for i, columnas_indice in enumerate(indices):
+            lista_columnas = ', '.join(identificador_sql(c) for c in columnas_indice)
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {reporte}_idx{i} ON {reporte} ({lista_columnas});")
+        conexion.commit()
+        return True
+    except Error as e:
+        conexion.rollback()
+        logging.error(f"Error al preparar la tabla consolidada {reporte} para {cliente}/{sucursal}: {e}")
+        return False
+
+# Función para cargar un reporte en la tabla consolidada {reporte}, particionada por LIST (Client) y LIST (Branch)
+# y, si se configura, por LIST (Date). Solo se reemplaza la partición de la carga con DETACH/ATTACH,
+# en una sola transacción y pasando por una tabla de staging UNLOGGED; la estructura común se crea antes con
+# preparar_particion. df puede ser un DataFrame o una secuencia de bloques.
+# Regresa el nombre de la partición cargada o None
+def cargar_particion(conexion, reporte, cliente, sucursal, fecha_actual, definicion_columnas, df, indices=(), expresiones=None):
+    padre, particion, valor = nombre_particion(reporte, cliente, sucursal, fecha_actual)
+    staging = f"{particion}_stg"
+    if not preparar_particion(conexion, reporte, cliente, sucursal, definicion_columnas, indices):
+        return None
+    try:
+        cursor = conexion.cursor()
+        cursor.execute("SET LOCAL datestyle TO 'ISO, DMY';")
+
+        # Staging con las mismas columnas que la tabla consolidada
+        cursor.execute(f"DROP TABLE IF EXISTS {staging};")
+        cursor.execute(f"CREATE UNLOGGED TABLE {staging} (LIKE {reporte} INCLUDING DEFAULTS);")
+        filas = copiar_datos(cursor, staging, df, expresiones)
+        cursor.execute(f"ALTER TABLE {staging} SET LOGGED;")
+        for i, columnas_indice in enumerate(indices):
+            lista_columnas = ', '.join(identificador_sql(c) for c in columnas_indice)
+            cursor.execute(f"CREATE INDEX {staging}_idx{i} ON {staging} ({lista_columnas});")
+
+        # El CHECK equivalente a los límites de la partición evita que ATTACH recorra la tabla para validarla
+        condicion = f"Client = {literal_sql(cliente)} AND Branch = {literal_sql(sucursal)}"
+        if particionar_por_fecha:
+            condicion += f" AND Date = {literal_sql(valor)}"
+        cursor.execute(f"ALTER TABLE {staging} ADD CONSTRAINT {staging}_limites CHECK ({condicion});")
+
+        # Intercambio de la partición
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL;", (particion,))
+        if cursor.fetchone()[0]:
+            cursor.execute(f"ALTER TABLE {padre} DETACH PARTITION {particion};")
+            cursor.execute(f"DROP TABLE {particion};")
+        cursor.execute(f"ALTER TABLE {staging} RENAME TO {particion};")
+        for i in range(len(indices)):
+            cursor.execute(f"ALTER INDEX {staging}_idx{i} RENAME TO {particion}_idx{i};")
+        cursor.execute(f"ALTER TABLE {padre} ATTACH PARTITION {particion} FOR VALUES IN ({literal_sql(valor)});")
+        cursor.execute(f"ALTER TABLE {particion} DROP CONSTRAINT {staging}_limites;")
+        conexion.commit()
+        logging.info(f"{filas} filas cargadas con COPY en la partición {particion} de {reporte}.")
+        return particion
+    except Error as e:
+        conexion.rollback()
+        logging.error(f"Error al cargar la partición {particion} de {reporte}: {e}")
+        return None
+
 # Función para limpiar el contenido de una carpeta
 def limpiar_carpeta(carpeta):
     for archivo in os.listdir(carpeta):
@@ -67,26 +417,85 @@ def limpiar_carpeta(carpeta):
             if os.path.isfile(ruta_archivo):
                 os.remove(ruta_archivo)
             elif os.path.isdir(ruta_archivo):
-                os.rmdir(ruta_archivo)  # Para carpetas vacías
+                limpiar_carpeta(ruta_archivo)  # Subcarpetas por ZIP del modo lote
+                os.rmdir(ruta_archivo)
         except Exception as e:
             logging.error(f"No se pudo eliminar {ruta_archivo}: {e}")
 
-# Limpiar la carpeta Sandbx
-limpiar_carpeta(sandbx)
-
-#Limpia encabezados basura de los reportes
-def limpiar_encabezado(reporte):
-    # Divide el reporte en líneas
-    lines = reporte.strip().splitlines()
-    
-    # Encuentra la primera línea que contiene un separador '|'
-    for i, line in enumerate(lines):
-        if '|' in line:
-            # Retorna todas las líneas a partir de la primera línea válida
-            return '\n'.join(lines[i:])
-    
-    # Si no se encuentra una línea válida, retorna una cadena vacía
-    return ''
+# Caracteres que se leen por bloque al buscar el encabezado y al entregar el reporte al parser
+tamano_bloque_lectura = 1 << 20
+
+# Lector de texto que entrega un reporte al parser a partir de su encabezado, sin leerlo completo de una vez.
+# El encabezado es la primera línea con un separador '|': se busca con find en bloques del inicio, así que solo se
+# recorre la basura que lo precede, y el parser empieza en ese desplazamiento. Los saltos de página (\f) cuentan como
+# saltos de línea y las líneas que coinciden con el patrón de basura del reporte (pies, encabezados de página) se
+# quitan de cada bloque. texto es el reporte ya decodificado (str) o un stream de texto
+class LectorReporte(io.TextIOBase):
+    def __init__(self, texto, basura=None):
+        self.texto = texto
+        self.posicion = 0
+        self.basura = re.compile(basura, re.MULTILINE) if basura else None
+        self.pendiente = ''
+        self.terminado = False
+        self.buffer = ''
+        self.primera_linea = self.buscar_encabezado()
+
+    def readable(self):
+        return True
+
+    # Leer caracteres de la fuente, sea un str o un stream
+    def leer_fuente(self, tamano):
+        if isinstance(self.texto, str):
+            parte = self.texto[self.posicion:self.posicion + tamano]
+            self.posicion += len(parte)
+            return parte
+        return self.texto.read(tamano)
+
+    # Leer el siguiente bloque de líneas completas, sin saltos de página ni líneas basura
+    def leer_bloque(self):
+        while True:
+            parte = self.leer_fuente(tamano_bloque_lectura)
+            if not parte:
+                self.terminado = True
+                bloque, self.pendiente = self.pendiente, ''
+                break
+            datos = self.pendiente + parte
+            corte = datos.rfind('\n') + 1
+            if corte:
+                bloque, self.pendiente = datos[:corte], datos[corte:]
+                break
+            self.pendiente = datos
+        if '\f' in bloque:
+            bloque = bloque.replace('\f', '\n')
+        if self.basura:
+            bloque = self.basura.sub('', bloque)
+        return bloque
+
+    # Descartar la basura hasta la primera línea con '|' y regresarla sin espacios ('' si no hay ninguna)
+    def buscar_encabezado(self):
+        while not self.terminado:
+            bloque = self.leer_bloque()
+            separador = bloque.find('|')
+            if separador >= 0:
+                inicio = max(bloque.rfind('\n', 0, separador), bloque.rfind('\r', 0, separador)) + 1
+                self.buffer = bloque[inicio:]
+                fin = self.buffer.find('\n')
+                return (self.buffer if fin < 0 else self.buffer[:fin]).strip()
+        return ''
+
+    def read(self, tamano=-1):
+        partes = [self.buffer]
+        largo = len(self.buffer)
+        while not self.terminado and (tamano is None or tamano < 0 or largo < tamano):
+            bloque = self.leer_bloque()
+            partes.append(bloque)
+            largo += len(bloque)
+        texto = ''.join(partes)
+        if tamano is None or tamano < 0:
+            self.buffer = ''
+            return texto
+        self.buffer = texto[tamano:]
+        return texto[:tamano]
 
 # Encontrar el archivo ZIP en la carpeta de trabajo
 def encontrar_zip(carpeta):
@@ -95,97 +504,382 @@ def encontrar_zip(carpeta):
             return os.path.join(carpeta, archivo)
     raise FileNotFoundError("No se encontró ningún archivo ZIP en la carpeta de trabajo.")
 
-# Extraer nombre del archivo ZIP
-def extraer_info_zip(nombre_zip):
+# Encontrar todos los archivos ZIP en la carpeta de trabajo (modo lote)
+def encontrar_zips(carpeta):
+    zips = sorted(os.path.join(carpeta, archivo) for archivo in os.listdir(carpeta) if archivo.endswith('.zip'))
+    if not zips:
+        raise FileNotFoundError("No se encontró ningún archivo ZIP en la carpeta de trabajo.")
+    return zips
+
+# Separar cliente, sucursal y fecha del nombre del archivo ZIP (CCCCBB<fecha>.zip)
+def parsear_nombre_zip(nombre_zip):
     nombre_sin_ext = os.path.splitext(os.path.basename(nombre_zip))[0]
-    cliente = nombre_sin_ext[:4]
-    sucursal = nombre_sin_ext[4:6]
-    fecha_zip = nombre_sin_ext[6:]
+    return nombre_sin_ext[:4], nombre_sin_ext[4:6], nombre_sin_ext[6:]
+
+# Extraer nombre del archivo ZIP
+def extraer_info_zip(nombre_zip, carpeta=None):
+    carpeta = carpeta or sandbx
+    cliente, sucursal, fecha_zip = parsear_nombre_zip(nombre_zip)
     fecha_actual = datetime.now().strftime('%d/%m/%Y')
-    with open(os.path.join(sandbx, 'Client.txt'), 'w', encoding='utf-8') as f:
+    with open(os.path.join(carpeta, 'Client.txt'), 'w', encoding='utf-8') as f:
         f.write(cliente)
-    with open(os.path.join(sandbx, 'Branch.txt'), 'w', encoding='utf-8') as f:
+    with open(os.path.join(carpeta, 'Branch.txt'), 'w', encoding='utf-8') as f:
         f.write(sucursal)
-    with open(os.path.join(sandbx, 'Fecha.txt'), 'w', encoding='utf-8') as f:
+    with open(os.path.join(carpeta, 'Fecha.txt'), 'w', encoding='utf-8') as f:
         f.write(fecha_actual)
     return cliente, sucursal, fecha_actual
 
-# Obtener la información
-try:
-    workng = encontrar_zip(workng_dir)
-    cliente, sucursal, fecha_actual = extraer_info_zip(workng)
-    cliente = cliente.lstrip('0')
-except FileNotFoundError as e:
-    logging.error(e)
-    exit()
-
-# Verificar existencia y permisos del archivo ZIP
-if not os.path.isfile(workng):
-    logging.error(f"El archivo ZIP no existe en la ruta especificada: {workng}")
-    exit()
-elif not os.access(workng, os.R_OK):
-    logging.error(f"Permiso denegado para leer el archivo ZIP: {workng}")
-    exit()
-
-# Crear la carpeta Sandbx si no existe
-if not os.path.isdir(sandbx):
-    try:
-        os.makedirs(sandbx, exist_ok=True)
-        logging.info(f"Carpeta creada: {sandbx}")
-    except PermissionError:
-        logging.error(f"Permiso denegado para crear la carpeta: {sandbx}")
-        exit()
-    except Exception as e:
-        logging.error(f"Se produjo un error al crear la carpeta: {e}")
-        exit()
+# Función para ubicar el miembro del ZIP de cada reporte por prefijo del nombre (gana el prefijo más largo)
+def buscar_miembros_zip(zip_ref, reportes):
+    miembros = {}
+    for info in zip_ref.infolist():
+        if info.is_dir():
+            continue
+        nombre = os.path.basename(info.filename)
+        coincidencias = [reporte for reporte in reportes if nombre.startswith(reporte)]
+        if coincidencias:
+            miembros[max(coincidencias, key=len)] = info
+    return miembros
 
-# Intentar descomprimir el archivo ZIP
-try:
-    with zipfile.ZipFile(workng, 'r') as zip_ref:
-        zip_ref.extractall(sandbx)
-        logging.info(f"Archivo descomprimido en {sandbx}")
-except FileNotFoundError:
-    logging.error(f"El archivo ZIP no se encontró en la ruta especificada: {workng}")
-except PermissionError:
-    logging.error(f"Permiso denegado para acceder al archivo ZIP o a la carpeta de destino.")
-except Exception as e:
-    logging.error(f"Se produjo un error al descomprimir el archivo: {e}")
+# Función para calcular la huella de un reporte: el SHA-256 de su contenido más la configuración del reporte (si cambian
+# las columnas o los tipos, el reporte se vuelve a cargar). No se usa el CRC-32 que el ZIP guarda de cada miembro porque
+# dos exportaciones distintas del mismo tamaño pueden coincidir en él
+def huella_reporte(stream, reporte):
+    huella = hashlib.sha256(f"{plan_reporte(reporte)['huella']}|".encode('utf-8'))
+    for bloque in iter(lambda: stream.read(1 << 20), b''):
+        huella.update(bloque)
+    return huella.hexdigest()
 
 # Función para filtrar solo letras de un nombre de archivo
 def filtrar_letras(nombre):
     return re.sub(r'[^a-zA-Z]', '', nombre)
 
-# Renombrar los archivos extraídos
-for archivo in os.listdir(sandbx):
-    for reporte in reportes:
-        if archivo.startswith(reporte):
-            nuevo_nombre_base = filtrar_letras(archivo)
-            nuevo_nombre = f"{reporte}{sucursal}.txt"
-            ruta_antigua = os.path.join(sandbx, archivo)
-            ruta_nueva = os.path.join(sandbx, nuevo_nombre)
-            os.rename(ruta_antigua, ruta_nueva)
-            logging.info(f"Archivo renombrado de {archivo} a {nuevo_nombre}")
-
-# Función para guardar consultas SQL en un archivo
-def guardar_sql_dump(nombre_archivo, consultas, version_servidor):
-    encabezado = (
-        "-- PostgreSQL dump\n"
-        "--\n"
-        f"-- Host: localhost    Database: {db_config.get('base_de_datos', 'Desconocida')}\n"
-        "-- ------------------------------------------------------\n"
-        f"-- Server version {version_servidor}\n\n"
-    )
+# Codificaciones aceptadas para los reportes; lo que chardet proponga fuera de esta lista se lee como Windows-1252
+codificaciones = ['utf-8', 'ISO-8859-1', 'latin1', 'Windows-1252']
+codificaciones_validas = {codecs.lookup(c).name for c in codificaciones}
+lock_codificaciones = threading.Lock()
+
+# Función para saber si una muestra de bytes se decodifica con una codificación. La muestra puede cortar un carácter
+# multibyte al final, por eso se decodifica de forma incremental
+def decodifica_muestra(muestra, codificacion):
     try:
-        with open(nombre_archivo, 'w', encoding='utf-8') as f:
-            f.write(encabezado)
-            for consulta in consultas:
-                f.write(consulta + '\n')
-        logging.info(f"Archivo SQL dump generado: {nombre_archivo}")
-    except Exception as e:
-        logging.error(f"Se produjo un error al guardar el archivo SQL dump: {e}")
+        codecs.getincrementaldecoder(codificacion)().decode(muestra, final=False)
+        return True
+    except UnicodeDecodeError:
+        return False
 
-# Conectar a la base de datos
-conexion = conectar_db(db_config.get('host', ''), db_config.get('usuario', ''), db_config.get('contrasena', ''), db_config.get('base_de_datos', ''))
+# Función para detectar la codificación a partir de una muestra acotada de bytes
+def detectar_codificacion(muestra):
+    if decodifica_muestra(muestra, 'utf-8'):
+        return 'utf-8'
+    codificacion = chardet.detect(muestra).get('encoding')
+    if codificacion and codecs.lookup(codificacion).name in codificaciones_validas:
+        return codificacion
+    return 'Windows-1252'
+
+# Función para comprobar que la codificación guardada en el cache sirve para la muestra de este reporte: la muestra
+# se debe decodificar con ella y, si es UTF-8 válido con caracteres no ASCII, la codificación debe ser UTF-8 (leerla
+# como Latin-1 o Windows-1252 no falla, pero deja texto con mojibake)
+def codificacion_vigente(muestra, codificacion):
+    if codecs.lookup(codificacion).name == 'utf-8':
+        return decodifica_muestra(muestra, 'utf-8')
+    if not muestra.isascii() and decodifica_muestra(muestra, 'utf-8'):
+        return False
+    return decodifica_muestra(muestra, codificacion)
+
+# Función para leer el cache de codificaciones detectadas por cliente y reporte
+def leer_cache_codificaciones():
+    try:
+        with open(cache_codificaciones, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+# Función para reemplazar el archivo del cache de codificaciones. Se llama con lock_codificaciones tomado
+def escribir_cache_codificaciones(cache):
+    try:
+        temporal = f"{cache_codificaciones}.{os.getpid()}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, indent=4)
+        os.replace(temporal, cache_codificaciones)
+    except OSError as e:
+        logging.warning(f"No se pudo actualizar el cache de codificaciones: {e}")
+
+# Función para guardar en el cache la codificación de un cliente y reporte
+def guardar_codificacion(cliente, reporte, codificacion):
+    with lock_codificaciones:
+        cache = leer_cache_codificaciones()
+        if cache.get(f"{cliente}|{reporte}") == codificacion:
+            return
+        cache[f"{cliente}|{reporte}"] = codificacion
+        escribir_cache_codificaciones(cache)
+
+# Función para quitar del cache la codificación de un cliente y reporte que ya no sirve
+def olvidar_codificacion(cliente, reporte):
+    with lock_codificaciones:
+        cache = leer_cache_codificaciones()
+        if cache.pop(f"{cliente}|{reporte}", None) is None:
+            return
+        escribir_cache_codificaciones(cache)
+
+# Función para obtener la codificación de un reporte: del cache, si sirve para una muestra del stream, o
+# detectándola sobre esa misma muestra
+def obtener_codificacion(stream, cliente, reporte):
+    muestra = stream.read(muestra_codificacion)
+    stream.seek(0)
+    codificacion = leer_cache_codificaciones().get(f"{cliente}|{reporte}")
+    if codificacion:
+        if codificacion_vigente(muestra, codificacion):
+            return codificacion
+        logging.info(f"La codificación guardada para {reporte} del cliente {cliente} ({codificacion}) no sirve para este archivo. Se detecta de nuevo.")
+    codificacion = detectar_codificacion(muestra)
+    guardar_codificacion(cliente, reporte, codificacion)
+    logging.info(f"Codificación detectada para {reporte} del cliente {cliente}: {codificacion}")
+    return codificacion
+
+# Función para leer un stream binario como texto sin cerrar el stream al terminar
+def leer_texto(stream, codificacion):
+    texto = io.TextIOWrapper(stream, encoding=codificacion)
+    try:
+        return texto.read()
+    finally:
+        texto.detach()
+
+# Función para decodificar un reporte en una sola pasada incremental sobre el stream
+def decodificar_reporte(stream, cliente, reporte):
+    codificacion = obtener_codificacion(stream, cliente, reporte)
+    try:
+        return leer_texto(stream, codificacion)
+    except UnicodeDecodeError:
+        # La muestra no fue representativa: se relee completo en ISO-8859-1, que acepta cualquier byte. La
+        # codificación del cache se descarta para que el siguiente archivo se detecte de nuevo
+        logging.warning(f"El reporte {reporte} no es {codificacion} en su totalidad. Se lee como ISO-8859-1.")
+        stream.seek(0)
+        olvidar_codificacion(cliente, reporte)
+        return leer_texto(stream, 'ISO-8859-1')
+
+# Escritor incremental de archivos .sql.dump. Escribe en un archivo temporal, opcionalmente comprimido con
+# gzip o zstd, y lo renombra de forma atómica al cerrar sin errores; si algo falla, el temporal se borra
+class EscritorDump:
+    extensiones = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+
+    def __init__(self, nombre_archivo, version_servidor, compresion=None, filas_por_insert=None):
+        if compresion == 'zstd' and not zstd_disponible():
+            logging.warning("El paquete 'zstandard' no está instalado. El SQL dump se comprime con gzip.")
+            compresion = 'gzip'
+        self.compresion = compresion
+        self.filas_por_insert = filas_por_insert or filas_por_insert_dump
+        self.nombre_archivo = nombre_archivo + self.extensiones[compresion]
+        self.temporal = f"{self.nombre_archivo}.tmp"
+        self.version_servidor = version_servidor
+        self.archivo = None
+
+    def __enter__(self):
+        if self.compresion == 'gzip':
+            self.archivo = gzip.open(self.temporal, 'wt', encoding='utf-8')
+        elif self.compresion == 'zstd':
+            import zstandard
+            self.archivo = zstandard.open(self.temporal, 'wt', encoding='utf-8')
+        else:
+            self.archivo = open(self.temporal, 'w', encoding='utf-8')
+        self.archivo.write(
+            "-- PostgreSQL dump\n"
+            "--\n"
+            f"-- Host: localhost    Database: {db_config.get('base_de_datos', 'Desconocida')}\n"
+            "-- ------------------------------------------------------\n"
+            f"-- Server version {self.version_servidor}\n\n"
+            "SET datestyle TO 'ISO, DMY';\n\n"
+        )
+        return self
+
+    # Escribir una sentencia o comentario
+    def escribir(self, consulta):
+        self.archivo.write(consulta + '\n')
+
+    # Escribir las filas de un DataFrame como INSERT de varias filas, filas_por_insert filas por sentencia.
+    # lista_columnas es la lista de columnas ya compilada en el plan del reporte. Con expresiones ({columna: expresión
+    # SQL}, ver expresiones_sql) las filas van como texto en un INSERT ... SELECT ... FROM (VALUES ...) que aplica las
+    # mismas expresiones que la carga (limpieza y fórmulas en la base de datos), así el dump restaura la misma tabla
+    def escribir_filas(self, nombre_tabla, df, lista_columnas=None, expresiones=None):
+        if expresiones:
+            lista_columnas = ', '.join(identificador_sql(c) for c in expresiones)
+            leidas = ', '.join(identificador_sql(c) for c in df.columns)
+            insert_query = f"INSERT INTO {nombre_tabla} ({lista_columnas}) SELECT {', '.join(expresiones.values())} FROM (VALUES\n"
+            cierre = f") AS crudo ({leidas});\n"
+        else:
+            lista_columnas = lista_columnas or ', '.join(identificador_sql(c) for c in df.columns)
+            insert_query = f"INSERT INTO {nombre_tabla} ({lista_columnas}) VALUES\n"
+            cierre = ';\n'
+        for inicio in range(0, len(df), self.filas_por_insert):
+            lote = df.iloc[inicio:inicio + self.filas_por_insert]
+            filas = None
+            for columna in lote.columns:
+                literales = literales_sql(lote[columna])
+                filas = literales if filas is None else filas + ', ' + literales
+            self.archivo.write(insert_query + ',\n'.join('(' + filas + ')') + cierre)
+
+    def __exit__(self, tipo_error, error, traza):
+        self.archivo.close()
+        if tipo_error is None:
+            os.replace(self.temporal, self.nombre_archivo)
+            logging.info(f"Archivo SQL dump generado: {self.nombre_archivo}")
+        elif os.path.exists(self.temporal):
+            os.remove(self.temporal)
+        return False
+
+# Función para saber si está instalado el paquete opcional zstandard
+def zstd_disponible():
+    return importlib.util.find_spec('zstandard') is not None
+
+# Contexto para redondear los NUMERIC(p,s) a su escala como PostgreSQL (mitades lejos del cero), con la precisión
+# máxima de NUMERIC para que no se redondeen los dígitos enteros
+contexto_decimal = decimal.Context(prec=1000, rounding=decimal.ROUND_HALF_UP)
+
+# Función para obtener la precisión y la escala de un tipo NUMERIC(p,s) o DECIMAL(p,s) que cabe en un decimal de Arrow
+# (hasta 76 dígitos). Regresa None para los demás tipos, incluidos NUMERIC sin precisión y los de más dígitos
+def precision_decimal(tipo):
+    coincidencia = re.fullmatch(r'(?:NUMERIC|DECIMAL)\s*\((\d+)(?:,\s*(\d+))?\)', tipo.strip().upper())
+    if not coincidencia or int(coincidencia.group(1)) > 76:
+        return None
+    return int(coincidencia.group(1)), int(coincidencia.group(2) or 0)
+
+# Función para leer un valor NUMERIC como Decimal (None si está vacío). El cero negativo queda como cero, como en PostgreSQL
+def valor_numeric(valor):
+    if pd.isna(valor) or not str(valor).strip():
+        return None
+    numero = decimal.Decimal(valor)
+    return numero if numero else abs(numero)
+
+# Función para convertir las columnas de un DataFrame a los tipos de Parquet que corresponden a sus tipos SQL.
+# Los NUMERIC(p,s) se redondean a su escala como en PostgreSQL, sin pasar por float
+def convertir_tipos_parquet(df, tipos):
+    df = df.copy()
+    for columna, tipo in tipos.items():
+        tipo = tipo.upper()
+        if tipo.startswith(('INTEGER', 'BIGINT', 'SMALLINT')):
+            df[columna] = pd.to_numeric(df[columna]).astype('Int64')
+        elif precision_decimal(tipo):
+            escala = decimal.Decimal(1).scaleb(-precision_decimal(tipo)[1])
+            numeros = map(valor_numeric, df[columna])
+            df[columna] = [None if numero is None else contexto_decimal.quantize(numero, escala) for numero in numeros]
+        elif tipo.startswith(('NUMERIC', 'DECIMAL')):
+            # Sin exponente ni signo '+', como los devuelve PostgreSQL
+            numeros = map(valor_numeric, df[columna])
+            df[columna] = [None if numero is None else format(numero, 'f') for numero in numeros]
+        elif tipo.startswith(('REAL', 'DOUBLE')):
+            df[columna] = pd.to_numeric(df[columna]).astype('Float64')
+        elif tipo.startswith('DATE'):
+            iso = df[columna].str.contains('-', regex=False, na=False)
+            fechas = pd.to_datetime(df[columna].where(iso), format='%Y-%m-%d')
+            fechas = fechas.fillna(pd.to_datetime(df[columna].where(~iso), format='%d/%m/%Y'))
+            df[columna] = fechas.dt.date
+    return df
+
+# Función para saber si está instalado el paquete opcional pyarrow
+def parquet_disponible():
+    return importlib.util.find_spec('pyarrow') is not None
+
+# Función para armar el esquema de Arrow de la salida Parquet a partir de los tipos SQL: INTEGER, BIGINT y SMALLINT
+# como int64, NUMERIC(p,s) y DECIMAL(p,s) como decimal128 o decimal256 (p,s), REAL y DOUBLE como float64, DATE como
+# date32 y las demás columnas como texto. Los NUMERIC sin precisión (los inferidos) van como texto para no perder
+# dígitos: float64 no guarda su valor exacto y no tienen una escala fija
+def esquema_parquet(columnas, tipos):
+    import pyarrow as pa
+    campos = []
+    for columna in columnas:
+        tipo = tipos.get(columna, 'TEXT').upper()
+        if tipo.startswith(('INTEGER', 'BIGINT', 'SMALLINT')):
+            tipo_arrow = pa.int64()
+        elif precision_decimal(tipo):
+            precision, escala = precision_decimal(tipo)
+            tipo_arrow = pa.decimal128(precision, escala) if precision <= 38 else pa.decimal256(precision, escala)
+        elif tipo.startswith(('REAL', 'DOUBLE')):
+            tipo_arrow = pa.float64()
+        elif tipo.startswith('DATE'):
+            tipo_arrow = pa.date32()
+        else:
+            tipo_arrow = pa.string()
+        campos.append(pa.field(columna, tipo_arrow))
+    return pa.schema(campos)
+
+# Escritor de la salida Parquet de un reporte, particionada al estilo Hive:
+# {salida_parquet}/{reporte}/Client=<cliente>/Branch=<sucursal>/Date=<AAAA-MM-DD>/part-00000.parquet
+# Client, Branch y Date quedan en la ruta. Todo el reporte va en un solo archivo, con el esquema fijado por los tipos
+# del reporte (ya ampliados): los bloques se juntan en memoria hasta bytes_row_group y se escriben como un row group,
+# así un reporte por bloques no deja un archivo ni un row group diminuto por bloque.
+# Se escribe en una carpeta temporal que al cerrar reemplaza la partición completa
+class EscritorParquet:
+    # Tamaño en memoria (Arrow) de cada row group: memoria_reporte_mb en el modo por bloques, con un máximo de 64 MB
+    bytes_row_group = min(memoria_reporte_mb or 64, 64) * 2 ** 20
+
+    def __init__(self, reporte, cliente, sucursal, fecha_actual, tipos=None):
+        if not parquet_disponible():
+            raise ImportError("El paquete 'pyarrow' no está instalado; no se puede generar la salida Parquet.")
+        fecha_iso = datetime.strptime(fecha_actual, '%d/%m/%Y').strftime('%Y-%m-%d')
+        self.carpeta = os.path.join(salida_parquet, reporte, f"Client={cliente}", f"Branch={sucursal}", f"Date={fecha_iso}")
+        self.temporal = f"{self.carpeta}.tmp"
+        self.tipos = tipos or {}
+        self.esquema = None
+        self.escritor = None
+        self.pendientes = []
+        self.descartado = False
+
+    def __enter__(self):
+        shutil.rmtree(self.temporal, ignore_errors=True)
+        os.makedirs(self.temporal)
+        return self
+
+    # Escribir un DataFrame (o un bloque de filas) como un row group más de la partición
+    def escribir(self, df):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        df = convertir_tipos_parquet(df.drop(columns=['Client', 'Branch', 'Date']), self.tipos)
+        tabla = pa.Table.from_pandas(df, schema=self.esquema or esquema_parquet(df.columns, self.tipos), preserve_index=False)
+        if self.escritor is None:
+            # El esquema de la primera tabla lleva además los metadatos de pandas (Int64, Float64...)
+            self.esquema = tabla.schema
+            self.escritor = pq.ParquetWriter(os.path.join(self.temporal, "part-00000.parquet"), self.esquema)
+        self.pendientes.append(tabla)
+        if sum(pendiente.nbytes for pendiente in self.pendientes) >= self.bytes_row_group:
+            self.vaciar()
+
+    # Escribir los bloques pendientes como un row group
+    def vaciar(self):
+        import pyarrow as pa
+        if self.pendientes:
+            tabla = pa.concat_tables(self.pendientes)
+            self.escritor.write_table(tabla, row_group_size=max(tabla.num_rows, 1))
+            self.pendientes = []
+
+    # Descartar la salida de este reporte (por ejemplo, si un bloque no se pudo convertir): la partición anterior
+    # queda intacta y al cerrar no se escribe nada
+    def descartar(self):
+        try:
+            if self.escritor:
+                self.escritor.close()
+        finally:
+            self.escritor = None
+            self.pendientes = []
+            self.descartado = True
+            shutil.rmtree(self.temporal, ignore_errors=True)
+
+    def __exit__(self, tipo_error, error, traza):
+        if self.descartado:
+            return False
+        if self.escritor:
+            try:
+                if tipo_error is None:
+                    self.vaciar()
+            finally:
+                self.escritor.close()
+        if tipo_error is not None:
+            shutil.rmtree(self.temporal, ignore_errors=True)
+            return False
+        if os.path.isdir(self.carpeta):
+            shutil.rmtree(self.carpeta)
+        os.replace(self.temporal, self.carpeta)
+        logging.info(f"Salida Parquet generada: {self.carpeta}")
+        return False
 
 # Función para obtener la versión del servidor PostgreSQL
 def obtener_version_servidor(conexion):
@@ -199,12 +893,6 @@ def obtener_version_servidor(conexion):
         logging.error(f"Error al obtener la versión del servidor: {e}")
         return "Desconocida"
 
-# Obtener la versión del servidor
-if conexion:
-    version_servidor = obtener_version_servidor(conexion)
-else:
-    version_servidor = "Desconocida"
-
 # Función para renombrar columnas
 def renombrar_columnas(headers):
     seen = {}
@@ -219,106 +907,488 @@ def renombrar_columnas(headers):
         new_headers.append(new_header)
     return new_headers
 
-# Iterar sobre cada reporte y realizar las operaciones de creación de tabla e inserción
-for reporte in reportes:
-    nombre_tabla = f"{reporte}{sucursal}"
-    ruta_archivo = os.path.join(sandbx, f'{reporte}{sucursal}.txt')
+# Función para obtener las columnas esperadas de un reporte (lista simple o formato {'columnas': [...], 'formulas': {...}})
+def columnas_reporte(reporte):
+    columnas = columnas_esperadas.get(reporte, [])
+    if isinstance(columnas, dict):
+        return columnas.get('columnas', [])
+    return columnas
+
+# Función para leer un reporte separado por '|' con el parser en C de pandas.
+# Con tamano_bloque regresa un lector del que se piden los bloques con siguiente_bloque
+def leer_reporte_csv(texto, headers, filas_omitidas=0, tamano_bloque=None):
+    try:
+        return pd.read_csv(
+            texto,
+            sep='|',
+            header=None,
+            names=headers,
+            usecols=range(len(headers)),
+            skiprows=filas_omitidas,
+            dtype=str,
+            na_filter=False,
+            quoting=csv.QUOTE_NONE,
+            engine='c',
+            chunksize=tamano_bloque
+        )
+    except pd.errors.EmptyDataError:
+        if tamano_bloque:
+            return None
+        return pd.DataFrame(columns=headers, dtype=str)
+
+# Función para leer el siguiente bloque de filas de un lector por bloques. Regresa None al terminar
+def siguiente_bloque(lector, filas):
+    if lector is None:
+        return None
+    try:
+        return lector.get_chunk(filas)
+    except StopIteration:
+        return None
 
-    # Verificar existencia del archivo TXT
-    if not os.path.isfile(ruta_archivo):
-        logging.warning(f"El archivo TXT no se encontró en la ruta especificada: {ruta_archivo}. Omitiendo este reporte.")
-        continue
+# Filas del bloque de muestra con el que se estima cuánto ocupa cada fila en memoria
+filas_muestra_bloque = 1000
+# Veces que un bloque ocupa lo que mide su DataFrame: copias al normalizar, CSV de COPY e INSERT del dump
+factor_memoria_bloque = 4
 
-    # Intentar leer el archivo con diferentes codificaciones
-    codificaciones = ['utf-8', 'ISO-8859-1', 'latin1', 'Windows-1252']
+# Función para calcular cuántas filas caben en un bloque según memoria_reporte_mb, a partir de un bloque de muestra
+def filas_por_bloque(muestra):
+    if muestra.empty:
+        return filas_muestra_bloque
+    bytes_por_fila = muestra.memory_usage(index=False, deep=True).sum() / len(muestra)
+    return max(filas_muestra_bloque, int(memoria_reporte_mb * 1024 * 1024 / (bytes_por_fila * factor_memoria_bloque)))
 
-    raw_data = None
-    for codificacion in codificaciones:
-        try:
-            with open(ruta_archivo, 'r', encoding=codificacion) as f:
-                raw_data = f.read()
-            break
-        except UnicodeDecodeError:
+# Función para obtener los tipos fijados en la configuración para las columnas de un reporte ('tipos' junto a 'columnas')
+def tipos_reporte(reporte):
+    columnas = columnas_esperadas.get(reporte, {})
+    if isinstance(columnas, dict):
+        return columnas.get('tipos', {})
+    return {}
+
+# Función para obtener las reglas de limpieza de las columnas de un reporte ('limpieza': {columna: regla})
+def limpieza_reporte(reporte):
+    columnas = columnas_esperadas.get(reporte, {})
+    if isinstance(columnas, dict):
+        return columnas.get('limpieza', {})
+    return {}
+
+# Función para obtener las fórmulas de las columnas calculadas de un reporte ('formulas': {columna: fórmula})
+def formulas_reporte(reporte):
+    columnas = columnas_esperadas.get(reporte, {})
+    if isinstance(columnas, dict):
+        return columnas.get('formulas', {})
+    return {}
+
+# Función para obtener los patrones de líneas basura de un reporte ('basura': expresiones regulares de las líneas
+# que se quitan en cualquier parte del reporte, como pies de página o encabezados repetidos en cada página)
+def basura_reporte(reporte):
+    columnas = columnas_esperadas.get(reporte, {})
+    if isinstance(columnas, dict):
+        return columnas.get('basura', [])
+    return []
+
+# Patrones de los tipos que se infieren. Los números con ceros a la izquierda (códigos, cuentas) se quedan como texto
+patrones_tipo = {
+    'INTEGER': r'[+-]?(?:0|[1-9]\d*)',
+    'NUMERIC': r'[+-]?(?:(?:0|[1-9]\d*)(?:\.\d+)?|\.\d+)',
+    'DATE': r'\d{4}-\d{2}-\d{2}|\d{2}/\d{2}/\d{4}',
+}
+
+# Función para verificar de forma vectorizada que todos los valores de una serie son del tipo indicado
+def valores_son_tipo(valores, tipo):
+    if not valores.str.fullmatch(patrones_tipo[tipo]).all():
+        return False
+    if tipo == 'DATE':
+        iso = valores.str.contains('-', regex=False)
+        fechas_iso = pd.to_datetime(valores[iso], format='%Y-%m-%d', errors='coerce')
+        fechas_dmy = pd.to_datetime(valores[~iso], format='%d/%m/%Y', errors='coerce')
+        return not (fechas_iso.isna().any() or fechas_dmy.isna().any())
+    return True
+
+# Inferir el tipo de datos de cada columna: se descarta con una muestra y se confirma con la columna completa
+def inferir_tipo_dato(serie):
+    if not inferir_tipos:
+        return 'VARCHAR(255)'
+    valores = serie.str.strip()
+    valores = valores[valores != '']
+    if valores.empty:
+        return 'TEXT'
+    muestra = valores.sample(min(len(valores), muestra_tipos), random_state=0)
+    for tipo in ('INTEGER', 'NUMERIC', 'DATE'):
+        if valores_son_tipo(muestra, tipo) and valores_son_tipo(valores, tipo):
+            if tipo == 'INTEGER':
+                digitos = valores.str.lstrip('+-').str.len().max()
+                if digitos > 18:
+                    return 'NUMERIC'
+                if digitos > 9:
+                    return 'BIGINT'
+            return tipo
+    return 'TEXT'
+
+# Función para obtener un tipo inferido que admita los valores de ambos tipos
+def ampliar_tipo(tipo, otro):
+    numericos = ['INTEGER', 'BIGINT', 'NUMERIC']
+    if tipo == otro:
+        return tipo
+    if tipo in numericos and otro in numericos:
+        return max(tipo, otro, key=numericos.index)
+    return 'TEXT'
+
+# Se lanza cuando un bloque posterior trae valores que no caben en el tipo inferido con el primer bloque.
+# tipos tiene el tipo ampliado de cada columna afectada
+class TiposAmpliados(Exception):
+    def __init__(self, tipos):
+        super().__init__(f"Columnas con un tipo más amplio: {tipos}")
+        self.tipos = tipos
+
+# Función para encontrar las columnas inferidas cuyo tipo no admite los valores de un bloque. Regresa {columna: tipo ampliado}
+def tipos_a_ampliar(df, tipos_columnas, inferidas):
+    ampliar = {}
+    for columna in inferidas:
+        tipo = tipos_columnas[columna]
+        if es_tipo_texto(tipo) or (df[columna].str.strip() == '').all():
             continue
+        tipo_ampliado = ampliar_tipo(tipo, inferir_tipo_dato(df[columna]))
+        if tipo_ampliado != tipo:
+            ampliar[columna] = tipo_ampliado
+    return ampliar
 
-    if raw_data is None:
-        logging.error(f"No se pudo leer el archivo TXT {ruta_archivo} con ninguna de las codificaciones probadas.")
-        continue
+# Función para obtener los índices configurados de un reporte ('indices': lista de columnas o de listas de columnas)
+def indices_reporte(reporte):
+    columnas = columnas_esperadas.get(reporte, {})
+    if not isinstance(columnas, dict):
+        return []
+    return [[indice] if isinstance(indice, str) else indice for indice in columnas.get('indices', [])]
 
-    
-    # Se limpia el reporte de la basura
-    raw_data_clean = limpiar_encabezado(raw_data)
+# Función para indicar si un tipo SQL guarda texto (las cadenas vacías solo se conservan en columnas de texto)
+def es_tipo_texto(tipo):
+    return tipo.upper().startswith(('TEXT', 'VARCHAR', 'CHAR'))
 
-    # Procesar el contenido del archivo TXT
-    data = [row.split('|') for row in raw_data_clean.strip().split('\n')]
+# Versión del formato de los planes de carga: se incrementa al cambiar compilar_plan para invalidar los caches guardados
+version_planes = 8
+# Tipos SQL aceptados en 'tipos': un nombre de tipo con precisión opcional, p. ej. NUMERIC(18,2) o DOUBLE PRECISION
+patron_tipo_sql = r'[A-Za-z][A-Za-z ]*(\(\d+(,\s*\d+)?\))?'
+# Planes de carga compilados en este proceso y la firma de la configuración con la que se compilaron
+planes_carga = {}
+lock_planes = threading.Lock()
 
-    # Usar encabezados esperados del archivo de configuración
-    encabezados_esperados = columnas_esperadas.get(reporte, [])
-    headers = encabezados_esperados
-    rows = data
+# Motores de limpieza que api.py sabe aplicar (reglas_limpieza tiene además una versión para Spark)
+motores_limpieza = ('pandas', 'sql')
+# Motores con los que se calculan las fórmulas
+motores_formulas = ('pandas', 'sql')
 
-    
+# Función para validar las claves de config.json que aplican a todos los reportes. Regresa la lista de errores
+def validar_configuracion():
+    errores = []
+    if motor_limpieza not in motores_limpieza:
+        errores.append(f"motor_limpieza inválido {motor_limpieza!r}; los motores son {', '.join(motores_limpieza)}")
+    if motor_formulas not in motores_formulas:
+        errores.append(f"motor_formulas inválido {motor_formulas!r}; los motores son {', '.join(motores_formulas)}")
+    return errores
 
-    # Comparar las columnas actuales con las esperadas
-    columnas = data[0]
-    print(f'Columnas: {columnas}')
-    columnas_esperadas_reporte = set(columnas_esperadas.get(reporte, []))
-    print(f'Columnas esperadas: {columnas_esperadas_reporte}')
-    # Verificar si al menos una columna coincide
-    if columnas_esperadas_reporte.intersection(columnas):
-        rows = data[1:] 
-        logging.info(f"Al menos una columna de {nombre_tabla} coincide con las columnas esperadas en la configuración.")
+# Función para validar la configuración de un reporte antes de tocar los datos. Regresa la lista de errores
+def validar_reporte(encabezados, tipos, indices, basura, limpieza, formulas):
+    errores = []
+    if not isinstance(encabezados, list) or not all(isinstance(c, str) and c and not re.search(r'[|\r\n]', c) for c in encabezados):
+        return ["'columnas' debe ser una lista de nombres no vacíos, sin '|' ni saltos de línea"]
+    columnas = renombrar_columnas(encabezados)
+    if len(set(columnas)) != len(columnas):
+        errores.append("los sufijos de las columnas repetidas chocan con otras columnas")
+    if not isinstance(formulas, dict):
+        errores.append("'formulas' debe ser un objeto {columna: fórmula}")
+        formulas = {}
+    # Cada fórmula se valida por separado al compilar el plan (compilar_formulas_reporte): una fórmula inválida solo
+    # descarta su columna. La limpieza se aplica a las columnas del reporte; 'tipos' e 'indices' también admiten las calculadas
+    columnas_leidas = columnas
+    columnas = columnas + [c for c in formulas if c not in columnas]
+    if not isinstance(tipos, dict):
+        errores.append("'tipos' debe ser un objeto {columna: tipo}")
     else:
-        logging.info(f"El documento {nombre_tabla} no trae columnas.")
-        
+        for columna, tipo in tipos.items():
+            if columna not in columnas:
+                errores.append(f"'tipos' menciona la columna inexistente {columna!r}")
+            if not isinstance(tipo, str) or not re.fullmatch(patron_tipo_sql, tipo.strip()):
+                errores.append(f"tipo SQL inválido para {columna!r}: {tipo!r}")
+    for indice in indices if isinstance(indices, list) else [indices]:
+        if not isinstance(indice, list) or not indice:
+            errores.append(f"índice inválido: {indice!r}")
+            continue
+        for columna in indice:
+            if columna not in columnas:
+                errores.append(f"'indices' menciona la columna inexistente {columna!r}")
+    for patron in basura if isinstance(basura, list) else [basura]:
+        try:
+            if re.match(patron, ''):
+                errores.append(f"el patrón de basura {patron!r} coincide con cualquier línea")
+        except (re.error, TypeError) as e:
+            errores.append(f"patrón de basura inválido {patron!r}: {e}")
+    if not isinstance(limpieza, dict):
+        errores.append("'limpieza' debe ser un objeto {columna: regla}")
+    elif limpieza:
+        from reglas_limpieza import compilar_regla
+        for columna, regla in limpieza.items():
+            if columna not in columnas_leidas:
+                errores.append(f"'limpieza' menciona la columna inexistente {columna!r}")
+            elif isinstance(tipos, dict) and not es_tipo_texto(tipos.get(columna, 'TEXT')):
+                errores.append(f"la columna {columna!r} tiene una regla de limpieza y un tipo que no es de texto")
+            try:
+                # La versión de pandas se usa también con motor_limpieza sql cuando hay fórmulas en pandas
+                for motor in motores_limpieza:
+                    compilar_regla(regla, motor)
+            except (ValueError, TypeError) as e:
+                errores.append(f"regla de limpieza de {columna!r}: {e}")
+    return errores
 
+# Función para compilar las fórmulas de un reporte columna por columna. Una fórmula inválida (nombre de columna no
+# permitido, error de sintaxis, columnas que no existen, referencias circulares) solo descarta su columna calculada,
+# y también las fórmulas que la usan; el reporte se sigue cargando. Regresa (fórmulas compiladas, avisos)
+def compilar_formulas_reporte(formulas, columnas):
+    avisos = []
+    validas = {}
+    # Las columnas calculadas que no son del reporte se agregan al final de la tabla
+    catalogo = {nombre_catalogo(c) for c in ['Client', 'Branch', 'Date'] + columnas}
+    for columna, formula in formulas.items():
+        if columna in ('Client', 'Branch', 'Date'):
+            avisos.append(f"la columna {columna!r} no se puede calcular con una fórmula")
+        elif columna not in columnas and (not columna.strip() or re.search(r'[|\r\n]', columna) or nombre_catalogo(columna) in catalogo):
+            avisos.append(f"nombre inválido o repetido para la columna calculada {columna!r}")
+        else:
+            validas[columna] = formula
+        catalogo.add(nombre_catalogo(columna))
+    if not validas:
+        return {}, avisos
+    from formulas import compilar_formulas
+    compiladas, errores = compilar_formulas(validas, ['Client', 'Branch', 'Date'] + columnas)
+    return compiladas, avisos + errores
 
-    # Asegurarse de que los nombres de las columnas sean únicos agregando sufijos
-    headers = renombrar_columnas(headers)
+# Función para compilar la configuración de un reporte en su plan de carga: columnas finales con sus sufijos,
+# identificadores SQL, tipos fijados, índices, la firma para detectar el encabezado, el patrón de las líneas basura,
+# las reglas de limpieza (con su expresión SQL ya armada), las fórmulas compiladas con las columnas calculadas que
+# se agregan a la tabla y la huella de la configuración.
+# Si la configuración no es válida, el plan solo trae sus errores
+def compilar_plan(reporte):
+    encabezados = columnas_reporte(reporte)
+    tipos = tipos_reporte(reporte)
+    indices = indices_reporte(reporte)
+    basura = basura_reporte(reporte)
+    limpieza = limpieza_reporte(reporte)
+    formulas = formulas_reporte(reporte)
+    errores = validar_reporte(encabezados, tipos, indices, basura, limpieza, formulas)
+    if errores:
+        return {'errores': errores, 'avisos': []}
+    columnas = renombrar_columnas(encabezados)
+    compiladas, avisos = compilar_formulas_reporte(formulas, columnas)
+    derivadas = [c for c in compiladas if c not in columnas]
+    # Los índices sobre una columna calculada descartada se omiten
+    for indice in [indice for indice in indices if any(c not in columnas + derivadas for c in indice)]:
+        avisos.append(f"se omite el índice {indice!r}, que usa una columna calculada descartada")
+        indices.remove(indice)
+    identificadores = [identificador_sql(c) for c in ['Client', 'Branch', 'Date'] + columnas + derivadas]
+    limpieza_sql = {}
+    if limpieza:
+        from reglas_limpieza import compilar_regla
+        limpieza_sql = {columna: compilar_regla(regla, 'sql')(identificador_sql(columna)) for columna, regla in limpieza.items()}
+    configuracion = json.dumps([columnas_esperadas.get(reporte), inferir_tipos], sort_keys=True)
+    return {
+        'columnas': columnas,
+        'identificadores': identificadores,
+        'lista_columnas': ', '.join(identificadores),
+        'tipos': tipos,
+        'indices': indices,
+        'firma_encabezado': sorted(set(encabezados)),
+        'limpieza': limpieza,
+        'limpieza_sql': limpieza_sql,
+        'formulas': compiladas,
+        'derivadas': derivadas,
+        'basura': '^(?:' + '|'.join(f'(?:{patron})' for patron in basura) + ')[^\n]*\n?' if basura else None,
+        'huella': hashlib.sha256(configuracion.encode('utf-8')).hexdigest(),
+        'errores': [],
+        'avisos': avisos,
+    }
 
+# Función para obtener la firma de la configuración de la que dependen los planes
+def firma_planes():
+    configuracion = json.dumps([version_planes, reportes, columnas_esperadas, inferir_tipos, motor_limpieza], sort_keys=True)
+    return hashlib.sha256(configuracion.encode('utf-8')).hexdigest()
 
-    # Ajustar el número de columnas en las filas
-    max_columns = len(headers)
-    adjusted_rows = []
-    for row in rows:
-        if len(row) < max_columns:
-            row.extend([''] * (max_columns - len(row)))  # Completar con valores vacíos
-        elif len(row) > max_columns:
-            row = row[:max_columns]  # Truncar si hay más columnas de las esperadas
-        adjusted_rows.append(row)
+# Función para obtener los planes de carga de todos los reportes (los hilos de reportes_paralelos comparten los planes)
+def cargar_planes():
+    with lock_planes:
+        return cargar_planes_sin_lock()
 
-    # Crear el DataFrame con las columnas leídas del archivo
-    df = pd.DataFrame(adjusted_rows, columns=headers)
+# Función para obtener los planes de carga sin tomar el lock. Los planes se reutilizan mientras la firma de la
+# configuración sea la misma: en el proceso (el demonio recompila cuando recargar_reportes toma otra configuración)
+# y entre ejecuciones y procesos del modo lote, que los comparten en el archivo cache_planes
+def cargar_planes_sin_lock():
+    global planes_carga
+    firma = firma_planes()
+    if planes_carga.get('firma') == firma:
+        return planes_carga['planes']
 
-    # Añadir columnas Client, Branch, Date
+    try:
+        with open(cache_planes, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        cache = {}
+    if cache.get('firma') == firma:
+        planes_carga = {'firma': firma, 'planes': cache['planes']}
+        return planes_carga['planes']
+
+    planes = {reporte: compilar_plan(reporte) for reporte in reportes}
+    for reporte, plan in planes.items():
+        for error in plan['errores']:
+            logging.error(f"Configuración del reporte {reporte}: {error}.")
+        for aviso in plan['avisos']:
+            logging.warning(f"Configuración del reporte {reporte}: {aviso}. El reporte se carga sin esa fórmula.")
+    planes_carga = {'firma': firma, 'planes': planes}
+    try:
+        temporal = f"{cache_planes}.{os.getpid()}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump({'firma': firma, 'planes': planes}, f, ensure_ascii=False)
+        os.replace(temporal, cache_planes)
+    except OSError as e:
+        logging.warning(f"No se pudo guardar el cache de planes de carga: {e}")
+    logging.info(f"Planes de carga compilados para {len(planes)} reportes.")
+    return planes
+
+# Función para obtener el plan de carga de un reporte
+def plan_reporte(reporte):
+    plan = cargar_planes().get(reporte)
+    return plan if plan is not None else compilar_plan(reporte)
+
+# Función para decidir si la primera línea de un reporte es su encabezado. Regresa las filas a omitir al leerlo
+def filas_encabezado(primera_linea, encabezados_esperados, nombre_tabla):
+    # Comparar las columnas de la primera línea con las esperadas
+    columnas = primera_linea.split('|')
+    logging.debug(f'Columnas: {columnas}')
+    columnas_esperadas_reporte = set(encabezados_esperados)
+    logging.debug(f'Columnas esperadas: {columnas_esperadas_reporte}')
+    # Verificar si al menos una columna coincide
+    if columnas_esperadas_reporte.intersection(columnas):
+        logging.info(f"Al menos una columna de {nombre_tabla} coincide con las columnas esperadas en la configuración.")
+        return 1
+    logging.info(f"El documento {nombre_tabla} no trae columnas.")
+    return 0
+
+# Función para añadir las columnas Client, Branch y Date a un bloque de filas
+def enriquecer_bloque(df, cliente, sucursal, fecha_actual):
     df.insert(0, 'Client', cliente)
     df.insert(1, 'Branch', sucursal)
     df.insert(2, 'Date', fecha_actual)
 
     # Limpiar datos (si es necesario)
     df.fillna('', inplace=True)  # Rellenar valores nulos con cadenas vacías
+    return df
 
-    # Inferir el tipo de datos de cada columna
-    def inferir_tipo_dato(serie):
-        return 'VARCHAR(255)'
+# Función para indicar si la limpieza de un reporte se hace en pandas: con motor_limpieza pandas y también con
+# motor_limpieza sql cuando el reporte tiene fórmulas que se calculan en pandas, para que las fórmulas lean los
+# valores ya limpios (en la base de datos se limpiaría después de calcularlas)
+def limpieza_en_pandas(plan):
+    return motor_limpieza == 'pandas' or (motor_formulas == 'pandas' and bool(plan['formulas']))
 
-    # Comparar las columnas actuales con las esperadas
-    columnas = set(df.columns)
-    columnas_esperadas_reporte = set(columnas_esperadas.get(reporte, []))
+# Función para aplicar a un bloque las reglas de limpieza de sus columnas cuando se limpia en pandas.
+# En los demás casos la limpieza se hace en la base de datos al cargar
+def limpiar_columnas(df, plan):
+    if not limpieza_en_pandas(plan) or not plan['limpieza']:
+        return df
+    from reglas_limpieza import compilar_regla
+    for columna, regla in plan['limpieza'].items():
+        df[columna] = compilar_regla(regla, 'pandas')(df[columna])
+    return df
 
-    if not columnas_esperadas_reporte.intersection(columnas):
-        logging.info(f"No se genera SQL dump para {nombre_tabla}. Las columnas no coinciden con las esperadas.")
-        continue
+# Función para agregar a un bloque las columnas calculadas con las fórmulas del plan, evaluadas sobre el bloque completo.
+# Con el motor sql las fórmulas se calculan en la base de datos al cargar
+def calcular_columnas(df, plan):
+    if motor_formulas != 'pandas' or not plan['formulas']:
+        return df
+    from formulas import calcular_formulas
+    return calcular_formulas(df, plan['formulas'])
+
+# Función para resolver el tipo SQL de cada columna. En la tabla consolidada mandan los tipos que ya tiene
+# (todas las particiones deben tener las mismas columnas), luego los fijados en la configuración, luego los forzados
+# por un intento anterior y al final los inferidos. Las columnas calculadas en la base de datos (motor_formulas sql)
+# no se infieren: toman el tipo del resultado de su fórmula. Regresa ({columna: tipo}, columnas con tipo inferido)
+def resolver_tipos(conexion, reporte, df, tipos_forzados=None):
+    tipos_forzados = tipos_forzados or {}
+    plan = plan_reporte(reporte)
+    tipos_configurados = plan['tipos']
+    tipos_existentes = tipos_tabla(conexion, reporte) if conexion and tablas_particionadas else {}
+    tipos_columnas = {}
+    inferidas = set()
+    for columna in plan['columnas'] + plan['derivadas']:
+        tipo_dato = tipos_existentes.get(nombre_catalogo(columna)) or tipos_configurados.get(columna)
+        if not tipo_dato and columna in plan['limpieza']:
+            # Las reglas de limpieza regresan texto: sus columnas no se infieren, así el tipo no depende del motor
+            tipo_dato = 'TEXT'
+        if not tipo_dato and columna in plan['formulas'] and motor_formulas == 'sql':
+            from formulas import tipo_sql_formula
+            tipo_dato = tipo_sql_formula(plan['formulas'][columna]) if inferir_tipos else 'VARCHAR(255)'
+        if not tipo_dato:
+            tipo_dato = inferir_tipo_dato(df[columna])
+            if columna in tipos_forzados:
+                tipo_dato = ampliar_tipo(tipos_forzados[columna], tipo_dato)
+            inferidas.add(columna)
+        tipos_columnas[columna] = tipo_dato
+    return tipos_columnas, inferidas
+
+# Función para dejar como NULL los valores vacíos de las columnas que no son de texto
+def normalizar_tipos(df, tipos_columnas):
+    for columna, tipo_dato in tipos_columnas.items():
+        if not es_tipo_texto(tipo_dato):
+            valores = df[columna].str.strip()
+            df[columna] = valores.mask(valores == '')
+    return df
+
+# Función para obtener los tipos de las columnas que se normalizan en el DataFrame: con motor_formulas sql las columnas
+# calculadas toman su valor en la base de datos
+def tipos_dataframe(plan, tipos_columnas):
+    if motor_formulas != 'sql':
+        return tipos_columnas
+    return {columna: tipo for columna, tipo in tipos_columnas.items() if columna not in plan['formulas']}
+
+# Función para armar la expresión SQL con la que se inserta cada columna de la tabla desde la tabla temporal de texto
+# de copiar_datos: las reglas de limpieza con motor_limpieza sql, las fórmulas con motor_formulas sql y, para las
+# demás columnas, la conversión de texto a su tipo. Regresa None si no hay nada que calcular en la base de datos
+def expresiones_sql(plan, tipos_columnas):
+    limpieza = plan['limpieza_sql'] if not limpieza_en_pandas(plan) else {}
+    calculadas = plan['formulas'] if motor_formulas == 'sql' else {}
+    if not limpieza and not calculadas:
+        return None
+    from formulas import columna_sql
+    leidas = ['Client', 'Branch', 'Date'] + plan['columnas']
+    identificadores = dict(zip(leidas + plan['derivadas'], plan['identificadores']))
+    tipos = dict(tipos_columnas, Client='VARCHAR(255)', Branch='VARCHAR(255)', Date='DATE')
+    textos = {columna: limpieza.get(columna, identificador) for columna, identificador in identificadores.items()}
+    # Las fórmulas leen los valores ya limpios, aquí o en pandas (limpieza_en_pandas)
+    referencias = {columna: f"coalesce({textos[columna]}, '')" for columna in leidas}
+    expresiones = {}
+    for columna in identificadores:
+        tipo = tipos[columna]
+        if columna in calculadas:
+            expresiones[columna] = columna_sql(calculadas[columna], referencias, tipo, es_tipo_texto(tipo))
+        elif es_tipo_texto(tipo):
+            expresiones[columna] = textos[columna]
+        else:
+            expresiones[columna] = f"({textos[columna]})::{tipo}"
+    return expresiones
+
+# Función para armar la definición de las columnas de la tabla de un reporte
+def definicion_tabla(plan, tipos_columnas):
+    definicion_columnas = "    Client VARCHAR(255),\n"
+    definicion_columnas += "    Branch VARCHAR(255),\n"
+    definicion_columnas += "    Date DATE,\n"
+    for identificador, columna in zip(plan['identificadores'][3:], plan['columnas'] + plan['derivadas']):
+        definicion_columnas += f"    {identificador} {tipos_columnas[columna]},\n"
+    return definicion_columnas.rstrip(',\n')
 
+# Función para indicar si las fórmulas de un reporte se calculan en la base de datos
+def formulas_en_sql(plan):
+    return motor_formulas == 'sql' and bool(plan['formulas'])
+
+# Función para escribir en el dump la estructura de la tabla de un reporte, antes de sus filas. Con las fórmulas en la
+# base de datos se escriben también las funciones temporales que usan sus expresiones
+def escribir_estructura(dump, nombre_tabla, definicion_columnas, plan):
     # Crear la consulta SQL para crear la tabla
-    create_table_query = f"CREATE TABLE IF NOT EXISTS {nombre_tabla} (\n"
-    create_table_query += "    Client VARCHAR(255),\n"
-    create_table_query += "    Branch VARCHAR(255),\n"
-    create_table_query += "    Date DATE,\n"
-    for columna in df.columns[3:]:
-        tipo_dato = inferir_tipo_dato(df[columna])
-        create_table_query += f"    {columna} {tipo_dato},\n"
-    create_table_query = create_table_query.rstrip(',\n') + "\n);"
+    create_table_query = f"CREATE TABLE IF NOT EXISTS {nombre_tabla} (\n{definicion_columnas}\n);"
 
     # Añadir ENGINE y CHARSET a la consulta SQL
     create_table_query += "\n-- ENGINE=InnoDB CHARSET=utf8mb4\n"
@@ -326,29 +1396,764 @@ for reporte in reportes:
     # Crear la consulta SQL para eliminar la tabla si existe
     drop_query = f"DROP TABLE IF EXISTS {nombre_tabla};"
 
-    # Crear la consulta SQL para insertar los datos
-    insert_query = f"INSERT INTO {nombre_tabla} ({', '.join(df.columns)}) VALUES "
-    values_list = df.apply(lambda x: tuple(x), axis=1).tolist()
-    values_query = ', '.join([str(v) for v in values_list])
-    insert_query += values_query + ";"
-
-    # Guardar las consultas SQL en un archivo .sql.dump
-    consultas = [
-        f"-- Table structure for table {nombre_tabla}",
-        drop_query,
-        create_table_query,
-        f"-- Dumping data for table {nombre_tabla}",
-        insert_query
-    ]
-    archivo_sql = os.path.join(sandbx, f"{nombre_tabla}.sql.dump")
-    guardar_sql_dump(archivo_sql, consultas, version_servidor)
-    
+    dump.escribir(f"-- Table structure for table {nombre_tabla}")
+    dump.escribir(drop_query)
+    dump.escribir(create_table_query)
+    if formulas_en_sql(plan):
+        from formulas import funciones_sql
+        dump.escribir(funciones_sql)
+    dump.escribir(f"-- Dumping data for table {nombre_tabla}")
+
+# Función para cargar un reporte (DataFrame o secuencia de bloques) en su tabla o en su partición de la tabla consolidada
+def cargar_reporte_db(conexion, reporte, nombre_tabla, cliente, sucursal, fecha_actual, tipos_columnas, definicion_columnas, datos):
+    plan = plan_reporte(reporte)
+    indices = plan['indices']
+    expresiones = expresiones_sql(plan, tipos_columnas)
+    if formulas_en_sql(plan):
+        # Funciones temporales que usan las expresiones de las fórmulas, en la transacción de la carga
+        from formulas import funciones_sql
+        try:
+            conexion.cursor().execute(funciones_sql)
+        except Error as e:
+            conexion.rollback()
+            logging.error(f"No se pudieron crear las funciones de las fórmulas para {nombre_tabla}: {e}")
+            return False
+    if tablas_particionadas:
+        return cargar_particion(conexion, reporte, cliente, sucursal, fecha_actual, definicion_columnas, datos, indices, expresiones) is not None
+    return cargar_con_staging(conexion, nombre_tabla, definicion_columnas, datos, indices, expresiones)
+
+# Función para generar la salida Parquet de un reporte desde su tabla (o partición) ya cargada. Se usa cuando la
+# limpieza o las fórmulas se calculan en la base de datos, para que Parquet lleve los mismos valores que la tabla.
+# Las filas se leen como texto en lotes de tamano_lote_copy con un cursor del servidor
+def exportar_parquet_tabla(conexion, reporte, nombre_tabla, cliente, sucursal, fecha_actual, tipos_columnas):
+    plan = plan_reporte(reporte)
+    tabla = nombre_particion(reporte, cliente, sucursal, fecha_actual)[1] if tablas_particionadas else nombre_tabla
+    columnas = ['Client', 'Branch', 'Date'] + plan['columnas'] + plan['derivadas']
+    seleccion = ', '.join(f"{identificador}::text" for identificador in plan['identificadores'])
+    try:
+        with EscritorParquet(reporte, cliente, sucursal, fecha_actual, tipos_columnas) as parquet:
+            conexion.cursor().execute("SET LOCAL datestyle TO 'ISO, DMY';")
+            cursor = conexion.cursor(name='salida_parquet')
+            cursor.execute(f"SELECT {seleccion} FROM {tabla};")
+            while True:
+                filas = cursor.fetchmany(tamano_lote_copy)
+                if not filas:
+                    break
+                parquet.escribir(pd.DataFrame(filas, columns=columnas, dtype=object))
+            cursor.close()
+        conexion.commit()
+    except Exception as e:
+        conexion.rollback()
+        logging.error(f"Se produjo un error al guardar la salida Parquet de {nombre_tabla}: {e}")
+
+# Función para generar la salida Parquet de un reporte que se limpia o calcula en la base de datos: sale de la tabla
+# cargada, así que sin conexión o si la carga falló no se genera
+def salida_parquet_tabla(conexion, exito, reporte, nombre_tabla, cliente, sucursal, fecha_actual, tipos_columnas, medicion):
+    if not conexion:
+        logging.warning(f"No se genera la salida Parquet de {nombre_tabla}: con la limpieza o las fórmulas en la base de datos se genera desde la tabla cargada.")
+    elif exito:
+        with medicion.etapa('parquet'):
+            exportar_parquet_tabla(conexion, reporte, nombre_tabla, cliente, sucursal, fecha_actual, tipos_columnas)
+
+# Función para procesar un reporte: limpieza, DataFrame, dump y carga. Regresa False si hubo error
+# medicion acumula los segundos de cada etapa y las filas del reporte
+def procesar_reporte(conexion, reporte, stream, cliente, sucursal, fecha_actual, carpeta, version_servidor, medicion=None):
+    medicion = medicion or MetricasReporte(reporte)
+    if memoria_reporte_mb:
+        return procesar_reporte_por_bloques(conexion, reporte, stream, cliente, sucursal, fecha_actual, carpeta, version_servidor, medicion)
+
+    nombre_tabla = f"{reporte}{sucursal}"
+
+    # Decodificar el stream una sola vez con la codificación detectada (o guardada en el cache)
+    try:
+        with medicion.etapa('decodificacion'):
+            raw_data = decodificar_reporte(stream, cliente, reporte)
+    except (LookupError, OSError) as e:
+        logging.error(f"No se pudo leer el reporte {nombre_tabla}: {e}")
+        return False
+
+    # Usar el plan compilado de la configuración: encabezados esperados y columnas con sufijos únicos
+    plan = plan_reporte(reporte)
+    columnas_esperadas_reporte = set(plan['firma_encabezado'])
+
+    with medicion.etapa('limpieza_encabezado'):
+        # Se salta la basura hasta el encabezado; el parser lee el reporte desde ahí sin copiarlo completo
+        lector = LectorReporte(raw_data, plan['basura'])
+        filas_omitidas = filas_encabezado(lector.primera_linea, plan['firma_encabezado'], nombre_tabla)
+
+    if not plan['columnas']:
+        logging.info(f"No se genera SQL dump para {nombre_tabla}. No hay columnas esperadas en la configuración.")
+        return True
+    headers = plan['columnas']
+
+    # Crear el DataFrame con el parser en C de pandas. usecols completa con '' las filas cortas
+    # y descarta los campos sobrantes de las filas largas, sin recorrer las filas en Python
+    with medicion.etapa('dataframe'):
+        df = leer_reporte_csv(lector, headers, filas_omitidas)
+    medicion.filas = len(df)
+
+    # Añadir columnas Client, Branch, Date
+    with medicion.etapa('normalizacion'):
+        df = enriquecer_bloque(df, cliente, sucursal, fecha_actual)
+    with medicion.etapa('limpieza'):
+        df = limpiar_columnas(df, plan)
+    with medicion.etapa('formulas'):
+        df = calcular_columnas(df, plan)
+
+    # Comparar las columnas actuales con las esperadas
+    columnas = set(df.columns)
+
+    if not columnas_esperadas_reporte.intersection(columnas):
+        logging.info(f"No se genera SQL dump para {nombre_tabla}. Las columnas no coinciden con las esperadas.")
+        return True
+
+    # Definir las columnas de la tabla. En columnas tipadas los valores vacíos se cargan como NULL
+    with medicion.etapa('normalizacion'):
+        tipos_columnas = resolver_tipos(conexion, reporte, df)[0]
+        df = normalizar_tipos(df, tipos_dataframe(plan, tipos_columnas))
+        definicion_columnas = definicion_tabla(plan, tipos_columnas)
+        expresiones = expresiones_sql(plan, tipos_columnas)
+
+    # Guardar las consultas SQL en un archivo .sql.dump, con los datos en INSERT por lotes
+    archivo_sql = os.path.join(carpeta, f"{nombre_tabla}.sql.dump")
+    try:
+        with medicion.etapa('dump'), EscritorDump(archivo_sql, version_servidor, compresion_dump) as dump:
+            escribir_estructura(dump, nombre_tabla, definicion_columnas, plan)
+            dump.escribir_filas(nombre_tabla, df, plan['lista_columnas'], expresiones)
+    except Exception as e:
+        logging.error(f"Se produjo un error al guardar el archivo SQL dump: {e}")
+
+    # Guardar el DataFrame limpio en Parquet, particionado por cliente, sucursal y fecha (opcional)
+    if salida_parquet and expresiones is None:
+        try:
+            with medicion.etapa('parquet'), EscritorParquet(reporte, cliente, sucursal, fecha_actual, tipos_columnas) as parquet:
+                parquet.escribir(df)
+        except Exception as e:
+            logging.error(f"Se produjo un error al guardar la salida Parquet de {nombre_tabla}: {e}")
+
+    exito = True
     if conexion:
-        ejecutar_consulta(conexion, drop_query)
-        ejecutar_consulta(conexion, create_table_query)
-        ejecutar_consulta(conexion, insert_query)
-
-# Cerrar la conexión a la base de datos
-if conexion:
-    conexion.close()
-    logging.info("Conexión a la base de datos cerrada.")
+        with medicion.etapa('carga'):
+            exito = cargar_reporte_db(conexion, reporte, nombre_tabla, cliente, sucursal, fecha_actual, tipos_columnas, definicion_columnas, df)
+    if salida_parquet and expresiones is not None:
+        salida_parquet_tabla(conexion, exito, reporte, nombre_tabla, cliente, sucursal, fecha_actual, tipos_columnas, medicion)
+    return exito
+
+# Función para procesar un reporte por bloques de filas, con la memoria acotada por memoria_reporte_mb sin importar
+# el tamaño del reporte. Cada bloque se normaliza, se escribe en el dump y en Parquet y se envía con COPY a la tabla
+# de staging dentro de la misma transacción. Los tipos se infieren con el primer bloque: si un bloque posterior no cabe
+# en ellos, o el reporte no está completo en la codificación detectada, se descarta lo hecho y se vuelve a leer el stream.
+# En medicion, 'dataframe' incluye la decodificación y 'carga' solo el tiempo de la base de datos
+def procesar_reporte_por_bloques(conexion, reporte, stream, cliente, sucursal, fecha_actual, carpeta, version_servidor, medicion):
+    nombre_tabla = f"{reporte}{sucursal}"
+    plan = plan_reporte(reporte)
+    if not plan['columnas']:
+        logging.info(f"No se genera SQL dump para {nombre_tabla}. No hay columnas esperadas en la configuración.")
+        return True
+    headers = plan['columnas']
+
+    # Un intento completo sobre el stream con la codificación y los tipos forzados indicados
+    def intentar(codificacion, tipos_forzados):
+        texto = io.TextIOWrapper(stream, encoding=codificacion)
+        medicion.filas = 0
+        try:
+            with medicion.etapa('limpieza_encabezado'):
+                entrada = LectorReporte(texto, plan['basura'])
+                filas_omitidas = filas_encabezado(entrada.primera_linea, plan['firma_encabezado'], nombre_tabla) if entrada.primera_linea else 0
+
+            # El primer bloque mide filas_por_bloque filas y con él se resuelven los tipos
+            with medicion.etapa('dataframe'):
+                lector = leer_reporte_csv(entrada, headers, filas_omitidas, filas_muestra_bloque)
+                muestra = siguiente_bloque(lector, filas_muestra_bloque)
+                if muestra is None:
+                    muestra = pd.DataFrame(columns=headers, dtype=str)
+                filas = filas_por_bloque(muestra)
+                resto = siguiente_bloque(lector, filas - len(muestra)) if len(muestra) == filas_muestra_bloque < filas else None
+            with medicion.etapa('normalizacion'):
+                primer_bloque = enriquecer_bloque(pd.concat([muestra, resto]) if resto is not None else muestra, cliente, sucursal, fecha_actual)
+            with medicion.etapa('limpieza'):
+                primer_bloque = limpiar_columnas(primer_bloque, plan)
+            with medicion.etapa('formulas'):
+                primer_bloque = calcular_columnas(primer_bloque, plan)
+            with medicion.etapa('normalizacion'):
+                tipos_columnas, inferidas = resolver_tipos(conexion, reporte, primer_bloque, tipos_forzados)
+                definicion_columnas = definicion_tabla(plan, tipos_columnas)
+                expresiones = expresiones_sql(plan, tipos_columnas)
+            logging.info(f"Procesando {nombre_tabla} en bloques de {filas} filas.")
+
+            with contextlib.ExitStack() as salidas:
+                dump = salidas.enter_context(EscritorDump(os.path.join(carpeta, f"{nombre_tabla}.sql.dump"), version_servidor, compresion_dump))
+                escribir_estructura(dump, nombre_tabla, definicion_columnas, plan)
+                # Con la limpieza o las fórmulas en la base de datos, Parquet se genera desde la tabla ya cargada
+                parquet = None
+                if salida_parquet and expresiones is None:
+                    try:
+                        parquet = salidas.enter_context(EscritorParquet(reporte, cliente, sucursal, fecha_actual, tipos_columnas))
+                    except ImportError as e:
+                        logging.error(f"Se produjo un error al guardar la salida Parquet de {nombre_tabla}: {e}")
+
+                # Siguiente bloque del reporte, normalizado, limpio y con las fórmulas. None al terminar
+                def leer_bloque():
+                    with medicion.etapa('dataframe'):
+                        df = siguiente_bloque(lector, filas)
+                    if df is not None:
+                        with medicion.etapa('normalizacion'):
+                            df = enriquecer_bloque(df, cliente, sucursal, fecha_actual)
+                        with medicion.etapa('limpieza'):
+                            df = limpiar_columnas(df, plan)
+                        with medicion.etapa('formulas'):
+                            df = calcular_columnas(df, plan)
+                    return df
+
+                # Un bloque con valores que no caben en los tipos obliga a releer el reporte desde el inicio: el dump ya
+                # tiene el CREATE TABLE, la tabla de staging ya recibió filas y el esquema de Parquet quedó fijo con los
+                # tipos anteriores. Antes de releer se recorre el resto del reporte solo para inferir (sin dump, Parquet
+                # ni carga), y así todas las columnas se amplían de una vez y el reporte se relee una sola vez
+                def ampliar_con_resto(df, ampliar):
+                    tipos = {**tipos_columnas, **ampliar}
+                    while df is not None:
+                        with medicion.etapa('normalizacion'):
+                            nuevos = tipos_a_ampliar(df, tipos, inferidas)
+                        ampliar.update(nuevos)
+                        tipos.update(nuevos)
+                        df = leer_bloque()
+                    return ampliar
+
+                # Bloques normalizados, escritos en el dump y en Parquet a medida que la carga los consume
+                def bloques():
+                    nonlocal parquet
+                    df = primer_bloque
+                    while df is not None:
+                        with medicion.etapa('normalizacion'):
+                            ampliar = tipos_a_ampliar(df, tipos_columnas, inferidas) if df is not primer_bloque else {}
+                        if ampliar:
+                            raise TiposAmpliados(ampliar_con_resto(leer_bloque(), ampliar))
+                        with medicion.etapa('normalizacion'):
+                            df = normalizar_tipos(df, tipos_dataframe(plan, tipos_columnas))
+                        with medicion.etapa('dump'):
+                            dump.escribir_filas(nombre_tabla, df, plan['lista_columnas'], expresiones)
+                        if parquet:
+                            # Como en procesar_reporte, un error en Parquet (por ejemplo, un valor que no cabe en un
+                            # tipo fijado) solo descarta la salida Parquet del reporte y la carga sigue
+                            try:
+                                with medicion.etapa('parquet'):
+                                    parquet.escribir(df)
+                            except Exception as e:
+                                logging.error(f"Se produjo un error al guardar la salida Parquet de {nombre_tabla}: {e}. Se descarta la salida Parquet del reporte.")
+                                parquet.descartar()
+                                parquet = None
+                        medicion.filas += len(df)
+                        yield df
+                        df = leer_bloque()
+
+                if not conexion:
+                    for _ in bloques():
+                        pass
+                    if salida_parquet and expresiones is not None:
+                        salida_parquet_tabla(conexion, True, reporte, nombre_tabla, cliente, sucursal, fecha_actual, tipos_columnas, medicion)
+                    return True
+
+                # La carga consume los bloques: a su tiempo total se le restan las etapas medidas dentro de bloques()
+                segundos_etapas = medicion.segundos()
+                inicio = time.perf_counter()
+                exito = cargar_reporte_db(conexion, reporte, nombre_tabla, cliente, sucursal, fecha_actual, tipos_columnas, definicion_columnas, bloques())
+                medicion.sumar('carga', time.perf_counter() - inicio - (medicion.segundos() - segundos_etapas))
+                if salida_parquet and expresiones is not None:
+                    salida_parquet_tabla(conexion, exito, reporte, nombre_tabla, cliente, sucursal, fecha_actual, tipos_columnas, medicion)
+                return exito
+        finally:
+            texto.detach()
+
+    try:
+        codificacion = obtener_codificacion(stream, cliente, reporte)
+    except (LookupError, OSError) as e:
+        logging.error(f"No se pudo leer el reporte {nombre_tabla}: {e}")
+        return False
+    tipos_forzados = {}
+    while True:
+        stream.seek(0)
+        try:
+            return intentar(codificacion, tipos_forzados)
+        except UnicodeDecodeError:
+            # La muestra no fue representativa: se relee completo en ISO-8859-1, que acepta cualquier byte, y se
+            # descarta la codificación del cache
+            logging.warning(f"El reporte {reporte} no es {codificacion} en su totalidad. Se lee como ISO-8859-1.")
+            olvidar_codificacion(cliente, reporte)
+            codificacion = 'ISO-8859-1'
+        except TiposAmpliados as e:
+            logging.warning(f"{nombre_tabla}: {e}. Se vuelve a procesar el reporte.")
+            tipos_forzados.update(e.tipos)
+        except (LookupError, OSError) as e:
+            logging.error(f"No se pudo procesar el reporte {nombre_tabla} por bloques: {e}")
+            if conexion:
+                conexion.rollback()
+            return False
+        # Descartar la transacción del intento interrumpido antes de volver a leer
+        if conexion:
+            conexion.rollback()
+
+# Función para procesar un archivo ZIP completo. Regresa el número de reportes con error.
+# pool_compartido es un pool de conexiones que ya está abierto (modo demonio): se usa y no se cierra
+def procesar_zip(workng, carpeta=None, pool_compartido=None):
+    carpeta = carpeta or sandbx
+
+    # Verificar existencia y permisos del archivo ZIP
+    if not os.path.isfile(workng):
+        raise FileNotFoundError(f"El archivo ZIP no existe en la ruta especificada: {workng}")
+    elif not os.access(workng, os.R_OK):
+        raise PermissionError(f"Permiso denegado para leer el archivo ZIP: {workng}")
+
+    # Crear la carpeta de trabajo del ZIP si no existe
+    os.makedirs(carpeta, exist_ok=True)
+
+    # Obtener la información
+    cliente, sucursal, fecha_actual = extraer_info_zip(workng, carpeta)
+    cliente = cliente.lstrip('0')
+    metricas = MetricasZip(workng, cliente, sucursal, fecha_actual)
+
+    zip_stream = None
+    miembros_zip = {}
+    if leer_zip_directo:
+        # Leer los reportes directamente del ZIP, sin descomprimirlo en la Sandbx
+        zip_stream = zipfile.ZipFile(workng, 'r')
+        miembros_zip = buscar_miembros_zip(zip_stream, reportes)
+        logging.info(f"Leyendo {len(miembros_zip)} reportes directamente de {workng}")
+    else:
+        # Intentar descomprimir el archivo ZIP
+        try:
+            with zipfile.ZipFile(workng, 'r') as zip_ref, metricas.etapa('descompresion'):
+                zip_ref.extractall(carpeta)
+                miembros_zip = buscar_miembros_zip(zip_ref, reportes)
+                logging.info(f"Archivo descomprimido en {carpeta}")
+        except PermissionError:
+            logging.error("Permiso denegado para acceder al archivo ZIP o a la carpeta de destino.")
+            raise
+        except Exception as e:
+            logging.error(f"Se produjo un error al descomprimir el archivo: {e}")
+            raise
+
+        # Renombrar los archivos extraídos. Se usa el miembro de cada reporte (gana el prefijo más largo), así un archivo
+        # VTAUSA02... no se renombra también como VTAUSA
+        for reporte, info in miembros_zip.items():
+            archivo = info.filename
+            nuevo_nombre = f"{reporte}{sucursal}.txt"
+            ruta_antigua = os.path.join(carpeta, archivo)
+            ruta_nueva = os.path.join(carpeta, nuevo_nombre)
+            if ruta_antigua != ruta_nueva:
+                os.replace(ruta_antigua, ruta_nueva)
+                logging.info(f"Archivo renombrado de {archivo} a {nuevo_nombre}")
+
+    # Abrir el stream binario de un reporte del ZIP o de la Sandbx. Regresa None si el reporte no viene
+    def abrir_reporte(reporte):
+        ruta_archivo = os.path.join(carpeta, f'{reporte}{sucursal}.txt')
+
+        if leer_zip_directo:
+            info = miembros_zip.get(reporte)
+            if info is None:
+                logging.warning(f"El reporte {reporte} no se encontró en el archivo ZIP {workng}. Omitiendo este reporte.")
+                return None
+
+            # Guardar una copia extraída solo si se solicita
+            if guardar_txt_extraido:
+                with zip_stream.open(info) as miembro, open(ruta_archivo, 'wb') as f:
+                    shutil.copyfileobj(miembro, f)
+
+            # Leer el miembro del ZIP sin pasar por el disco
+            return zip_stream.open(info)
+
+        # Verificar existencia del archivo TXT
+        if not os.path.isfile(ruta_archivo):
+            logging.warning(f"El archivo TXT no se encontró en la ruta especificada: {ruta_archivo}. Omitiendo este reporte.")
+            return None
+
+        return open(ruta_archivo, 'rb')
+
+    # Leer y procesar un reporte con la conexión indicada, omitiéndolo si no cambió desde la última carga
+    def cargar_reporte(conexion, reporte):
+        if tablas_particionadas:
+            nombre_tabla = nombre_particion(reporte, cliente, sucursal, fecha_actual)[1]
+        else:
+            nombre_tabla = f"{reporte}{sucursal}"
+        info = miembros_zip.get(reporte)
+        medicion = metricas.reporte(reporte)
+        medicion.bytes = info.file_size if info else 0
+        errores_plan = plan_reporte(reporte)['errores']
+        if errores_plan:
+            logging.error(f"La configuración del reporte {reporte} no es válida: {'; '.join(errores_plan)}. Omitiendo este reporte.")
+            medicion.estado = 'error'
+            return False
+        huella = None
+        if conexion and info:
+            with (zip_stream.open(info) if leer_zip_directo else open(os.path.join(carpeta, f'{reporte}{sucursal}.txt'), 'rb')) as contenido:
+                huella = huella_reporte(contenido, reporte)
+        if conexion and huella and omitir_sin_cambios and reporte_sin_cambios(conexion, cliente, sucursal, reporte, nombre_tabla, huella):
+            logging.info(f"El reporte {nombre_tabla} no cambió desde la última carga. Omitiendo este reporte.")
+            medicion.estado = 'sin_cambios'
+            return True
+
+        stream = abrir_reporte(reporte)
+        if stream is None:
+            medicion.estado = 'no_encontrado'
+            return True
+        with stream:
+            exito = procesar_reporte(conexion, reporte, stream, cliente, sucursal, fecha_actual, carpeta, version_servidor, medicion)
+        medicion.estado = 'cargado' if exito else 'error'
+
+        if exito and conexion and huella:
+            registrar_carga(conexion, cliente, sucursal, reporte, nombre_tabla, huella)
+        return exito
+
+    # Leer y procesar un reporte con una conexión tomada del pool (una por hilo)
+    def cargar_reporte_pool(reporte):
+        conexion = pool.getconn() if pool else None
+        try:
+            return cargar_reporte(conexion, reporte)
+        finally:
+            if conexion:
+                pool.putconn(conexion)
+
+    pool = pool_compartido
+    conexion = None
+    errores = 0
+    try:
+        if pool or reportes_paralelos > 1:
+            # Conectar a la base de datos con un pool acotado a una conexión por hilo
+            if not pool:
+                pool = conectar_pool(db_config.get('host', ''), db_config.get('usuario', ''), db_config.get('contrasena', ''), db_config.get('base_de_datos', ''), reportes_paralelos)
+
+            # Obtener la versión del servidor
+            version_servidor = "Desconocida"
+            if pool:
+                conexion_version = pool.getconn()
+                version_servidor = obtener_version_servidor(conexion_version)
+                pool.putconn(conexion_version)
+
+            # Procesar los reportes en paralelo: mientras un hilo parsea con pandas, otro carga en la base de datos
+            # Un error inesperado en un hilo marca solo ese reporte como fallido; los demás se siguen procesando y midiendo
+            with ThreadPoolExecutor(max_workers=reportes_paralelos) as executor:
+                futuros = {reporte: executor.submit(cargar_reporte_pool, reporte) for reporte in reportes}
+                for reporte, futuro in futuros.items():
+                    try:
+                        exito = futuro.result()
+                    except Exception as e:
+                        logging.error(f"Error inesperado al procesar el reporte {reporte}: {e}")
+                        metricas.reporte(reporte).estado = 'error'
+                        exito = False
+                    if not exito:
+                        errores += 1
+        else:
+            # Conectar a la base de datos
+            conexion = conectar_db(db_config.get('host', ''), db_config.get('usuario', ''), db_config.get('contrasena', ''), db_config.get('base_de_datos', ''))
+
+            # Obtener la versión del servidor
+            if conexion:
+                version_servidor = obtener_version_servidor(conexion)
+            else:
+                version_servidor = "Desconocida"
+
+            # Iterar sobre cada reporte y realizar las operaciones de creación de tabla e inserción
+            for reporte in reportes:
+                if not cargar_reporte(conexion, reporte):
+                    errores += 1
+    finally:
+        # Cerrar el archivo ZIP abierto en modo directo
+        if zip_stream:
+            zip_stream.close()
+
+        # Cerrar la conexión o el pool de conexiones a la base de datos
+        if conexion:
+            conexion.close()
+            logging.info("Conexión a la base de datos cerrada.")
+        if pool and pool is not pool_compartido:
+            pool.closeall()
+            logging.info("Pool de conexiones a la base de datos cerrado.")
+
+    metricas.cerrar(errores)
+    registrar_metricas(metricas)
+    return errores
+
+# Función para guardar las métricas de un ZIP en el archivo JSON lines y, si se configura, en el textfile de Prometheus
+def registrar_metricas(metricas):
+    try:
+        if archivo_metricas:
+            escribir_jsonl(metricas, archivo_metricas)
+        if carpeta_prometheus:
+            escribir_prometheus(metricas, carpeta_prometheus)
+    except OSError as e:
+        logging.warning(f"No se pudieron guardar las métricas de {metricas.archivo}: {e}")
+
+# Función que procesa, dentro de un proceso del pool, los ZIP de una misma sucursal uno tras otro
+def procesar_grupo_zips(rutas):
+    resultados = []
+    for ruta in rutas:
+        # Cada ZIP trabaja en su propia subcarpeta de la Sandbx para no pisar archivos de otros procesos
+        carpeta = os.path.join(sandbx, os.path.splitext(os.path.basename(ruta))[0])
+        try:
+            errores = procesar_zip(ruta, carpeta)
+            if errores:
+                resultados.append((ruta, False, f"{errores} reportes con error"))
+            else:
+                resultados.append((ruta, True, "OK"))
+        except Exception as e:
+            logging.error(f"Se produjo un error al procesar {ruta}: {e}")
+            resultados.append((ruta, False, str(e)))
+    return resultados
+
+# Función para procesar varios ZIP en paralelo en un pool de procesos
+def procesar_lote(rutas, trabajadores):
+    # Las tablas se nombran {reporte}{sucursal}: los ZIP de una misma sucursal van en orden en el mismo proceso
+    grupos = {}
+    for ruta in rutas:
+        cliente, sucursal, fecha_zip = parsear_nombre_zip(ruta)
+        grupos.setdefault(sucursal, []).append(ruta)
+
+    logging.info(f"Procesando {len(rutas)} archivos ZIP en {len(grupos)} grupos con {trabajadores} procesos.")
+    resultados = []
+    with ProcessPoolExecutor(max_workers=trabajadores) as executor:
+        futuros = {executor.submit(procesar_grupo_zips, grupo): grupo for grupo in grupos.values()}
+        for futuro in as_completed(futuros):
+            try:
+                resultados.extend(futuro.result())
+            except Exception as e:
+                resultados.extend((ruta, False, str(e)) for ruta in futuros[futuro])
+
+    # Resumen por archivo
+    correctos = sum(1 for _, exito, _ in resultados if exito)
+    logging.info(f"Resumen del lote: {correctos} correctos, {len(resultados) - correctos} con error.")
+    for ruta, exito, mensaje in sorted(resultados):
+        if exito:
+            logging.info(f"  OK     {os.path.basename(ruta)}")
+        else:
+            logging.error(f"  ERROR  {os.path.basename(ruta)}: {mensaje}")
+    return resultados
+
+# Función para recargar reportes y columnas_esperadas si cambió config.json o la pestaña (las demás claves se leen al
+# arrancar). firmas guarda la fecha de modificación de los archivos en la última lectura
+def recargar_reportes(firmas):
+    global reportes, columnas_esperadas
+    rutas = ['config.json'] + ([os.path.join('CLIENTS', 'dms', f'{tab}.json')] if tab else [])
+    try:
+        firma = tuple(os.path.getmtime(ruta) for ruta in rutas)
+        if firmas.get('reportes') in (None, firma):
+            firmas['reportes'] = firma
+            return
+        with open(rutas[-1], 'r', encoding='utf-8') as f:
+            configuracion = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logging.warning(f"No se pudo recargar la configuración de los reportes; se mantiene la anterior: {e}")
+        return
+    reportes = configuracion.get('reportes', [])
+    columnas_esperadas = configuracion.get('columnas_esperadas', {})
+    firmas['reportes'] = firma
+    logging.info(f"Configuración de los reportes recargada de {rutas[-1]}.")
+
+# Función para comprobar el pool de conexiones del demonio con SELECT 1 y crearlo de nuevo si la conexión se perdió
+def verificar_pool(pool):
+    if pool:
+        conexion = pool.getconn()
+        try:
+            conexion.cursor().execute("SELECT 1;")
+            conexion.rollback()
+            pool.putconn(conexion)
+            return pool
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            logging.warning(f"Se perdió la conexión a la base de datos: {e}. Reconectando.")
+            pool.putconn(conexion, close=True)
+            pool.closeall()
+    return conectar_pool(db_config.get('host', ''), db_config.get('usuario', ''), db_config.get('contrasena', ''), db_config.get('base_de_datos', ''), max(1, reportes_paralelos))
+
+# Función para esperar a que un ZIP termine de copiarse: su tamaño y fecha no cambian durante espera_archivo_estable
+# segundos. Regresa la firma (fecha de modificación, tamaño) o None si el archivo desapareció
+def esperar_archivo_completo(ruta, detener):
+    try:
+        estado = os.stat(ruta)
+        while not detener.wait(espera_archivo_estable):
+            nuevo = os.stat(ruta)
+            if (nuevo.st_mtime_ns, nuevo.st_size) == (estado.st_mtime_ns, estado.st_size):
+                return (nuevo.st_mtime_ns, nuevo.st_size)
+            estado = nuevo
+    except FileNotFoundError:
+        pass
+    return None
+
+# Función para vigilar workng_dir con inotify (o el mecanismo del sistema) a través del paquete opcional watchdog.
+# Regresa el observador iniciado o None si watchdog no está instalado
+def vigilar_con_watchdog(encolar):
+    try:
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+    except ImportError:
+        return None
+
+    class ManejadorZips(FileSystemEventHandler):
+        def on_created(self, evento):
+            encolar(evento.src_path)
+
+        def on_modified(self, evento):
+            encolar(evento.src_path)
+
+        def on_moved(self, evento):
+            encolar(evento.dest_path)
+
+    observador = Observer()
+    observador.schedule(ManejadorZips(), workng_dir, recursive=False)
+    observador.start()
+    return observador
+
+# Función para vigilar workng_dir sondeando cada intervalo_sondeo segundos (sin watchdog, o en carpetas de red)
+def vigilar_con_sondeo(encolar, detener):
+    while not detener.is_set():
+        for archivo in sorted(os.listdir(workng_dir)):
+            encolar(os.path.join(workng_dir, archivo))
+        detener.wait(intervalo_sondeo)
+
+# Función para el modo demonio: vigila workng_dir y procesa cada ZIP nuevo o modificado en cuanto termina de llegar.
+# El proceso, el pool de conexiones y la configuración se mantienen entre archivos. Termina con Ctrl+C o SIGTERM
+def ejecutar_demonio():
+    cola = queue.Queue()
+    pendientes = set()
+    lock_pendientes = threading.Lock()
+    procesados = {}
+    firmas = {}
+    detener = threading.Event()
+
+    # Poner un ZIP en la cola una sola vez aunque lleguen varios eventos antes de procesarlo
+    def encolar(ruta):
+        if not ruta.endswith('.zip'):
+            return
+        with lock_pendientes:
+            if ruta not in pendientes:
+                pendientes.add(ruta)
+                cola.put(ruta)
+
+    signal.signal(signal.SIGTERM, lambda numero, marco: detener.set())
+    recargar_reportes(firmas)
+    pool = verificar_pool(None)
+
+    # Los ZIP que ya están en la carpeta se procesan al arrancar
+    observador = vigilar_con_watchdog(encolar)
+    if observador:
+        logging.info(f"Modo demonio: vigilando {workng_dir} con watchdog.")
+        for archivo in sorted(os.listdir(workng_dir)):
+            encolar(os.path.join(workng_dir, archivo))
+    else:
+        logging.info(f"Modo demonio: vigilando {workng_dir} cada {intervalo_sondeo} s (watchdog no está instalado).")
+        threading.Thread(target=vigilar_con_sondeo, args=(encolar, detener), daemon=True).start()
+
+    try:
+        while not detener.is_set():
+            try:
+                ruta = cola.get(timeout=1)
+            except queue.Empty:
+                continue
+            # Los ZIP ya procesados que no cambiaron se descartan sin esperar
+            try:
+                estado = os.stat(ruta)
+                if procesados.get(ruta) == (estado.st_mtime_ns, estado.st_size):
+                    with lock_pendientes:
+                        pendientes.discard(ruta)
+                    continue
+            except FileNotFoundError:
+                pass
+            firma = esperar_archivo_completo(ruta, detener)
+            with lock_pendientes:
+                pendientes.discard(ruta)
+            if firma is None or procesados.get(ruta) == firma:
+                continue
+
+            recargar_reportes(firmas)
+            pool = verificar_pool(pool)
+            carpeta = os.path.join(sandbx, os.path.splitext(os.path.basename(ruta))[0])
+            if os.path.isdir(carpeta):
+                limpiar_carpeta(carpeta)
+            try:
+                errores = procesar_zip(ruta, carpeta, pool)
+                if errores:
+                    logging.error(f"{os.path.basename(ruta)} terminó con {errores} reportes con error.")
+            except Exception as e:
+                logging.error(f"Se produjo un error al procesar {ruta}: {e}")
+            procesados[ruta] = firma
+            logging.info(f"{os.path.basename(ruta)} procesado {time.time() - firma[0] / 1e9:.2f} s después de su llegada.")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        detener.set()
+        if observador:
+            observador.stop()
+            observador.join()
+        if pool:
+            pool.closeall()
+        logging.info("Modo demonio detenido.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Procesa los archivos ZIP de la carpeta de trabajo y los carga en PostgreSQL.")
+    parser.add_argument('--lote', action='store_true', default=modo_lote, help="Procesa todos los ZIP de la carpeta de trabajo en paralelo.")
+    parser.add_argument('--trabajadores', type=int, default=trabajadores_lote, help="Número de procesos para el modo lote.")
+    parser.add_argument('--demonio', action='store_true', default=modo_demonio, help="Vigila la carpeta de trabajo y procesa cada ZIP que llega, sin terminar.")
+    parser.add_argument('--validar', action='store_true', help="Solo compila y valida la configuración de los reportes, sin procesar archivos.")
+    args = parser.parse_args()
+
+    # Compilar los planes de carga antes de tocar los datos: los procesos del modo lote los leen del cache
+    planes = cargar_planes()
+    errores = validar_configuracion()
+    if args.validar:
+        for error in errores:
+            print(f"config.json: {error}")
+        for reporte, plan in planes.items():
+            for aviso in plan['avisos']:
+                print(f"{reporte} (aviso): {aviso}")
+        invalidos = [reporte for reporte, plan in planes.items() if plan['errores']]
+        for reporte in invalidos:
+            print(f"{reporte}: {'; '.join(planes[reporte]['errores'])}")
+        print(f"{len(planes) - len(invalidos)} de {len(planes)} reportes con configuración válida.")
+        exit(1 if invalidos or errores else 0)
+    if errores:
+        for error in errores:
+            logging.error(f"Configuración: {error}.")
+        exit(1)
+
+    # Crear la carpeta Sandbx si no existe
+    if not os.path.isdir(sandbx):
+        try:
+            os.makedirs(sandbx, exist_ok=True)
+            logging.info(f"Carpeta creada: {sandbx}")
+        except PermissionError:
+            logging.error(f"Permiso denegado para crear la carpeta: {sandbx}")
+            exit()
+        except Exception as e:
+            logging.error(f"Se produjo un error al crear la carpeta: {e}")
+            exit()
+
+    # Limpiar la carpeta Sandbx
+    limpiar_carpeta(sandbx)
+
+    # El manifiesto de cargas se crea aquí una sola vez, no en cada ZIP ni en cada proceso del lote
+    preparar_manifiesto()
+
+    if args.demonio:
+        ejecutar_demonio()
+    elif args.lote:
+        try:
+            rutas = encontrar_zips(workng_dir)
+        except FileNotFoundError as e:
+            logging.error(e)
+            exit()
+
+        resultados = procesar_lote(rutas, args.trabajadores)
+        if not all(exito for _, exito, _ in resultados):
+            exit(1)
+    else:
+        try:
+            workng = encontrar_zip(workng_dir)
+        except FileNotFoundError as e:
+            logging.error(e)
+            exit()
+
+        try:
+            procesar_zip(workng)
+        except Exception as e:
+            logging.error(e)
+            exit()
+
+if __name__ == '__main__':
+    main()
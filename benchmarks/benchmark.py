@@ -0,0 +1,186 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from generar_zips import generar_escenario, raiz
+
+# Carpeta donde se guardan las líneas base, una por nombre de escenario
+carpeta_baselines = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+# Función para leer la conexión a PostgreSQL de un config.json existente
+def leer_db(ruta_config):
+    with open(ruta_config, 'r', encoding='utf-8') as f:
+        return json.load(f)['db']
+
+# Función para convertir una opción clave=valor de la línea de comandos (el valor se interpreta como JSON si se puede)
+def convertir_opcion(opcion):
+    clave, _, valor = opcion.partition('=')
+    try:
+        return clave, json.loads(valor)
+    except json.JSONDecodeError:
+        return clave, valor
+
+# Función para preparar la carpeta de trabajo del benchmark: ZIP sintéticos y un config.json para api.py
+def preparar_espacio(carpeta, escenario, db, opciones):
+    workng = os.path.join(carpeta, '2-Workng')
+    sandbx = os.path.join(carpeta, '3-Sandbx')
+    os.makedirs(sandbx, exist_ok=True)
+    _, layout = generar_escenario(workng, **escenario)
+    config = {
+        'workng_dir': workng,
+        'sandbx': sandbx,
+        'reportes': list(layout),
+        'columnas_esperadas': {reporte: {'columnas': columnas} for reporte, columnas in layout.items()},
+        'db': db,
+        'omitir_sin_cambios': False,
+        'archivo_metricas': 'metricas.jsonl',
+        'cache_codificaciones': 'codificaciones.json',
+        **opciones,
+    }
+    with open(os.path.join(carpeta, 'config.json'), 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=4, ensure_ascii=False)
+
+# Función para ejecutar api.py completo (arranque incluido) y medir su tiempo de pared
+def ejecutar_api(carpeta, lote):
+    archivo_metricas = os.path.join(carpeta, 'metricas.jsonl')
+    if os.path.exists(archivo_metricas):
+        os.remove(archivo_metricas)
+    comando = [sys.executable, os.path.join(raiz, 'api.py')] + (['--lote'] if lote else [])
+    inicio = time.perf_counter()
+    proceso = subprocess.run(comando, cwd=carpeta, capture_output=True, text=True)
+    segundos = time.perf_counter() - inicio
+    # api.py termina con código 0 en algunos errores de arranque: sin archivo de métricas la ejecución no sirve
+    if proceso.returncode != 0 or not os.path.exists(archivo_metricas):
+        raise RuntimeError(f"api.py terminó con código {proceso.returncode} sin completar la carga:\n{proceso.stderr[-2000:]}")
+    return segundos
+
+# Función para sumar las métricas de todos los ZIP de una ejecución: filas, bytes, errores y segundos por etapa
+def leer_metricas(carpeta):
+    resultado = {'filas': 0, 'bytes': 0, 'errores': 0, 'etapas': {}}
+    with open(os.path.join(carpeta, 'metricas.jsonl'), 'r', encoding='utf-8') as f:
+        for linea in f:
+            registro = json.loads(linea)
+            if registro['tipo'] == 'zip':
+                resultado['filas'] += registro['filas']
+                resultado['bytes'] += registro['bytes']
+                resultado['errores'] += registro['errores']
+            for etapa, valores in registro['etapas'].items():
+                resultado['etapas'][etapa] = resultado['etapas'].get(etapa, 0.0) + valores['segundos']
+    return resultado
+
+# Función para ejecutar el escenario varias veces y resumirlo con la mediana de cada medida
+def medir(carpeta, repeticiones, lote):
+    ejecuciones = []
+    for i in range(repeticiones):
+        segundos = ejecutar_api(carpeta, lote)
+        metricas = leer_metricas(carpeta)
+        if metricas['errores']:
+            raise RuntimeError(f"La ejecución {i + 1} terminó con {metricas['errores']} reportes con error. Revisar {carpeta}.")
+        ejecuciones.append({**metricas, 'segundos': segundos})
+        print(f"Ejecución {i + 1}/{repeticiones}: {segundos:.3f} s, {metricas['filas']} filas")
+
+    etapas = sorted({etapa for ejecucion in ejecuciones for etapa in ejecucion['etapas']})
+    segundos = statistics.median(e['segundos'] for e in ejecuciones)
+    return {
+        'segundos': round(segundos, 4),
+        'filas': ejecuciones[0]['filas'],
+        'bytes': ejecuciones[0]['bytes'],
+        'filas_por_segundo': round(ejecuciones[0]['filas'] / segundos, 1),
+        'etapas': {etapa: round(statistics.median(e['etapas'].get(etapa, 0.0) for e in ejecuciones), 4) for etapa in etapas},
+    }
+
+# Función para comparar un resultado con su línea base. Regresa las medidas que empeoraron más que la tolerancia.
+# Las etapas de menos de 0.1 s en la línea base se muestran pero no cuentan: su ruido es mayor que la tolerancia
+def comparar(resultado, baseline, tolerancia):
+    medidas = [('total', baseline['segundos'], resultado['segundos'])]
+    for etapa in sorted(set(baseline['etapas']) | set(resultado['etapas'])):
+        medidas.append((etapa, baseline['etapas'].get(etapa), resultado['etapas'].get(etapa)))
+
+    regresiones = []
+    print(f"{'medida':<22}{'base (s)':>12}{'actual (s)':>12}{'cambio':>10}")
+    for nombre, antes, ahora in medidas:
+        if antes is None or ahora is None:
+            print(f"{nombre:<22}{antes if antes is not None else '-':>12}{ahora if ahora is not None else '-':>12}{'':>10}")
+            continue
+        cambio = (ahora - antes) / antes * 100 if antes else 0.0
+        marca = ''
+        if cambio > tolerancia and (nombre == 'total' or antes >= 0.1):
+            marca = '  REGRESIÓN'
+            regresiones.append(nombre)
+        print(f"{nombre:<22}{antes:>12.4f}{ahora:>12.4f}{cambio:>+9.1f}%{marca}")
+    return regresiones
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide api.py de punta a punta con ZIP sintéticos contra un PostgreSQL local y lo compara con una línea base.")
+    parser.add_argument('--nombre', default='base', help="Nombre del escenario; su línea base es baselines/<nombre>.json.")
+    parser.add_argument('--config', default=os.path.join(raiz, 'config.json'), help="config.json del que se toma la conexión a PostgreSQL (clave db).")
+    parser.add_argument('--tab', default='BProm', help="Pestaña de CLIENTS/dms con los reportes y sus columnas.")
+    parser.add_argument('--zips', type=int, default=1, help="Número de ZIP; con más de uno se usa el modo lote.")
+    parser.add_argument('--filas', type=int, default=100000, help="Filas por reporte.")
+    parser.add_argument('--columnas', type=int, help="Número de columnas por reporte.")
+    parser.add_argument('--basura', type=int, default=3, help="Líneas basura antes del encabezado.")
+    parser.add_argument('--irregulares', type=float, default=0.01, help="Fracción de filas con campos de menos o de más.")
+    parser.add_argument('--codificacion', default='utf-8', help="Codificación de los reportes.")
+    parser.add_argument('--semilla', type=int, default=0, help="Semilla de los datos.")
+    parser.add_argument('--repeticiones', type=int, default=3, help="Ejecuciones del escenario; se reporta la mediana.")
+    parser.add_argument('--opcion', action='append', default=[], help="Clave extra de config.json como clave=valor (se puede repetir), p. ej. memoria_reporte_mb=64.")
+    parser.add_argument('--tolerancia', type=float, default=10.0, help="Porcentaje de empeoramiento permitido respecto de la línea base.")
+    parser.add_argument('--guardar-baseline', action='store_true', help="Guarda el resultado como la nueva línea base del escenario.")
+    parser.add_argument('--conservar', action='store_true', help="No borra la carpeta temporal del benchmark.")
+    args = parser.parse_args()
+
+    escenario = {
+        'tab': args.tab, 'zips': args.zips, 'filas': args.filas, 'columnas': args.columnas, 'basura': args.basura,
+        'irregulares': args.irregulares, 'codificacion': args.codificacion, 'semilla': args.semilla,
+    }
+    opciones = dict(convertir_opcion(opcion) for opcion in args.opcion)
+
+    carpeta = tempfile.mkdtemp(prefix='benchmark_api_')
+    try:
+        preparar_espacio(carpeta, escenario, leer_db(args.config), opciones)
+        resultado = medir(carpeta, args.repeticiones, args.zips > 1)
+    finally:
+        if args.conservar:
+            print(f"Carpeta del benchmark: {carpeta}")
+        else:
+            shutil.rmtree(carpeta, ignore_errors=True)
+
+    print(json.dumps(resultado, indent=4))
+    ruta_baseline = os.path.join(carpeta_baselines, f"{args.nombre}.json")
+    regresiones = []
+    if os.path.exists(ruta_baseline):
+        with open(ruta_baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline['escenario'] != escenario or baseline['opciones'] != opciones:
+            print(f"Aviso: la línea base '{args.nombre}' se midió con otro escenario u otras opciones: {baseline['escenario']} {baseline['opciones']}")
+        if baseline['maquina']['nodo'] != platform.node():
+            print(f"Aviso: la línea base '{args.nombre}' se midió en otra máquina ({baseline['maquina']['nodo']}).")
+        regresiones = comparar(resultado, baseline['resultado'], args.tolerancia)
+    else:
+        print(f"No hay línea base '{args.nombre}'. Usa --guardar-baseline para guardarla.")
+
+    if args.guardar_baseline:
+        os.makedirs(carpeta_baselines, exist_ok=True)
+        with open(ruta_baseline, 'w', encoding='utf-8') as f:
+            json.dump({
+                'fecha': datetime.now().isoformat(timespec='seconds'),
+                'escenario': escenario,
+                'opciones': opciones,
+                'maquina': {'nodo': platform.node(), 'python': platform.python_version(), 'procesadores': os.cpu_count()},
+                'resultado': resultado,
+            }, f, indent=4, ensure_ascii=False)
+        print(f"Línea base guardada en {ruta_baseline}")
+    elif regresiones:
+        print(f"Regresiones de más de {args.tolerancia}%: {', '.join(regresiones)}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
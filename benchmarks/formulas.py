@@ -0,0 +1,72 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+import formulas
+
+# Fórmulas del benchmark sobre columnas como las de VTAUSA: aritmética, comparaciones, IF y funciones de texto
+formulas_benchmark = {
+    'Diferencia': 'Saldo$ - SaldoInicial$',
+    'Doble': 'Diferencia * 2',
+    'Positivo': 'Saldo$ > 0',
+    'Signo': 'IF(Saldo$ < 0, "DEUDOR", IF(Saldo$ > 0, "ACREEDOR", "CERO"))',
+    'Prefijo': 'LEFT(Cuenta, 3) & "-" & TipoCuenta',
+    'Redondeo': 'ROUND(Saldo$ / 3, 2)',
+}
+
+# Función para generar las columnas del benchmark, con algo de valores vacíos y no numéricos
+def datos_benchmark(filas, semilla):
+    azar = np.random.default_rng(semilla)
+    saldo = (azar.integers(-10 ** 6, 10 ** 6, filas) / 100).astype(str).astype(object)
+    saldo[azar.random(filas) < 0.01] = ''
+    return pd.DataFrame({
+        'Cuenta': azar.integers(10 ** 5, 10 ** 6, filas).astype(str).astype(object),
+        'SaldoInicial$': azar.integers(0, 10 ** 4, filas).astype(str).astype(object),
+        'Saldo$': saldo,
+        'TipoCuenta': azar.choice(np.array(['A', 'P', 'C'], dtype=object), filas),
+    })
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide la evaluación vectorizada de las fórmulas de columnas y comprueba que da lo mismo sobre el DataFrame completo que por bloques.")
+    parser.add_argument('--filas', type=int, default=1000000, help="Filas del DataFrame.")
+    parser.add_argument('--filas-bloque', type=int, default=50000, help="Filas de cada bloque, como en memoria_reporte_mb.")
+    parser.add_argument('--repeticiones', type=int, default=3, help="Repeticiones de cada medición; se reporta la mejor.")
+    parser.add_argument('--semilla', type=int, default=0, help="Semilla de los datos.")
+    args = parser.parse_args()
+
+    df = datos_benchmark(args.filas, args.semilla)
+    compiladas, errores = formulas.compilar_formulas(formulas_benchmark, list(df.columns))
+    if errores:
+        sys.exit('; '.join(errores))
+
+    def completo():
+        return formulas.calcular_formulas(df.copy(), compiladas)
+
+    def por_bloques():
+        return pd.concat([
+            formulas.calcular_formulas(df.iloc[inicio:inicio + args.filas_bloque].copy(), compiladas)
+            for inicio in range(0, len(df), args.filas_bloque)
+        ])
+
+    print(f"{len(compiladas)} fórmulas, {len(df)} filas")
+    resultados = {}
+    for nombre, funcion in [('completo', completo), ('por bloques', por_bloques)]:
+        mejor = None
+        for _ in range(args.repeticiones):
+            inicio = time.perf_counter()
+            resultados[nombre] = funcion()
+            segundos = time.perf_counter() - inicio
+            mejor = segundos if mejor is None else min(mejor, segundos)
+        print(f"{nombre}: {mejor:.2f} s ({mejor / len(df) * 1e6:.2f} µs por fila)")
+    if not resultados['completo'].equals(resultados['por bloques']):
+        print("El resultado por bloques es distinto del resultado sobre el DataFrame completo.")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
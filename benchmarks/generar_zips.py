@@ -0,0 +1,113 @@
+import argparse
+import json
+import os
+import random
+import string
+import zipfile
+from datetime import date, timedelta
+
+# Carpeta raíz del proyecto (este script vive en benchmarks/)
+raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Textos con acentos y eñes, todos representables en ISO-8859-1 y Windows-1252
+textos = ['JOSÉ PÉREZ', 'MUÑOZ Y CÍA', 'ÁLVAREZ ÑANDÚ', 'GÜEMES', 'DISTRIBUIDORA DEL NORTE', 'Comercial López', 'N/A', '']
+
+# Función para leer los reportes y sus columnas de una pestaña de CLIENTS/dms
+def leer_layout(tab):
+    with open(os.path.join(raiz, 'CLIENTS', 'dms', f'{tab}.json'), 'r', encoding='utf-8') as f:
+        config_tab = json.load(f)
+    layout = {}
+    for reporte in config_tab.get('reportes', []):
+        columnas = config_tab.get('columnas_esperadas', {}).get(reporte, [])
+        layout[reporte] = columnas.get('columnas', []) if isinstance(columnas, dict) else columnas
+    return layout
+
+# Función para ajustar las columnas de un reporte a un número fijo: se recortan o se completan con ColumnaN
+def ajustar_columnas(columnas, numero):
+    if not numero:
+        return list(columnas)
+    return (list(columnas) + [f'Columna{i}' for i in range(len(columnas) + 1, numero + 1)])[:numero]
+
+# Función para generar un valor según el nombre de la columna: importes, fechas, códigos con ceros, sucursal o texto
+def valor_columna(columna, fila, azar, sucursal):
+    nombre = columna.lower()
+    if nombre.endswith('$'):
+        return f"{azar.uniform(-100000, 100000):.2f}"
+    if 'fecha' in nombre:
+        return (date(2024, 1, 1) + timedelta(days=azar.randrange(365))).strftime('%d/%m/%Y')
+    if 'cuenta' in nombre or 'codigo' in nombre or 'centro' in nombre:
+        return f"{azar.randrange(10 ** 6):07d}"
+    if 'sucursal' in nombre:
+        return sucursal
+    if 'tipo' in nombre or 'naturaleza' in nombre:
+        return azar.choice('ADCP')
+    if fila % 3 == 0:
+        return str(azar.randrange(10 ** 5))
+    return azar.choice(textos)
+
+# Función para generar el texto de un reporte: líneas basura, encabezado opcional y filas separadas por '|'.
+# Una fracción de filas (irregulares) viene con campos de menos o de más
+def generar_reporte(columnas, filas, sucursal, azar, basura=0, encabezado=True, irregulares=0.0):
+    lineas = [f"REPORTE GENERADO {date.today():%d/%m/%Y} PAGINA {i + 1}" if i % 2 == 0 else '' for i in range(basura)]
+    if encabezado:
+        lineas.append('|'.join(columnas))
+    for fila in range(filas):
+        valores = [valor_columna(columna, fila, azar, sucursal) for columna in columnas]
+        if irregulares and azar.random() < irregulares:
+            if azar.random() < 0.5:
+                valores = valores[:azar.randrange(1, len(valores))] if len(valores) > 1 else valores
+            else:
+                valores += ['EXTRA'] * azar.randrange(1, 4)
+        lineas.append('|'.join(valores))
+    return '\r\n'.join(lineas) + '\r\n'
+
+# Función para generar un ZIP con el nombre CCCCBB<AAAAMMDD>.zip que espera extraer_info_zip, con un miembro por reporte
+def generar_zip(carpeta, layout, cliente, sucursal, fecha, filas, semilla=0, basura=0, encabezado=True, irregulares=0.0, codificacion='utf-8'):
+    azar = random.Random(f"{semilla}|{cliente}|{sucursal}")
+    os.makedirs(carpeta, exist_ok=True)
+    ruta = os.path.join(carpeta, f"{cliente:0>4}{sucursal}{fecha:%Y%m%d}.zip")
+    with zipfile.ZipFile(ruta, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+        for reporte, columnas in layout.items():
+            texto = generar_reporte(columnas, filas, sucursal, azar, basura, encabezado, irregulares)
+            zip_ref.writestr(f"{reporte}{sucursal}.txt", texto.encode(codificacion))
+    return ruta
+
+# Función para nombrar la sucursal número i con dos letras (AA, AB, ...)
+def nombre_sucursal(i):
+    return string.ascii_uppercase[i // 26 % 26] + string.ascii_uppercase[i % 26]
+
+# Función para generar los ZIP de un escenario. Regresa (rutas, layout)
+def generar_escenario(carpeta, tab='BProm', zips=1, filas=10000, columnas=None, cliente='0123', fecha=None, semilla=0,
+                      basura=0, encabezado=True, irregulares=0.0, codificacion='utf-8'):
+    layout = {reporte: ajustar_columnas(cols, columnas) for reporte, cols in leer_layout(tab).items()}
+    fecha = fecha or date.today()
+    rutas = [
+        generar_zip(carpeta, layout, cliente, nombre_sucursal(i), fecha, filas, semilla, basura, encabezado, irregulares, codificacion)
+        for i in range(zips)
+    ]
+    return rutas, layout
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera ZIP sintéticos CCCCBB<AAAAMMDD>.zip con reportes separados por '|'.")
+    parser.add_argument('carpeta', help="Carpeta donde se escriben los ZIP.")
+    parser.add_argument('--tab', default='BProm', help="Pestaña de CLIENTS/dms de la que se toman los reportes y sus columnas.")
+    parser.add_argument('--zips', type=int, default=1, help="Número de ZIP (uno por sucursal).")
+    parser.add_argument('--filas', type=int, default=10000, help="Filas por reporte.")
+    parser.add_argument('--columnas', type=int, help="Número de columnas por reporte (recorta o completa el layout de la pestaña).")
+    parser.add_argument('--cliente', default='0123', help="Código de cliente (4 caracteres).")
+    parser.add_argument('--basura', type=int, default=0, help="Líneas basura antes del encabezado.")
+    parser.add_argument('--sin-encabezado', action='store_true', help="No escribe la línea de encabezado.")
+    parser.add_argument('--irregulares', type=float, default=0.0, help="Fracción de filas con campos de menos o de más.")
+    parser.add_argument('--codificacion', default='utf-8', help="Codificación de los reportes (utf-8, latin-1, cp1252...).")
+    parser.add_argument('--semilla', type=int, default=0, help="Semilla para que los datos sean reproducibles.")
+    args = parser.parse_args()
+
+    rutas, _ = generar_escenario(
+        args.carpeta, args.tab, args.zips, args.filas, args.columnas, args.cliente, None, args.semilla,
+        args.basura, not args.sin_encabezado, args.irregulares, args.codificacion
+    )
+    for ruta in rutas:
+        print(ruta)
+
+if __name__ == '__main__':
+    main()
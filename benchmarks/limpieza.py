@@ -0,0 +1,107 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import funcionesExternas
+import referencia_limpieza
+from generar_zips import textos
+
+# Funciones comparadas contra su copia de referencia
+funciones = ['LimpiaCodigos', 'LimpiaCodigosv1', 'LimpiaTexto', 'LimpiaTextov1', 'LimpiaTextov2', 'LimpiaEmail']
+# Funciones de la referencia que fallan con None (las demás regresan '')
+sin_none = {'LimpiaCodigos', 'LimpiaCodigosv1', 'LimpiaEmail'}
+
+# Casos escritos a mano: mojibake, entidades HTML, bordes, acentos, correos, códigos y caracteres fuera de Latin-1
+casos = [
+    '', ' ', '\t', 'josé pérez', '  ÁLVAREZ ÑANDÚ  ', 'MuÃ±oz', 'PEÃ‘A', 'JOSÃ‰', 'CÃ“RDOBA', 'RaÃºl', 'MARÃ­A', 'GÃ³mez',
+    'Ã.‘', 'Ã‰‰', '‰¢', '&amp;EMPRESA&lt;&gt;', '<CODIGO>', '-+*/._:,;COD-01/02_03.4,5;:', '“Comillas”', '‘simple’',
+    'straße', 'ﬁnanzas', 'ŉ', 'ǅ', 'ª º µ', '½ ¼ ¾', 'Ø ø Æ æ Œ œ', 'juan.perez@correo.com', '@usuario', 'user_name-1@x.mx',
+    '0001234', '00-12/34', 'é', 'Ñ', ' ESPACIO ', 'Ελληνικά', 'Кириллица', '中文', '🙂 emoji', '\x0c\x0b\r\n',
+]
+
+# Caracteres para los textos al azar, con más peso en los que aparecen en nombres y códigos
+alfabeto = (
+    'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789 ' * 3
+    + 'ÁÉÍÓÚÑÜáéíóúñüÃ‘‰“º­±³¢' * 2
+    + """-+*/._:,;{}[]<>&^`¨~´¡!¿?'()=%$#º°ª¬@¢©®«»±£¤¥§¯µ¶·¸ÆæÇçØß÷Œ×ƒ½¼¾ðÐ¦þ\t¹²³“‘" """
+)
+
+# Función para armar el corpus de equivalencia: casos fijos, cada carácter del plano básico solo y entre letras,
+# y textos al azar
+def corpus_equivalencia(aleatorios, semilla):
+    azar = random.Random(semilla)
+    corpus = list(casos)
+    for codigo in range(0x10000):
+        if 0xD800 <= codigo <= 0xDFFF:
+            continue
+        caracter = chr(codigo)
+        corpus += [caracter, f'a{caracter}b', f'{caracter} x {caracter}']
+    for _ in range(aleatorios):
+        corpus.append(''.join(azar.choice(alfabeto) for _ in range(azar.randrange(1, 30))))
+    return corpus
+
+# Función para comparar cada función con su referencia. Regresa el número de diferencias
+def verificar(corpus):
+    diferencias = 0
+    for nombre in funciones:
+        actual, referencia = getattr(funcionesExternas, nombre), getattr(referencia_limpieza, nombre)
+        if nombre not in sin_none and actual(None) != referencia(None):
+            print(f"{nombre}(None): {actual(None)!r} != {referencia(None)!r}")
+            diferencias += 1
+        errores = [(texto, actual(texto), referencia(texto)) for texto in corpus if actual(texto) != referencia(texto)]
+        for texto, obtenido, esperado in errores[:5]:
+            print(f"{nombre}({texto!r}): {obtenido!r} != {esperado!r}")
+        print(f"{nombre}: {len(corpus) - len(errores)} de {len(corpus)} textos iguales")
+        diferencias += len(errores)
+    return diferencias
+
+# Función para armar el corpus del benchmark: nombres y códigos como los de los reportes, con algo de mojibake
+def corpus_benchmark(valores, semilla):
+    azar = random.Random(semilla)
+    opciones = textos + ['MuÃ±oz y Cia.', 'PEÃ‘A/LOPEZ', ' - COMERCIAL DEL NORTE, S.A. DE C.V. - ', 'juan.perez@correo.com']
+    corpus = []
+    for i in range(valores):
+        if i % 3 == 0:
+            corpus.append(f"{azar.randrange(10 ** 6):07d}")
+        else:
+            corpus.append(azar.choice(opciones) + ' ' + azar.choice(opciones))
+    return corpus
+
+# Función para medir los microsegundos por valor de una función sobre el corpus (la mejor de varias repeticiones)
+def medir(funcion, corpus, repeticiones):
+    mejor = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        for texto in corpus:
+            funcion(texto)
+        segundos = time.perf_counter() - inicio
+        mejor = segundos if mejor is None else min(mejor, segundos)
+    return mejor / len(corpus) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Comprueba que las funciones de limpieza de funcionesExternas.py dan el mismo resultado que su versión anterior y mide cuánto tardan.")
+    parser.add_argument('--aleatorios', type=int, default=200000, help="Textos al azar en el corpus de equivalencia.")
+    parser.add_argument('--valores', type=int, default=200000, help="Valores del corpus del benchmark.")
+    parser.add_argument('--repeticiones', type=int, default=3, help="Repeticiones del benchmark; se reporta la mejor.")
+    parser.add_argument('--semilla', type=int, default=0, help="Semilla de los textos al azar.")
+    parser.add_argument('--sin-benchmark', action='store_true', help="Solo comprueba la equivalencia.")
+    args = parser.parse_args()
+
+    diferencias = verificar(corpus_equivalencia(args.aleatorios, args.semilla))
+    if not args.sin_benchmark:
+        corpus = corpus_benchmark(args.valores, args.semilla)
+        print(f"{'función':<18}{'antes (µs)':>12}{'ahora (µs)':>12}{'mejora':>9}")
+        for nombre in funciones:
+            antes = medir(getattr(referencia_limpieza, nombre), corpus, args.repeticiones)
+            ahora = medir(getattr(funcionesExternas, nombre), corpus, args.repeticiones)
+            print(f"{nombre:<18}{antes:>12.3f}{ahora:>12.3f}{antes / ahora:>8.1f}x")
+    if diferencias:
+        print(f"{diferencias} diferencias con la versión anterior.")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
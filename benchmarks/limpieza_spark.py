@@ -0,0 +1,58 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyspark.sql import SparkSession
+from pyspark.sql import functions as F
+
+import funcionesExternas
+from limpieza import corpus_benchmark
+
+# Funciones con versión de Column: (función de Python, versión de Spark)
+funciones = {
+    'LimpiaCodigos': (funcionesExternas.LimpiaCodigos, funcionesExternas.LimpiaCodigosCol),
+    'LimpiaTexto': (funcionesExternas.LimpiaTexto, funcionesExternas.LimpiaTextoCol),
+    'LimpiaEmail': (funcionesExternas.LimpiaEmail, funcionesExternas.LimpiaEmailCol),
+}
+
+# Función para medir los segundos de evaluar una expresión sobre toda la columna (el resultado se descarta con noop)
+def medir(df, expresion, repeticiones):
+    mejor = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        df.select(expresion.alias('limpio')).write.format('noop').mode('overwrite').save()
+        segundos = time.perf_counter() - inicio
+        mejor = segundos if mejor is None else min(mejor, segundos)
+    return mejor
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara en Spark las funciones de limpieza como udf de Python, como pandas_udf y como expresiones de Column.")
+    parser.add_argument('--master', default='local[*]', help="Master de Spark.")
+    parser.add_argument('--valores', type=int, default=2000000, help="Filas del DataFrame.")
+    parser.add_argument('--repeticiones', type=int, default=3, help="Repeticiones de cada medición; se reporta la mejor.")
+    parser.add_argument('--semilla', type=int, default=0, help="Semilla de los valores.")
+    args = parser.parse_args()
+
+    spark = SparkSession.builder.master(args.master).appName('benchmark_limpieza').getOrCreate()
+    df = spark.createDataFrame([(valor,) for valor in corpus_benchmark(args.valores, args.semilla)], 'valor string').cache()
+    df.count()
+
+    print(f"{'función':<16}{'udf (s)':>10}{'pandas_udf (s)':>16}{'Column (s)':>12}{'exacto (s)':>12}{'distintos':>11}")
+    for nombre, (funcion, columna) in funciones.items():
+        udf = F.udf(funcion, 'string')('valor')
+        segundos = [
+            medir(df, udf, args.repeticiones),
+            medir(df, funcionesExternas.limpieza_pandas_udf(funcion)('valor'), args.repeticiones),
+            medir(df, columna('valor'), args.repeticiones),
+            medir(df, columna('valor', exacto=True), args.repeticiones),
+        ]
+        # Filas en que la versión nativa no coincide con la de Python (caracteres fuera de caracteres_spark)
+        distintos = df.filter(~columna('valor').eqNullSafe(udf)).count()
+        print(f"{nombre:<16}{segundos[0]:>10.2f}{segundos[1]:>16.2f}{segundos[2]:>12.2f}{segundos[3]:>12.2f}{distintos:>11}")
+    spark.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+import funcionesExternas
+import referencia_limpieza
+
+# Formatos de teléfono como los de las tablas de contactos: con extensión, varios números, letras y vacíos
+formatos = [
+    '{n}', '{n}', '({l}) {n}', '{n} EXT {e}', '{n} ext. {e}', '{n}, {m}', '{n}; {m}', '{n} / {m}', '{n} Y {m}',
+    'TEL {n}', 'CEL: {m}', '', '0', None,
+]
+
+# Función para generar los teléfonos del benchmark
+def corpus_telefonos(valores, semilla):
+    azar = random.Random(semilla)
+    corpus = []
+    for _ in range(valores):
+        formato = azar.choice(formatos)
+        if formato is None:
+            corpus.append(None)
+            continue
+        corpus.append(formato.format(
+            n=f"{azar.randrange(10 ** 7, 10 ** 8)}", m=f"{azar.randrange(10 ** 9, 10 ** 10)}",
+            l=f"{azar.randrange(10, 1000)}", e=f"{azar.randrange(1, 9999)}",
+        ))
+    return corpus
+
+# Función para medir la mejor de varias repeticiones de una función sin argumentos
+def medir(funcion, repeticiones):
+    mejor = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        segundos = time.perf_counter() - inicio
+        mejor = segundos if mejor is None else min(mejor, segundos)
+    return mejor
+
+# Función para comparar en pandas LimpiaTelefonoSerie con la función anterior aplicada valor por valor
+def comparar_pandas(corpus, repeticiones):
+    serie = pd.Series(corpus, dtype=object)
+    esperado = serie.map(referencia_limpieza.telefono_referencia, na_action='ignore')
+    obtenido = funcionesExternas.LimpiaTelefonoSerie(serie)
+    distintos = int((~((esperado == obtenido) | (esperado.isna() & obtenido.isna()))).sum())
+    antes = medir(lambda: serie.map(referencia_limpieza.telefono_referencia, na_action='ignore'), repeticiones)
+    ahora = medir(lambda: funcionesExternas.LimpiaTelefonoSerie(serie), repeticiones)
+    print(f"pandas: función anterior {antes:.3f} s, LimpiaTelefonoSerie {ahora:.3f} s ({antes / ahora:.1f}x), {distintos} distintos")
+    return distintos
+
+# Función para comparar en Spark la cadena de F.when anterior con la expresión con regexp_replace
+def comparar_spark(corpus, repeticiones, master):
+    from pyspark.sql import SparkSession
+
+    spark = SparkSession.builder.master(master).appName('benchmark_telefonos').getOrCreate()
+    df = spark.createDataFrame([(valor,) for valor in corpus], 'telefono string').cache()
+    df.count()
+    anterior = referencia_limpieza.ttelefono(df.telefono)
+    actual = funcionesExternas.LimpiaTelefonoCol(df.telefono)
+    distintos = df.filter(~anterior.eqNullSafe(actual)).count()
+
+    def evaluar(expresion):
+        return lambda: df.select(expresion.alias('limpio')).write.format('noop').mode('overwrite').save()
+    antes = medir(evaluar(anterior), repeticiones)
+    ahora = medir(evaluar(actual), repeticiones)
+    print(f"Spark: F.when anidados {antes:.3f} s, LimpiaTelefonoCol {ahora:.3f} s ({antes / ahora:.1f}x), {distintos} distintos")
+    spark.stop()
+    return distintos
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara la normalización de teléfonos anterior (ttelefono/tcelular) con LimpiaTelefonoCol y LimpiaTelefonoSerie.")
+    parser.add_argument('--valores', type=int, default=1000000, help="Teléfonos del corpus.")
+    parser.add_argument('--repeticiones', type=int, default=3, help="Repeticiones de cada medición; se reporta la mejor.")
+    parser.add_argument('--semilla', type=int, default=0, help="Semilla de los teléfonos.")
+    parser.add_argument('--spark', action='store_true', help="Compara también en Spark (requiere Java).")
+    parser.add_argument('--master', default='local[*]', help="Master de Spark.")
+    args = parser.parse_args()
+
+    corpus = corpus_telefonos(args.valores, args.semilla)
+    distintos = comparar_pandas(corpus, args.repeticiones)
+    if args.spark:
+        distintos += comparar_spark(corpus, args.repeticiones, args.master)
+    if distintos:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
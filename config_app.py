@@ -5,46 +5,28 @@ from werkzeug.security import generate_password_hash, check_password_hash
 import json
 import os
 import uuid
+from formulas import compilar_formulas
+from almacen_config import leer_json, escribir_json, editar_json, ruta_tab, ruta_cliente, carpeta_dms
 from ext import db  # Importar db desde ext.py
 from forms import RegistrationForm, LoginForm
 from models import User  # Import the User model after db is initialized
 
 app = Flask(__name__)
 
-# Cargar la configuración desde un archivo JSON específico
-def cargar_config(tab_name):
-    config_path = os.path.join('CLIENTS', 'dms', f'{tab_name}.json')
-    
-    # Si el archivo no existe, retornar un error claro
-    if not os.path.exists(config_path):
-        print(f"El archivo {config_path} no existe.")  # Para fines de depuración
-        return None
-    
-    # Si el archivo existe, cargar su contenido
-    with open(config_path, 'r') as f:
-        config = json.load(f)
-    
-    return config
-
 # Cargar la configuración de la base de datos desde database.json
 def cargar_db_config():
     db_config_path = 'database.json'
     
-    # Verificar si el archivo database.json existe
-    if not os.path.exists(db_config_path):
-        # Crear una estructura básica si el archivo no existe
+    # Cargar su contenido o, si el archivo no existe, crear una estructura básica
+    db_config = leer_json(db_config_path)
+    if db_config is None:
         db_config = {
             "host": "",
             "usuario": "",
             "contrasena": "",
             "base_de_datos": ""
         }
-        with open(db_config_path, 'w') as f:
-            json.dump(db_config, f, indent=4)
-    else:
-        # Si el archivo existe, cargar su contenido
-        with open(db_config_path, 'r') as f:
-            db_config = json.load(f)
+        escribir_json(db_config_path, db_config)
 
     return db_config
 
@@ -130,15 +112,9 @@ def index():
     tabs = cargar_tabs()
     tab_data = {}
 
-    dms_folder = os.path.join(os.getcwd(), 'CLIENTS', 'dms')
-
+    # Las pestañas que no cambiaron se toman del cache sin volver a leer su JSON
     for tab in tabs:
-        tab_path = os.path.join(dms_folder, f"{tab}.json")
-        if os.path.exists(tab_path):
-            with open(tab_path, 'r') as f:
-                tab_data[tab] = json.load(f)
-        else:
-            tab_data[tab] = {"reportes": []}
+        tab_data[tab] = leer_json(ruta_tab(tab), {"reportes": []})
 
     return render_template('index.html', tabs=tabs, tab_data=tab_data)
 
@@ -147,9 +123,7 @@ def index():
 def save_config():
     try:
         data = request.form
-        config = cargar_config()
-
-        config['reportes'] = [rep.strip() for rep in data.get('reportes', '').split(',') if rep.strip()]
+        reportes = [rep.strip() for rep in data.get('reportes', '').split(',') if rep.strip()]
 
         columnas_esperadas = {}
         for key in data.keys():
@@ -163,10 +137,9 @@ def save_config():
                     'formulas': {}
                 }
         
-        config['columnas_esperadas'] = columnas_esperadas
-
-        with open('config.json', 'w') as f:
-            json.dump(config, f, indent=4)
+        with editar_json('config.json', {}) as config:
+            config['reportes'] = reportes
+            config['columnas_esperadas'] = columnas_esperadas
 
         return jsonify({'success': True})
 
@@ -194,14 +167,8 @@ def save_db_config():
         # Ruta del archivo database.json
         db_config_path = 'database.json'
 
-        # Verificar si el archivo existe, si no, crearlo
-        if not os.path.exists(db_config_path):
-            with open(db_config_path, 'w') as f:
-                json.dump({}, f)  # Crear el archivo vacío si no existe
-
         # Guardar la configuración en el archivo database.json
-        with open(db_config_path, 'w') as f:
-            json.dump(db_config, f, indent=4)
+        escribir_json(db_config_path, db_config)
 
         return jsonify({'success': True})
 
@@ -222,31 +189,21 @@ def add_reporte():
         if not tab_name or not nombre_reporte:
             return jsonify({'success': False, 'error': 'El nombre del reporte y la pestaña son necesarios.'})
 
-        # Ruta al archivo JSON de la pestaña correspondiente
-        dms_folder = os.path.join(os.getcwd(), 'CLIENTS', 'dms')
-        tab_path = os.path.join(dms_folder, f"{tab_name}.json")
-
-        if not os.path.exists(tab_path):
-            return jsonify({'success': False, 'error': 'La pestaña especificada no existe.'})
-
-        # Cargar el contenido del archivo JSON
-        with open(tab_path, 'r') as f:
-            config = json.load(f)
-
-        # Verificar si el reporte ya existe
-        if nombre_reporte in config.get('reportes', []):
-            return jsonify({'success': False, 'error': 'El reporte ya existe en esta pestaña.'})
+        # Cargar el JSON de la pestaña correspondiente; se guarda al salir del bloque
+        with editar_json(ruta_tab(tab_name)) as config:
+            if config is None:
+                return jsonify({'success': False, 'error': 'La pestaña especificada no existe.'})
 
-        # Agregar el nuevo reporte al JSON
-        config['reportes'].append(nombre_reporte)
-        config['columnas_esperadas'][nombre_reporte] = {
-            "columnas": columnas,
-            "formulas": {}
-        }
+            # Verificar si el reporte ya existe
+            if nombre_reporte in config.get('reportes', []):
+                return jsonify({'success': False, 'error': 'El reporte ya existe en esta pestaña.'})
 
-        # Guardar el JSON actualizado
-        with open(tab_path, 'w') as f:
-            json.dump(config, f, indent=4)
+            # Agregar el nuevo reporte al JSON
+            config['reportes'].append(nombre_reporte)
+            config['columnas_esperadas'][nombre_reporte] = {
+                "columnas": columnas,
+                "formulas": {}
+            }
 
         return jsonify({'success': True})
 
@@ -264,20 +221,14 @@ def delete_reporte():
         if not tab_name or not reporte:
             return jsonify({'success': False, 'error': 'El nombre de la pestaña y el reporte son necesarios.'})
 
-        # Cargar la configuración para la pestaña especificada
-        config = cargar_config(tab_name)
-
-        if reporte not in config['reportes']:
-            return jsonify({'success': False, 'error': 'El reporte no existe.'})
-
-        # Eliminar el reporte de la configuración
-        config['reportes'].remove(reporte)
-        del config['columnas_esperadas'][reporte]
+        # Cargar la configuración para la pestaña especificada; se guarda al salir del bloque
+        with editar_json(ruta_tab(tab_name)) as config:
+            if reporte not in config['reportes']:
+                return jsonify({'success': False, 'error': 'El reporte no existe.'})
 
-        # Guardar la configuración actualizada
-        config_path = os.path.join('CLIENTS', 'dms', f'{tab_name}.json')
-        with open(config_path, 'w') as f:
-            json.dump(config, f, indent=4)
+            # Eliminar el reporte de la configuración
+            config['reportes'].remove(reporte)
+            del config['columnas_esperadas'][reporte]
 
         return jsonify({'success': True})
 
@@ -290,15 +241,11 @@ def delete_reporte():
 @login_required
 def edit_reporte(reporte):
     tab_name = request.args.get('tab_name')
-    dms_folder = os.path.join(os.getcwd(), 'CLIENTS', 'dms')
-    tab_path = os.path.join(dms_folder, f"{tab_name}.json")
+    config = leer_json(ruta_tab(tab_name))
 
-    if not os.path.exists(tab_path):
+    if config is None:
         return jsonify({'success': False, 'error': 'El archivo de la pestaña especificada no existe.'})
 
-    with open(tab_path, 'r') as f:
-        config = json.load(f)
-
     columnas_info = config['columnas_esperadas'].get(reporte, {'columnas': [], 'formulas': {}})
     return jsonify({'success': True, 'columnas': columnas_info['columnas'], 'formulas': columnas_info['formulas']})
 
@@ -317,21 +264,17 @@ def save_order():
         except json.JSONDecodeError:
             return jsonify({'success': False, 'error': 'El formato de columnas es inválido.'})
 
-        config = cargar_config()
-
-        if reporte not in config['columnas_esperadas']:
-            return jsonify({'success': False, 'error': 'El reporte no existe en la configuración.'})
-
-        if isinstance(config['columnas_esperadas'][reporte], list):
-            config['columnas_esperadas'][reporte] = {
-                'columnas': config['columnas_esperadas'][reporte],
-                'formulas': {}
-            }
+        with editar_json('config.json', {}) as config:
+            if reporte not in config.get('columnas_esperadas', {}):
+                return jsonify({'success': False, 'error': 'El reporte no existe en la configuración.'})
 
-        config['columnas_esperadas'][reporte]['columnas'] = columnas_ordenadas
+            if isinstance(config['columnas_esperadas'][reporte], list):
+                config['columnas_esperadas'][reporte] = {
+                    'columnas': config['columnas_esperadas'][reporte],
+                    'formulas': {}
+                }
 
-        with open('config.json', 'w') as f:
-            json.dump(config, f, indent=4)
+            config['columnas_esperadas'][reporte]['columnas'] = columnas_ordenadas
 
         return jsonify({'success': True})
 
@@ -366,25 +309,14 @@ def guardar_cliente():
         if not os.path.exists(client_folder):
             os.makedirs(client_folder)
 
-        client_config_path = os.path.join(client_folder, 'config.json')
-
-        if os.path.exists(client_config_path):
-            with open(client_config_path, 'r') as f:
-                existing_config = json.load(f)
-                existing_branches = {reg['branch'] for reg in existing_config.get('registros', [])}
-        else:
-            existing_config = {'registros': []}
-            existing_branches = set()
-
-        nuevos_registros = [registro for registro in registros if registro['branch'] not in existing_branches]
-
-        if not nuevos_registros:
-            return jsonify({'success': False, 'error': 'No hay nuevos registros para agregar.'})
+        with editar_json(ruta_cliente(client_name), {'registros': []}) as existing_config:
+            existing_branches = {reg['branch'] for reg in existing_config.get('registros', [])}
+            nuevos_registros = [registro for registro in registros if registro['branch'] not in existing_branches]
 
-        existing_config['registros'].extend(nuevos_registros)
+            if not nuevos_registros:
+                return jsonify({'success': False, 'error': 'No hay nuevos registros para agregar.'})
 
-        with open(client_config_path, 'w') as f:
-            json.dump(existing_config, f, indent=4)
+            existing_config['registros'].extend(nuevos_registros)
 
         return jsonify({'success': True, 'added_records': nuevos_registros})
 
@@ -396,13 +328,7 @@ def guardar_cliente():
 @login_required
 def cliente_detalles(client_name):
     try:
-        client_config_path = os.path.join(os.getcwd(), 'CLIENTS', client_name, 'Config', 'config.json')
-        
-        if os.path.exists(client_config_path):
-            with open(client_config_path, 'r') as f:
-                client_config = json.load(f)
-        else:
-            client_config = {}
+        client_config = leer_json(ruta_cliente(client_name), {})
 
         return jsonify({'success': True, 'data': client_config})
 
@@ -421,22 +347,13 @@ def eliminar_registro():
         if not client_name or not branch_to_delete:
             return jsonify({'success': False, 'error': 'El nombre del cliente y el branch son necesarios.'})
 
-        client_folder = os.path.join(os.getcwd(), 'CLIENTS', client_name, 'Config')
-        client_config_path = os.path.join(client_folder, 'config.json')
-
-        if os.path.exists(client_config_path):
-            with open(client_config_path, 'r') as f:
-                existing_config = json.load(f)
-
-            registros_actualizados = [reg for reg in existing_config.get('registros', []) if reg['branch'] != branch_to_delete]
-
-            with open(client_config_path, 'w') as f:
-                json.dump({'registros': registros_actualizados}, f, indent=4)
+        with editar_json(ruta_cliente(client_name)) as existing_config:
+            if existing_config is None:
+                return jsonify({'success': False, 'error': 'El archivo de configuración no existe.'})
 
-            return jsonify({'success': True})
+            existing_config['registros'] = [reg for reg in existing_config.get('registros', []) if reg['branch'] != branch_to_delete]
 
-        else:
-            return jsonify({'success': False, 'error': 'El archivo de configuración no existe.'})
+        return jsonify({'success': True})
 
     except Exception as e:
         print(f"Error al eliminar el registro del cliente: {e}")
@@ -455,11 +372,9 @@ def actualizar_registro():
             registro_id = str(uuid.uuid4())
             registro_actualizado['id'] = registro_id
 
-        client_config_path = os.path.join(os.getcwd(), 'CLIENTS', client_name, 'Config', 'config.json')
-
-        if os.path.exists(client_config_path):
-            with open(client_config_path, 'r') as f:
-                client_config = json.load(f)
+        with editar_json(ruta_cliente(client_name)) as client_config:
+            if client_config is None:
+                return jsonify({'success': False, 'error': 'Archivo de configuración no encontrado'})
 
             for registro in client_config.get('registros', []):
                 if registro['branch'] == registro_actualizado['branch'] and registro['id'] != registro_id:
@@ -476,12 +391,7 @@ def actualizar_registro():
             else:
                 client_config['registros'].append(registro_actualizado)
 
-            with open(client_config_path, 'w') as f:
-                json.dump(client_config, f, indent=4)
-
-            return jsonify({'success': True})
-        else:
-            return jsonify({'success': False, 'error': 'Archivo de configuración no encontrado'})
+        return jsonify({'success': True})
 
     except Exception as e:
         print(f"Error: {e}")
@@ -500,19 +410,24 @@ def save_formula():
         if not tab_name or not reporte or not columna:
             return jsonify({'success': False, 'error': 'Pestaña, reporte y columna son necesarios.'})
 
-        # Cargar la configuración para la pestaña especificada
-        config = cargar_config(tab_name)
-
-        if reporte not in config['columnas_esperadas']:
-            return jsonify({'success': False, 'error': 'El reporte no existe.'})
-
-        # Actualizar o agregar la fórmula en la columna correspondiente
-        config['columnas_esperadas'][reporte]['formulas'][columna] = formula
-
-        # Guardar la configuración actualizada en el archivo correspondiente
-        config_path = os.path.join('CLIENTS', 'dms', f'{tab_name}.json')
-        with open(config_path, 'w') as f:
-            json.dump(config, f, indent=4)
+        # Cargar la configuración para la pestaña especificada; se guarda al salir del bloque
+        with editar_json(ruta_tab(tab_name)) as config:
+            if reporte not in config['columnas_esperadas']:
+                return jsonify({'success': False, 'error': 'El reporte no existe.'})
+
+            # Compilar la fórmula con las demás del reporte antes de guardarla, con las columnas repetidas renombradas
+            # con sufijos _N como en api.py: una fórmula inválida se rechaza aquí y no al cargar el reporte
+            reporte_config = config['columnas_esperadas'][reporte]
+            columnas = reporte_config.get('columnas', [])
+            columnas = [f"{c}_{columnas[:i].count(c)}" if c in columnas[:i] else c for i, c in enumerate(columnas)]
+            formulas = dict(reporte_config['formulas'], **{columna: formula})
+            compiladas, errores = compilar_formulas(formulas, ['Client', 'Branch', 'Date'] + columnas)
+            if columna not in compiladas:
+                error = next((e for e in errores if e.startswith(f"fórmula de {columna!r}")), 'La fórmula no es válida.')
+                return jsonify({'success': False, 'error': error})
+
+            # Actualizar o agregar la fórmula en la columna correspondiente
+            reporte_config['formulas'][columna] = formula
 
         return jsonify({'success': True})
 
@@ -530,27 +445,21 @@ def delete_formula():
         if not tab_name or not reporte or not columna:
             return jsonify({'success': False, 'error': 'Pestaña, reporte y columna son necesarios.'})
 
-        # Cargar la configuración para la pestaña especificada
-        config = cargar_config(tab_name)
+        # Cargar la configuración para la pestaña especificada; se guarda al salir del bloque
+        with editar_json(ruta_tab(tab_name)) as config:
+            if reporte not in config['columnas_esperadas']:
+                return jsonify({'success': False, 'error': 'El reporte no existe.'})
 
-        if reporte not in config['columnas_esperadas']:
-            return jsonify({'success': False, 'error': 'El reporte no existe.'})
+            # Asegurarse de que el reporte esté en formato dict
+            if isinstance(config['columnas_esperadas'][reporte], list):
+                return jsonify({'success': False, 'error': 'El formato del reporte no es válido.'})
 
-        # Asegurarse de que el reporte esté en formato dict
-        if isinstance(config['columnas_esperadas'][reporte], list):
-            return jsonify({'success': False, 'error': 'El formato del reporte no es válido.'})
+            if columna not in config['columnas_esperadas'][reporte]['formulas']:
+                return jsonify({'success': False, 'error': 'La fórmula no existe.'})
 
-        if columna in config['columnas_esperadas'][reporte]['formulas']:
             del config['columnas_esperadas'][reporte]['formulas'][columna]
 
-            # Guardar la configuración actualizada
-            config_path = os.path.join('CLIENTS', 'dms', f'{tab_name}.json')
-            with open(config_path, 'w') as f:
-                json.dump(config, f, indent=4)
-
-            return jsonify({'success': True})
-        else:
-            return jsonify({'success': False, 'error': 'La fórmula no existe.'})
+        return jsonify({'success': True})
 
     except Exception as e:
         print(f"Error al eliminar la fórmula: {e}")
@@ -561,31 +470,21 @@ def delete_formula():
 @app.route('/database', methods=['GET'])
 @login_required
 def database():
-    # Verificar si database.json existe y cargar su contenido
-    db_config_path = 'database.json'
-    if os.path.exists(db_config_path):
-        with open(db_config_path, 'r') as f:
-            db_config = json.load(f)
-    else:
-        db_config = {}
+    # Cargar el contenido de database.json, si existe
+    db_config = leer_json('database.json', {})
 
     return render_template('database.html', config=db_config)
 
 # Ruta al archivo donde se guardan las pestañas
-tabs_file = os.path.join(os.getcwd(), 'CLIENTS', 'dms', 'tabs.json')
+tabs_file = os.path.join(carpeta_dms, 'tabs.json')
 
 def cargar_tabs():
-    if os.path.exists(tabs_file):
-        with open(tabs_file, 'r') as f:
-            return json.load(f)
-    return []
+    return leer_json(tabs_file, [])
 
 def guardar_tab(tab_name):
-    tabs = cargar_tabs()
-    if tab_name not in tabs:
-        tabs.append(tab_name)
-        with open(tabs_file, 'w') as f:
-            json.dump(tabs, f, indent=4)
+    with editar_json(tabs_file, []) as tabs:
+        if tab_name not in tabs:
+            tabs.append(tab_name)
 
 @app.route('/add_tab', methods=['POST'])
 @login_required
@@ -595,40 +494,23 @@ def add_tab():
         if not tab_name:
             return jsonify({'success': False, 'error': 'El nombre de la pestaña es necesario.'})
         
-        # Ruta al archivo tabs.json que almacena las pestañas
-        tabs_file = os.path.join(os.getcwd(), 'CLIENTS', 'dms', 'tabs.json')
-        
         # Crear la carpeta CLIENTS/dms si no existe
-        dms_folder = os.path.join(os.getcwd(), 'CLIENTS', 'dms')
-        if not os.path.exists(dms_folder):
-            os.makedirs(dms_folder)
-        
-        # Cargar las pestañas existentes desde tabs.json
-        if os.path.exists(tabs_file):
-            with open(tabs_file, 'r') as f:
-                tabs = json.load(f)
-        else:
-            tabs = []
-
-        # Verificar si la pestaña ya existe
-        if tab_name in tabs:
-            return jsonify({'success': False, 'error': 'La pestaña ya existe.'})
+        os.makedirs(carpeta_dms, exist_ok=True)
 
-        # Agregar la nueva pestaña a la lista y guardar en tabs.json
-        tabs.append(tab_name)
-        with open(tabs_file, 'w') as f:
-            json.dump(tabs, f, indent=4)
+        # Agregar la nueva pestaña a tabs.json, si no existe
+        with editar_json(tabs_file, []) as tabs:
+            if tab_name in tabs:
+                return jsonify({'success': False, 'error': 'La pestaña ya existe.'})
+            tabs.append(tab_name)
 
         # Crear un archivo JSON con la estructura inicial para la nueva pestaña, incluyendo el nombre
-        tab_path = os.path.join(dms_folder, f"{tab_name}.json")
         initial_data = {
             "name": tab_name,  # Agregar la llave 'name' con el nombre de la pestaña
             "reportes": [],
             "columnas_esperadas": {}
         }
 
-        with open(tab_path, 'w') as f:
-            json.dump(initial_data, f, indent=4)
+        escribir_json(ruta_tab(tab_name), initial_data)
         
         return jsonify({'success': True})
     
@@ -648,19 +530,16 @@ def editar_columna():
         if not tab_name or not reporte or not columna or not nueva_columna:
             return jsonify({'success': False, 'error': 'Pestaña, reporte, y columna son necesarios.'})
 
-        config = cargar_config(tab_name)
+        with editar_json(ruta_tab(tab_name)) as config:
+            if reporte not in config['columnas_esperadas']:
+                return jsonify({'success': False, 'error': 'El reporte no existe.'})
 
-        if reporte not in config['columnas_esperadas']:
-            return jsonify({'success': False, 'error': 'El reporte no existe.'})
-
-        columnas = config['columnas_esperadas'][reporte]['columnas']
-        if columna in columnas:
+            columnas = config['columnas_esperadas'][reporte]['columnas']
+            if columna not in columnas:
+                return jsonify({'success': False, 'error': 'La columna no existe.'})
             columnas[columnas.index(columna)] = nueva_columna
-            with open(f'CLIENTS/dms/{tab_name}.json', 'w') as f:
-                json.dump(config, f, indent=4)
-            return jsonify({'success': True})
-        else:
-            return jsonify({'success': False, 'error': 'La columna no existe.'})
+
+        return jsonify({'success': True})
 
     except Exception as e:
         print(f"Error al editar la columna: {e}")
@@ -677,19 +556,16 @@ def eliminar_columna():
         if not tab_name or not reporte or not columna:
             return jsonify({'success': False, 'error': 'Pestaña, reporte y columna son necesarios.'})
 
-        config = cargar_config(tab_name)
+        with editar_json(ruta_tab(tab_name)) as config:
+            if reporte not in config['columnas_esperadas']:
+                return jsonify({'success': False, 'error': 'El reporte no existe.'})
 
-        if reporte not in config['columnas_esperadas']:
-            return jsonify({'success': False, 'error': 'El reporte no existe.'})
-
-        columnas = config['columnas_esperadas'][reporte]['columnas']
-        if columna in columnas:
+            columnas = config['columnas_esperadas'][reporte]['columnas']
+            if columna not in columnas:
+                return jsonify({'success': False, 'error': 'La columna no existe.'})
             columnas.remove(columna)
-            with open(f'CLIENTS/dms/{tab_name}.json', 'w') as f:
-                json.dump(config, f, indent=4)
-            return jsonify({'success': True})
-        else:
-            return jsonify({'success': False, 'error': 'La columna no existe.'})
+
+        return jsonify({'success': True})
 
     except Exception as e:
         print(f"Error al eliminar la columna: {e}")
@@ -708,18 +584,14 @@ def guardar_orden_columnas():
 
         columnas_ordenadas = json.loads(columnas)
 
-        config = cargar_config(tab_name)
-        if config is None:
-            return jsonify({'success': False, 'error': 'No se pudo cargar la configuración para la pestaña especificada.'})
+        with editar_json(ruta_tab(tab_name)) as config:
+            if config is None:
+                return jsonify({'success': False, 'error': 'No se pudo cargar la configuración para la pestaña especificada.'})
 
-        if reporte not in config['columnas_esperadas']:
-            return jsonify({'success': False, 'error': 'El reporte no existe en la configuración.'})
+            if reporte not in config['columnas_esperadas']:
+                return jsonify({'success': False, 'error': 'El reporte no existe en la configuración.'})
 
-        config['columnas_esperadas'][reporte]['columnas'] = columnas_ordenadas
-
-        config_path = os.path.join('CLIENTS', 'dms', f'{tab_name}.json')
-        with open(config_path, 'w') as f:
-            json.dump(config, f, indent=4)
+            config['columnas_esperadas'][reporte]['columnas'] = columnas_ordenadas
 
         return jsonify({'success': True})
     except Exception as e:
@@ -737,18 +609,15 @@ def add_columna():
         if not tab_name or not reporte or not nueva_columna:
             return jsonify({'success': False, 'error': 'Pestaña, reporte, y columna son necesarios.'})
 
-        config = cargar_config(tab_name)
-
-        if reporte not in config['columnas_esperadas']:
-            return jsonify({'success': False, 'error': 'El reporte no existe.'})
+        with editar_json(ruta_tab(tab_name)) as config:
+            if reporte not in config['columnas_esperadas']:
+                return jsonify({'success': False, 'error': 'El reporte no existe.'})
 
-        columnas = config['columnas_esperadas'][reporte]['columnas']
-        if nueva_columna in columnas:
-            return jsonify({'success': False, 'error': 'La columna ya existe.'})
+            columnas = config['columnas_esperadas'][reporte]['columnas']
+            if nueva_columna in columnas:
+                return jsonify({'success': False, 'error': 'La columna ya existe.'})
 
-        columnas.append(nueva_columna)
-        with open(f'CLIENTS/dms/{tab_name}.json', 'w') as f:
-            json.dump(config, f, indent=4)
+            columnas.append(nueva_columna)
 
         return jsonify({'success': True})
 
@@ -766,32 +635,23 @@ def duplicar_reporte():
         if not tab_name or not reporte or not nuevo_reporte:
             return jsonify({"success": False, "error": "Faltan parámetros"}), 400
 
-        # Ruta del archivo JSON correspondiente a la pestaña
-        json_file_path = f"CLIENTS/dms/{tab_name}.json"
-
-        # Verifica que el archivo JSON exista
-        if not os.path.exists(json_file_path):
-            return jsonify({"success": False, "error": "Archivo de configuración no encontrado"}), 404
-
-        # Cargar la configuración actual
-        with open(json_file_path, 'r') as file:
-            config_data = json.load(file)
-
-        # Verifica si el reporte original existe
-        if reporte not in config_data.get('reportes', []):
-            return jsonify({"success": False, "error": "El reporte original no existe"}), 404
+        # Cargar la configuración actual de la pestaña; los cambios se guardan al salir del bloque
+        with editar_json(ruta_tab(tab_name)) as config_data:
+            # Verifica que el archivo JSON exista
+            if config_data is None:
+                return jsonify({"success": False, "error": "Archivo de configuración no encontrado"}), 404
 
-        # Verifica si el nuevo reporte ya existe
-        if nuevo_reporte in config_data.get('reportes', []):
-            return jsonify({"success": False, "error": "El nuevo nombre de reporte ya existe"}), 400
+            # Verifica si el reporte original existe
+            if reporte not in config_data.get('reportes', []):
+                return jsonify({"success": False, "error": "El reporte original no existe"}), 404
 
-        # Duplicar el reporte
-        config_data['reportes'].append(nuevo_reporte)
-        config_data['columnas_esperadas'][nuevo_reporte] = config_data['columnas_esperadas'][reporte]
+            # Verifica si el nuevo reporte ya existe
+            if nuevo_reporte in config_data.get('reportes', []):
+                return jsonify({"success": False, "error": "El nuevo nombre de reporte ya existe"}), 400
 
-        # Guardar los cambios en el archivo JSON
-        with open(json_file_path, 'w') as file:
-            json.dump(config_data, file, indent=4)
+            # Duplicar el reporte
+            config_data['reportes'].append(nuevo_reporte)
+            config_data['columnas_esperadas'][nuevo_reporte] = config_data['columnas_esperadas'][reporte]
 
         return jsonify({"success": True}), 200
 
@@ -0,0 +1,601 @@
+import logging
+import re
+
+import numpy as np
+import pandas as pd
+
+# Fórmulas de columnas ('formulas': {columna: fórmula} en columnas_esperadas), con la sintaxis del editor de
+# config_app.py: columnas por nombre (o entre corchetes), números, textos entre comillas dobles, los operadores
+# + - * / ^ & = <> < > <= >= y funciones como en Excel. Cada fórmula se compila una sola vez en un árbol con el tipo
+# de cada nodo ('numero', 'texto' o 'logico') y se evalúa con operaciones de pandas sobre la columna completa.
+# Los nodos son listas para poder guardarlos en el cache de planes de carga:
+# ['numero', valor], ['texto', valor], ['logico', valor], ['nulo', tipo], ['columna', nombre],
+# ['convertir', origen, destino, nodo], ['negativo', nodo], ['aritmetica', operador, a, b], ['concatenar', a, b],
+# ['comparar', operador, tipo, a, b], ['funcion', nombre, [argumentos]]
+
+# Se lanza cuando una fórmula no se puede compilar
+class ErrorFormula(ValueError):
+    pass
+
+# Funciones disponibles: (tipos de los argumentos, tipo del resultado). '*' repite el último tipo; los argumentos
+# opcionales van después de '?'. El tipo None en IF se resuelve con sus ramas
+funciones = {
+    'IF': (['logico', None, '?', None], None),
+    'AND': (['logico', '*'], 'logico'),
+    'OR': (['logico', '*'], 'logico'),
+    'NOT': (['logico'], 'logico'),
+    'INT': (['numero'], 'numero'),
+    'ROUND': (['numero', '?', 'numero'], 'numero'),
+    'ABS': (['numero'], 'numero'),
+    'VALUE': (['numero'], 'numero'),
+    'LEN': (['texto'], 'numero'),
+    'LEFT': (['texto', '?', 'numero'], 'texto'),
+    'RIGHT': (['texto', '?', 'numero'], 'texto'),
+    'MID': (['texto', 'numero', 'numero'], 'texto'),
+    'UPPER': (['texto'], 'texto'),
+    'LOWER': (['texto'], 'texto'),
+    'TRIM': (['texto'], 'texto'),
+    'CONCAT': (['texto', '*'], 'texto'),
+    'INSTR': (['texto', 'texto'], 'numero'),
+    'ISUPPER': (['texto'], 'logico'),
+}
+# Argumentos que deben ser literales (función: posiciones), para evaluarlas sin recorrer las filas
+argumentos_literales = {'LEFT': [1], 'RIGHT': [1], 'MID': [1, 2], 'INSTR': [1]}
+
+operadores_comparacion = ['<>', '<=', '>=', '=', '<', '>']
+patron_numero = re.compile(r'(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?')
+patron_funcion = re.compile(r'([A-Za-z]+)\s*\(')
+patron_logico = re.compile(r'(TRUE|FALSE)(?![\w$])', re.IGNORECASE)
+
+# Función para dividir una fórmula en tokens: (clase, valor). Los nombres de columnas pueden tener espacios,
+# dígitos y símbolos, así que antes que números y operadores se busca el nombre conocido más largo que empieza en
+# cada posición
+def tokenizar(formula, nombres):
+    nombres = sorted(nombres, key=len, reverse=True)
+    tokens = []
+    posicion = 0
+    while posicion < len(formula):
+        caracter = formula[posicion]
+        if caracter.isspace():
+            posicion += 1
+            continue
+        if caracter == '[':
+            fin = formula.find(']', posicion)
+            if fin < 0:
+                raise ErrorFormula(f"falta ']' después de la posición {posicion + 1}")
+            tokens.append(('columna', formula[posicion + 1:fin]))
+            posicion = fin + 1
+            continue
+        if caracter == '"':
+            texto = ''
+            posicion += 1
+            while True:
+                fin = formula.find('"', posicion)
+                if fin < 0:
+                    raise ErrorFormula("texto sin comillas de cierre")
+                texto += formula[posicion:fin]
+                posicion = fin + 1
+                if formula.startswith('"', posicion):
+                    texto += '"'
+                    posicion += 1
+                    continue
+                break
+            tokens.append(('texto', texto))
+            continue
+        funcion = patron_funcion.match(formula, posicion)
+        if funcion and funcion.group(1).upper() in funciones:
+            tokens.append(('funcion', funcion.group(1).upper()))
+            posicion = funcion.end(1)
+            continue
+        nombre = next((
+            n for n in nombres
+            if formula.startswith(n, posicion) and not re.match(r'[\w$]', formula[posicion + len(n):posicion + len(n) + 1])
+        ), None)
+        if nombre:
+            tokens.append(('columna', nombre))
+            posicion += len(nombre)
+            continue
+        numero = patron_numero.match(formula, posicion)
+        if numero:
+            tokens.append(('numero', float(numero.group())))
+            posicion = numero.end()
+            continue
+        operador = next((o for o in operadores_comparacion + list('+-*/^&(),') if formula.startswith(o, posicion)), None)
+        if operador:
+            tokens.append(('operador', operador))
+            posicion += len(operador)
+            continue
+        logico = patron_logico.match(formula, posicion)
+        if logico:
+            tokens.append(('logico', logico.group(1).upper() == 'TRUE'))
+            posicion = logico.end()
+            continue
+        palabra = re.match(r'[\w$]+', formula[posicion:])
+        raise ErrorFormula(f"columna o función desconocida {palabra.group() if palabra else caracter!r}")
+    return tokens
+
+# Función para convertir un nodo de un tipo a otro (un texto no se convierte en condición)
+def convertir(nodo, tipo, destino):
+    if tipo == destino:
+        return nodo
+    if destino == 'logico' and tipo == 'texto':
+        raise ErrorFormula("se esperaba una condición (una comparación, AND, OR, NOT o ISUPPER) y no un texto")
+    if nodo[0] == 'nulo':
+        return ['nulo', destino]
+    return ['convertir', tipo, destino, nodo]
+
+# Función para obtener el tipo común de las ramas de IF: si alguna es texto, texto; si no, número
+def tipo_comun(tipos):
+    if len(set(tipos)) == 1:
+        return tipos[0]
+    return 'texto' if 'texto' in tipos else 'numero'
+
+# Analizador de una fórmula por descenso recursivo, con la precedencia de Excel (de menor a mayor):
+# comparación, &, + -, * /, ^ y el signo. referencia(nombre) regresa el nodo y el tipo de una columna
+class AnalizadorFormula:
+    def __init__(self, tokens, referencia):
+        self.tokens = tokens
+        self.posicion = 0
+        self.referencia = referencia
+        self.yuxtapuesta = False
+
+    # Función para ver el siguiente token sin consumirlo
+    def siguiente(self):
+        return self.tokens[self.posicion] if self.posicion < len(self.tokens) else (None, None)
+
+    # Función para consumir el siguiente token si es el operador indicado
+    def aceptar(self, operador):
+        if self.siguiente() == ('operador', operador):
+            self.posicion += 1
+            return True
+        return False
+
+    # Función para consumir un operador obligatorio
+    def esperar(self, operador):
+        if not self.aceptar(operador):
+            clase, valor = self.siguiente()
+            raise ErrorFormula(f"se esperaba {operador!r} y se encontró {valor!r}" if clase else f"se esperaba {operador!r} al final de la fórmula")
+
+    def analizar(self):
+        nodo, tipo = self.comparacion()
+        # Fórmulas antiguas del editor, que agrega cada columna elegida al final con un espacio: dos operandos
+        # seguidos sin operador entre ellos se concatenan como con &
+        while self.siguiente()[0] in ('columna', 'numero', 'texto', 'logico', 'funcion') or self.siguiente() == ('operador', '('):
+            self.yuxtapuesta = True
+            otro, tipo_otro = self.comparacion()
+            nodo, tipo = ['concatenar', convertir(nodo, tipo, 'texto'), convertir(otro, tipo_otro, 'texto')], 'texto'
+        if self.posicion < len(self.tokens):
+            raise ErrorFormula(f"sobra {self.tokens[self.posicion][1]!r} en la fórmula")
+        return nodo, tipo
+
+    def comparacion(self):
+        nodo, tipo = self.concatenacion()
+        while self.siguiente()[0] == 'operador' and self.siguiente()[1] in operadores_comparacion:
+            operador = self.siguiente()[1]
+            self.posicion += 1
+            otro, tipo_otro = self.concatenacion()
+            # Se compara como número si algún lado es número (o ambos son condiciones), si no como texto
+            comun = 'numero' if 'numero' in (tipo, tipo_otro) or tipo == tipo_otro == 'logico' else 'texto'
+            nodo, tipo = ['comparar', operador, comun, convertir(nodo, tipo, comun), convertir(otro, tipo_otro, comun)], 'logico'
+        return nodo, tipo
+
+    def concatenacion(self):
+        nodo, tipo = self.suma()
+        while self.aceptar('&'):
+            otro, tipo_otro = self.suma()
+            nodo, tipo = ['concatenar', convertir(nodo, tipo, 'texto'), convertir(otro, tipo_otro, 'texto')], 'texto'
+        return nodo, tipo
+
+    def operacion(self, operadores, operando):
+        nodo, tipo = operando()
+        while self.siguiente()[0] == 'operador' and self.siguiente()[1] in operadores:
+            operador = self.siguiente()[1]
+            self.posicion += 1
+            otro, tipo_otro = operando()
+            nodo, tipo = ['aritmetica', operador, convertir(nodo, tipo, 'numero'), convertir(otro, tipo_otro, 'numero')], 'numero'
+        return nodo, tipo
+
+    def suma(self):
+        return self.operacion('+-', self.producto)
+
+    def producto(self):
+        return self.operacion('*/', self.potencia)
+
+    def potencia(self):
+        return self.operacion('^', self.signo)
+
+    def signo(self):
+        if self.aceptar('-'):
+            nodo, tipo = self.signo()
+            if nodo[0] == 'numero':
+                return ['numero', -nodo[1]], 'numero'
+            return ['negativo', convertir(nodo, tipo, 'numero')], 'numero'
+        if self.aceptar('+'):
+            nodo, tipo = self.signo()
+            return convertir(nodo, tipo, 'numero'), 'numero'
+        return self.primario()
+
+    def primario(self):
+        clase, valor = self.siguiente()
+        if clase is None:
+            raise ErrorFormula("la fórmula termina antes de tiempo")
+        self.posicion += 1
+        if clase in ('numero', 'texto', 'logico'):
+            return [clase, valor], clase
+        if clase == 'columna':
+            return self.referencia(valor)
+        if clase == 'funcion':
+            return self.funcion(valor)
+        if valor == '(':
+            nodo, tipo = self.comparacion()
+            self.esperar(')')
+            return nodo, tipo
+        raise ErrorFormula(f"no se esperaba {valor!r}")
+
+    def funcion(self, nombre):
+        self.esperar('(')
+        argumentos = []
+        if not self.aceptar(')'):
+            argumentos.append(self.comparacion())
+            while self.aceptar(','):
+                argumentos.append(self.comparacion())
+            self.esperar(')')
+        firma, resultado = funciones[nombre]
+        obligatorios = firma.index('?') if '?' in firma else len([t for t in firma if t != '*'])
+        maximo = None if '*' in firma else len([t for t in firma if t != '?'])
+        if len(argumentos) < obligatorios or (maximo is not None and len(argumentos) > maximo):
+            raise ErrorFormula(f"{nombre} recibe {len(argumentos)} argumentos")
+        tipos = [t for t in firma if t not in ('?', '*')]
+        tipos += [tipos[-1]] * (len(argumentos) - len(tipos))
+        if nombre == 'IF':
+            ramas = [tipo for _, tipo in argumentos[1:]]
+            resultado = tipo_comun(ramas)
+            tipos = ['logico'] + [resultado] * len(ramas)
+            if len(argumentos) == 2:
+                argumentos.append((['nulo', resultado], resultado))
+                tipos.append(resultado)
+        nodos = [convertir(nodo, tipo, destino) for (nodo, tipo), destino in zip(argumentos, tipos)]
+        for indice in argumentos_literales.get(nombre, []):
+            if indice < len(nodos) and nodos[indice][0] not in ('numero', 'texto'):
+                raise ErrorFormula(f"el argumento {indice + 1} de {nombre} debe ser un valor fijo")
+        if nombre == 'MID' and nodos[1][1] < 1:
+            raise ErrorFormula("MID empieza en la posición 1")
+        return ['funcion', nombre, nodos], resultado
+
+# Función para compilar las fórmulas de un reporte. columnas son las columnas del DataFrame (Client, Branch, Date y
+# las del reporte). Una fórmula puede usar el resultado de otra: su árbol se inserta en el lugar de la referencia,
+# así cada fórmula compilada solo lee columnas del reporte. Si la fórmula de una columna del reporte la menciona a
+# ella misma, se refiere al valor del reporte. Regresa ({columna: {'arbol', 'tipo'}}, errores)
+def compilar_formulas(formulas, columnas):
+    nombres = set(columnas) | set(formulas)
+    compiladas = {}
+    errores = []
+    en_proceso = []
+
+    def compilar(columna):
+        if columna in compiladas:
+            return compiladas[columna]
+        if columna in en_proceso:
+            raise ErrorFormula(f"referencia circular: {' -> '.join(en_proceso[en_proceso.index(columna):] + [columna])}")
+        en_proceso.append(columna)
+        try:
+            formula = formulas[columna]
+            if not isinstance(formula, str) or not formula.strip():
+                raise ErrorFormula("la fórmula está vacía")
+
+            def referencia(nombre):
+                if nombre in formulas and nombre != columna:
+                    compilada = compilar(nombre)
+                    return compilada['arbol'], compilada['tipo']
+                if nombre == columna and nombre not in columnas:
+                    raise ErrorFormula("la fórmula se menciona a sí misma")
+                if nombre not in columnas:
+                    raise ErrorFormula(f"la columna {nombre!r} no existe")
+                return ['columna', nombre], 'texto'
+
+            analizador = AnalizadorFormula(tokenizar(formula, nombres), referencia)
+            arbol, tipo = analizador.analizar()
+            if analizador.yuxtapuesta:
+                logging.warning(f"Fórmula de {columna!r}: {formula.strip()!r} tiene valores seguidos sin operador; se concatenan como con &. Conviene escribir el & en la fórmula.")
+        finally:
+            en_proceso.pop()
+        compiladas[columna] = {'arbol': arbol, 'tipo': tipo}
+        return compiladas[columna]
+
+    for columna in formulas:
+        try:
+            compilar(columna)
+        except ErrorFormula as e:
+            errores.append(f"fórmula de {columna!r}: {e}")
+    return {columna: compiladas[columna] for columna in formulas if columna in compiladas}, errores
+
+# Función para convertir números en texto: a 10 decimales para no arrastrar el error de punto flotante
+# (0.1 + 0.2 da 0.3), los enteros sin decimales, los demás con la representación más corta y los nulos como None.
+# Es el mismo texto que da PostgreSQL (ver convertir_sql), que usa notación científica desde 1e15 y Python desde 1e16
+def texto_numero(serie):
+    serie = serie.where(serie.abs() >= 1e15, np.round(serie, 10)) + 0.0
+    enteros = (serie == np.floor(serie)) & (serie.abs() < 1e15)
+    decimales = serie.notna() & ~enteros
+    texto = pd.Series(None, index=serie.index, dtype=object)
+    texto[enteros] = serie[enteros].astype('int64').astype(str)
+    texto[decimales] = serie[decimales].astype(str)
+    intermedios = decimales & (serie.abs() >= 1e15) & (serie.abs() < 1e16)
+    if intermedios.any():
+        texto[intermedios] = [np.format_float_scientific(numero, trim='-') for numero in serie[intermedios]]
+    return texto
+
+# Función para convertir una serie evaluada de un tipo a otro
+def convertir_serie(serie, tipo, destino):
+    if destino == 'numero':
+        if tipo == 'logico':
+            return serie.astype('float64')
+        # astype es varias veces más rápido que to_numeric, pero falla con cualquier valor que no es número y acepta
+        # '1_000'; en esos casos se usa to_numeric, que los deja nulos. Ambos admiten espacios alrededor del número
+        try:
+            numeros = serie.astype('float64')
+            if serie.str.contains('_', regex=False).any():
+                raise ValueError
+        except (ValueError, TypeError):
+            numeros = pd.to_numeric(serie, errors='coerce').astype('float64')
+        return numeros.where(np.isfinite(numeros))
+    if destino == 'texto':
+        if tipo == 'logico':
+            return serie.map({True: 'TRUE', False: 'FALSE'}).astype(object)
+        return texto_numero(serie)
+    return (serie != 0).astype('boolean').mask(serie.isna())
+
+# Función para evaluar las funciones de fórmula sobre series ya evaluadas
+def evaluar_funcion(nombre, argumentos, nodos):
+    if nombre == 'IF':
+        condicion = argumentos[0].fillna(False).to_numpy(dtype=bool)
+        return argumentos[1].where(condicion, argumentos[2])
+    if nombre in ('AND', 'OR'):
+        resultado = argumentos[0]
+        for argumento in argumentos[1:]:
+            resultado = resultado & argumento if nombre == 'AND' else resultado | argumento
+        return resultado
+    if nombre == 'NOT':
+        return ~argumentos[0]
+    if nombre == 'INT':
+        return np.floor(argumentos[0])
+    if nombre == 'ROUND':
+        # Redondeo como Excel y NUMERIC de PostgreSQL (la mitad se aleja del cero). El round a 9 decimales evita que
+        # 2.675 * 100 = 267.49999999999997 redondee hacia abajo. Los decimales se limitan a ±15
+        factor = 10.0 ** (np.clip(np.floor(argumentos[1]), -15, 15) if len(argumentos) > 1 else 0)
+        with np.errstate(all='ignore'):
+            resultado = np.sign(argumentos[0]) * np.floor(np.round(argumentos[0].abs() * factor, 9) + 0.5) / factor
+        return resultado.where(np.isfinite(resultado))
+    if nombre == 'ABS':
+        return argumentos[0].abs()
+    if nombre == 'VALUE':
+        return argumentos[0]
+    if nombre == 'LEN':
+        return argumentos[0].str.len().astype('float64')
+    if nombre in ('LEFT', 'RIGHT', 'MID'):
+        texto = argumentos[0]
+        cantidad = int(nodos[-1][1]) if len(nodos) > 1 else 1
+        if cantidad <= 0:
+            return texto.where(texto.isna(), '')
+        if nombre == 'LEFT':
+            return texto.str[:cantidad]
+        if nombre == 'RIGHT':
+            return texto.str[-cantidad:]
+        inicio = int(nodos[1][1]) - 1
+        return texto.str[inicio:inicio + cantidad]
+    if nombre == 'UPPER':
+        return argumentos[0].str.upper()
+    if nombre == 'LOWER':
+        return argumentos[0].str.lower()
+    if nombre == 'TRIM':
+        return argumentos[0].str.strip(' ').str.replace(r' {2,}', ' ', regex=True)
+    if nombre == 'CONCAT':
+        resultado = argumentos[0]
+        for argumento in argumentos[1:]:
+            resultado = resultado.str.cat(argumento)
+        return resultado
+    if nombre == 'INSTR':
+        return (argumentos[0].str.find(nodos[1][1]) + 1).astype('float64')
+    if nombre == 'ISUPPER':
+        return argumentos[0].str.isupper().astype('boolean')
+    raise ErrorFormula(f"función desconocida {nombre}")
+
+# Función para evaluar un nodo sobre un DataFrame. Regresa una serie: float64 para números, object para textos y
+# boolean para condiciones, con los nulos como NaN, None o NA. memo guarda los nodos ya evaluados en el bloque: las
+# fórmulas insertadas en otras y las columnas convertidas a número se calculan una sola vez
+def evaluar(nodo, df, memo):
+    clave = repr(nodo)
+    if clave not in memo:
+        memo[clave] = evaluar_nodo(nodo, df, memo)
+    return memo[clave]
+
+# Función para evaluar un nodo cuyos hijos se evalúan con evaluar
+def evaluar_nodo(nodo, df, memo):
+    clase = nodo[0]
+    if clase in ('numero', 'texto', 'logico'):
+        tipo = {'numero': 'float64', 'texto': object, 'logico': 'boolean'}[clase]
+        return pd.Series(nodo[1], index=df.index, dtype=tipo)
+    if clase == 'nulo':
+        tipo = {'numero': 'float64', 'texto': object, 'logico': 'boolean'}[nodo[1]]
+        return pd.Series(None, index=df.index, dtype=tipo)
+    if clase == 'columna':
+        return df[nodo[1]]
+    if clase == 'convertir':
+        return convertir_serie(evaluar(nodo[3], df, memo), nodo[1], nodo[2])
+    if clase == 'negativo':
+        return -evaluar(nodo[1], df, memo)
+    if clase == 'concatenar':
+        return evaluar(nodo[1], df, memo).str.cat(evaluar(nodo[2], df, memo))
+    if clase == 'aritmetica':
+        a, b = evaluar(nodo[2], df, memo), evaluar(nodo[3], df, memo)
+        with np.errstate(all='ignore'):
+            resultado = {'+': np.add, '-': np.subtract, '*': np.multiply, '/': np.divide, '^': np.power}[nodo[1]](a, b)
+        # Dividir entre cero y los desbordamientos dan nulo; también un operando nulo, aunque NaN ** 0 sea 1
+        return resultado.where(np.isfinite(resultado) & a.notna() & b.notna())
+    if clase == 'comparar':
+        a, b = evaluar(nodo[3], df, memo), evaluar(nodo[4], df, memo)
+        nulos = a.isna() | b.isna()
+        if nodo[2] == 'texto':
+            a, b = a.fillna(''), b.fillna('')
+        operador = {'=': 'eq', '<>': 'ne', '<': 'lt', '>': 'gt', '<=': 'le', '>=': 'ge'}[nodo[1]]
+        return getattr(a, operador)(b).astype('boolean').mask(nulos)
+    if clase == 'funcion':
+        return evaluar_funcion(nodo[1], [evaluar(argumento, df, memo) for argumento in nodo[2]], nodo[2])
+    raise ErrorFormula(f"nodo desconocido {clase}")
+
+# Función para agregar a un DataFrame las columnas calculadas con las fórmulas compiladas. Los resultados se guardan
+# como texto, igual que las columnas leídas del reporte, y los nulos como cadena vacía
+def calcular_formulas(df, compiladas):
+    memo = {}
+    resultados = {
+        columna: evaluar(convertir(formula['arbol'], formula['tipo'], 'texto'), df, memo)
+        for columna, formula in compiladas.items()
+    }
+    for columna, resultado in resultados.items():
+        df[columna] = resultado.fillna('')
+    return df
+
+# Traducción a SQL (PostgreSQL) para calcular las fórmulas dentro de la base de datos al cargar, con los mismos
+# resultados que la evaluación en pandas: números en double precision, nulos que se propagan y textos comparados
+# por código de carácter (COLLATE "C"), como en Python
+
+# Números que se convierten desde texto; los demás textos dan NULL, como pd.to_numeric. El largo y el exponente se
+# limitan para que las operaciones con ellos no desborden double precision, que en PostgreSQL es un error y no un nulo
+# (las repeticiones acotadas como \d{1,30} hacen mucho más lenta la expresión regular)
+patron_numero_sql = r'^\s*[+-]?(\d+(\.\d*)?|\.\d+)([eE][+-]?\d\d?)?\s*$'
+largo_numero_sql = 40
+operadores_sql = {'=': '=', '<>': '<>', '<': '<', '>': '>', '<=': '<=', '>=': '>='}
+
+# Funciones temporales de la sesión que usan las expresiones de las fórmulas; como funciones, sus argumentos se
+# calculan una sola vez por fila:
+# - numero_texto convierte un número a texto como texto_numero: a 10 decimales (round de double precision redondea
+#   la mitad al par, como np.round), los enteros sin decimales y los demás con la representación más corta
+# - potencia descarta las potencias sin resultado real o fuera del rango de double precision antes de calcularlas
+funciones_sql = """CREATE OR REPLACE FUNCTION pg_temp.numero_texto(n float8) RETURNS text
+LANGUAGE plpgsql IMMUTABLE STRICT AS $$
+DECLARE
+    v float8 := CASE WHEN abs(n) < 1e15 THEN round(n * 1e10::float8) / 1e10::float8 ELSE n END + 0::float8;
+BEGIN
+    RETURN CASE WHEN v = trunc(v) AND abs(v) < 1e15 THEN v::bigint::text ELSE v::text END;
+END $$;
+CREATE OR REPLACE FUNCTION pg_temp.potencia(x float8, y float8) RETURNS float8
+LANGUAGE plpgsql IMMUTABLE STRICT AS $$
+BEGIN
+    IF x = 0 THEN
+        RETURN CASE WHEN y >= 0 THEN power(x, y) END;
+    ELSIF (x < 0 AND y <> trunc(y)) OR y * ln(abs(x)) > 709 THEN
+        RETURN NULL;
+    ELSIF y * ln(abs(x)) < -744 THEN
+        RETURN 0;
+    END IF;
+    RETURN power(x, y);
+END $$;"""
+
+# Función para escribir un texto como literal de SQL
+def literal_texto(texto):
+    return "'" + texto.replace("'", "''") + "'"
+
+# Función para convertir en SQL una expresión de un tipo a otro
+def convertir_sql(expresion, tipo, destino):
+    if destino == 'numero':
+        if tipo == 'logico':
+            return f"({expresion})::int::float8"
+        return (
+            f"(CASE WHEN char_length({expresion}) <= {largo_numero_sql} AND {expresion} ~ {literal_texto(patron_numero_sql)} "
+            f"THEN ({expresion})::float8 END)"
+        )
+    if destino == 'texto':
+        if tipo == 'logico':
+            return f"(CASE WHEN {expresion} THEN 'TRUE' WHEN NOT {expresion} THEN 'FALSE' END)"
+        return f"pg_temp.numero_texto({expresion})"
+    return f"(({expresion}) <> 0)"
+
+# Función para traducir las funciones de fórmula a SQL
+def funcion_sql(nombre, argumentos, nodos):
+    if nombre == 'IF':
+        return f"(CASE WHEN {argumentos[0]} THEN {argumentos[1]} ELSE {argumentos[2]} END)"
+    if nombre in ('AND', 'OR'):
+        return '(' + f' {nombre} '.join(argumentos) + ')'
+    if nombre == 'NOT':
+        return f"(NOT {argumentos[0]})"
+    if nombre == 'INT':
+        return f"floor({argumentos[0]})"
+    if nombre == 'ROUND':
+        factor = '1::float8'
+        if len(argumentos) > 1:
+            # Sin least/greatest, que ignoran los nulos
+            decimales = f"CASE WHEN {argumentos[1]} < -15 THEN -15 WHEN {argumentos[1]} > 15 THEN 15 ELSE floor({argumentos[1]}) END"
+            factor = f"power(10::float8, {decimales})"
+        return f"(sign({argumentos[0]}) * (floor(round((abs({argumentos[0]}) * {factor})::numeric, 9) + 0.5))::float8 / {factor})"
+    if nombre == 'ABS':
+        return f"abs({argumentos[0]})"
+    if nombre == 'VALUE':
+        return argumentos[0]
+    if nombre == 'LEN':
+        return f"char_length({argumentos[0]})::float8"
+    if nombre in ('LEFT', 'RIGHT', 'MID'):
+        cantidad = int(nodos[-1][1]) if len(nodos) > 1 else 1
+        if cantidad <= 0:
+            return f"(CASE WHEN {argumentos[0]} IS NOT NULL THEN '' END)"
+        if nombre == 'MID':
+            return f"substr({argumentos[0]}, {int(nodos[1][1])}, {cantidad})"
+        return f"{nombre.lower()}({argumentos[0]}, {cantidad})"
+    if nombre in ('UPPER', 'LOWER'):
+        return f"{nombre.lower()}({argumentos[0]})"
+    if nombre == 'TRIM':
+        return f"regexp_replace(btrim({argumentos[0]}, ' '), ' {{2,}}', ' ', 'g')"
+    if nombre == 'CONCAT':
+        return '(' + ' || '.join(argumentos) + ')'
+    if nombre == 'INSTR':
+        return f"strpos({argumentos[0]}, {argumentos[1]})::float8"
+    if nombre == 'ISUPPER':
+        # Como str.isupper: sin minúsculas y con al menos una letra con mayúscula y minúscula
+        return f"({argumentos[0]} = upper({argumentos[0]}) AND {argumentos[0]} <> lower({argumentos[0]}))"
+    raise ErrorFormula(f"función desconocida {nombre}")
+
+# Función para traducir un nodo a SQL. referencias tiene la expresión SQL (de texto) de cada columna
+def traducir_sql(nodo, referencias):
+    clase = nodo[0]
+    if clase == 'numero':
+        return f"{nodo[1]!r}::float8"
+    if clase == 'texto':
+        return literal_texto(nodo[1])
+    if clase == 'logico':
+        return 'TRUE' if nodo[1] else 'FALSE'
+    if clase == 'nulo':
+        return {'numero': 'NULL::float8', 'texto': 'NULL::text', 'logico': 'NULL::boolean'}[nodo[1]]
+    if clase == 'columna':
+        return referencias[nodo[1]]
+    if clase == 'convertir':
+        return convertir_sql(traducir_sql(nodo[3], referencias), nodo[1], nodo[2])
+    if clase == 'negativo':
+        return f"(-{traducir_sql(nodo[1], referencias)})"
+    if clase == 'concatenar':
+        return f"({traducir_sql(nodo[1], referencias)} || {traducir_sql(nodo[2], referencias)})"
+    if clase == 'aritmetica':
+        a, b = traducir_sql(nodo[2], referencias), traducir_sql(nodo[3], referencias)
+        # Dividir entre cero y las potencias sin resultado real dan NULL en lugar de un error
+        if nodo[1] == '/':
+            return f"({a} / NULLIF({b}, 0))"
+        if nodo[1] == '^':
+            return f"pg_temp.potencia({a}, {b})"
+        return f"({a} {nodo[1]} {b})"
+    if clase == 'comparar':
+        a, b = traducir_sql(nodo[3], referencias), traducir_sql(nodo[4], referencias)
+        colacion = ' COLLATE "C"' if nodo[2] == 'texto' else ''
+        return f"({a}{colacion} {operadores_sql[nodo[1]]} {b}{colacion})"
+    if clase == 'funcion':
+        return funcion_sql(nodo[1], [traducir_sql(argumento, referencias) for argumento in nodo[2]], nodo[2])
+    raise ErrorFormula(f"nodo desconocido {clase}")
+
+# Función para obtener el tipo SQL de una columna calculada en la base de datos cuando no se fija en 'tipos'
+def tipo_sql_formula(compilada):
+    return 'NUMERIC' if compilada['tipo'] == 'numero' else 'TEXT'
+
+# Función para armar la expresión SQL de una columna calculada con el tipo de su columna en la tabla. Como en
+# calcular_formulas y normalizar_tipos, el resultado pasa por texto: en columnas de texto los nulos quedan como cadena
+# vacía y en las demás los textos vacíos son NULL
+def columna_sql(compilada, referencias, tipo_columna, es_texto):
+    expresion = traducir_sql(convertir(compilada['arbol'], compilada['tipo'], 'texto'), referencias)
+    if es_texto:
+        return f"coalesce({expresion}, '')"
+    return f"NULLIF(btrim({expresion}), '')::{tipo_columna}"
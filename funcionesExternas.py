@@ -1,161 +1,225 @@
 from unidecode import unidecode
+import re
 import unicodedata
 from pyspark.sql import functions as F
 
+# Caracteres que se eliminan antes y después del texto. En LimpiaCodigos, LimpiaTexto y LimpiaEmail la lista se
+# escribió con las entidades HTML &lt; &gt; &amp;: se conserva así, de modo que quitan '&' y ';' pero no '<' ni '>'
+bordes_entidades = """-+*/._:,;{}[]&lt;&gt;^`¨~´¡!¿?'()=&amp;%$#º°ª¬@¢©®«»±£¤¥§¯µ¶·¸ÆæÇçØß÷Œ×ƒ½¼¾ðÐ¦þ\t¹²³“‘" """
+bordes = """-+*/._:,;{}[]<>&^`¨~´¡!¿?'()=%$#º°ª¬@¢©®«»±£¤¥§¯µ¶·¸ÆæÇçØß÷Œ×ƒ½¼¾ðÐ¦þ\t¹²³“‘" """
+bordes_email = bordes_entidades.replace('@', '')
+
+# Secuencias de texto UTF-8 leído como Windows-1252 (mojibake) y la letra que representan. Todas empiezan con 'Ã'
+mojibake_codigos = {"Ã‘": "N", "Ã‰": "E", "Ã“": "O", "Ãº": "U", "Ã­": "I", "Ã±": "N"}
+mojibake_texto = {**mojibake_codigos, "Ã³": "O"}
+
+# Reemplazos de un carácter de LimpiaTexto y LimpiaEmail
+reemplazos_email = {"‰": "A", "¢": "O", "/": " ", "-": " ", "_": " "}
+reemplazos_texto = {**reemplazos_email, ".": "", ",": ""}
+
+# Función para compilar el reemplazo de varias secuencias en una sola pasada
+def compilar_mojibake(secuencias):
+    patron = re.compile('|'.join(map(re.escape, secuencias)))
+    def corregir(texto):
+        if 'Ã' not in texto:
+            return texto
+        return patron.sub(lambda m: secuencias[m.group()], texto)
+    return corregir
+
+# Función para quitar las marcas diacríticas de un texto ya descompuesto con NFKD
+def quitar_marcas(texto):
+    return ''.join(char for char in texto if unicodedata.category(char) != 'Mn')
+
+# Tabla para str.translate que aplica los reemplazos de un carácter y después una transformación por carácter
+# (unidecode o quitar_marcas). Cada carácter se calcula la primera vez que aparece y queda guardado en la tabla,
+# así cada texto se limpia en una sola pasada de translate
+class TablaLimpieza(dict):
+    def __init__(self, reemplazos, transformar):
+        super().__init__()
+        self.reemplazos = reemplazos
+        self.transformar = transformar
+
+    def __missing__(self, codigo):
+        caracter = chr(codigo)
+        valor = self.transformar(self.reemplazos.get(caracter, caracter))
+        self[codigo] = valor
+        return valor
+
+# Función para quitar los acentos con unidecode, sin recorrer el texto si ya es ASCII (isascii no lo recorre)
+def quitar_acentos(texto):
+    return texto if texto.isascii() else texto.translate(tabla_acentos)
+
+corregir_codigos = compilar_mojibake(mojibake_codigos)
+corregir_texto = compilar_mojibake(mojibake_texto)
+tabla_acentos = TablaLimpieza({}, unidecode)
+tabla_texto = TablaLimpieza(reemplazos_texto, unidecode)
+tabla_email = TablaLimpieza(reemplazos_email, unidecode)
+tabla_texto_nfkd = TablaLimpieza(reemplazos_texto, quitar_marcas)
+tabla_puntuacion = str.maketrans({"/": " ", "-": " ", "_": " ", ".": None, ",": None})
+
 def LimpiaCodigos(texto):
-    #Se Eliminan caracteres especiales antes y despues del texto
-    temp = texto.upper()
-    temp = temp.strip("""-+*/._:,;{}[]&lt;&gt;^`¨~´¡!¿?\'()=&amp;%$#º°ª¬@¢©®«»±£¤¥§¯µ¶·¸ÆæÇçØß÷Œ×ƒ½¼¾ðÐ¦þ\t¹²³“‘" """)
-    #Se reemplazan caracteres especiales por letras
-    temp_rep = temp.upper().replace("Ã‘","N").replace("Ã‰","E").replace("Ã“","O").replace("Ãº","U").replace("Ã­","I").replace("Ã±","N")
-    #Se eliminan acentos de letras Ej: Ã -> A
-    final = unidecode(temp_rep)
-    return final
+    # Mayúsculas, sin caracteres especiales antes y después del texto, con el mojibake corregido y sin acentos
+    temp = texto.upper().strip(bordes_entidades)
+    return quitar_acentos(corregir_codigos(temp))
 
 def LimpiaCodigosv1(texto):
-    # Convierte el texto a mayúsculas
-    temp = texto.upper()
-    # Elimina caracteres especiales antes y después del texto
-    temp = temp.strip("""-+*/._:,;{}[]<>^`¨~´¡!¿?\'()=&%$#º°ª¬@¢©®«»±£¤¥§¯µ¶·¸ÆæÇçØß÷Œ×ƒ½¼¾ðÐ¦þ\t¹²³“‘" """)
-    # Reemplaza caracteres especiales por letras
-    temp_rep = temp.replace("Ã‘","N").replace("Ã‰","E").replace("Ã“","O").replace("Ãº","U").replace("Ã­","I").replace("Ã±","N")
-    # Elimina acentos de letras
-    final = unidecode(temp_rep)
-    return final
+    # Igual que LimpiaCodigos, pero quita '<' y '>' de los bordes en lugar de '&' y ';'
+    temp = texto.upper().strip(bordes)
+    return quitar_acentos(corregir_codigos(temp))
 
 def LimpiaTexto(texto):
-    # Eliminar caracteres especiales antes y después del texto
-    if texto is not None:
-       temp = texto.upper()
-       temp = temp.strip("""-+*/._:,;{}[]&lt;&gt;^`¨~´¡!¿?\'()=&amp;%$#º°ª¬@¢©®«»±£¤¥§¯µ¶·¸ÆæÇçØß÷Œ×ƒ½¼¾ðÐ¦þ\t¹²³“‘" """)
-       # Reemplazar caracteres especiales por letras
-       temp_rep = temp.upper().replace("Ã‘","N").replace("Ã‰","E").replace("Ã“","O").replace("Ãº","U")\
-       .replace("Ã­","I").replace("Ã±","N").replace("‰","A").replace("¢","O").replace("Ã³","O")\
-       .replace("/"," ").replace("-"," ").replace("_"," ").replace(".","").replace(",","")
-       # Eliminar acentos de letras Ej: Ã -> A 
-       final = unidecode(temp_rep)
-    else:
-       final = ""
-
-    return final
+    if texto is None:
+        return ""
+    # Además de LimpiaCodigos: '/', '-' y '_' pasan a espacios, se quitan '.' y ','
+    temp = texto.upper().strip(bordes_entidades)
+    return corregir_texto(temp).translate(tabla_texto)
 
 def LimpiaTextov1(texto):
-    if texto is not None:
-        # Convertir a mayúsculas y quitar acentos
-        temp = unidecode(texto.upper())
-        # Eliminar caracteres especiales antes y después del texto
-        temp = temp.strip("""-+*/._:,;{}[]<>&^`¨~´¡!¿?'()=&%$#º°ª¬@¢©®«»±£¤¥§¯µ¶·¸ÆæÇçØß÷Œ×ƒ½¼¾ðÐ¦þ\t¹²³“‘" """)
-        # Reemplazar caracteres especiales por letras
-        temp_rep = (
-            temp.replace("Ã‘","N")
-                .replace("Ã‰","E")
-                .replace("Ã“","O")
-                .replace("Ãº","U")
-                .replace("Ã­","I")
-                .replace("Ã±","N")
-                .replace("‰","A")
-                .replace("¢","O")
-                .replace("Ã³","O")
-                .replace("/"," ")
-                .replace("-"," ")
-                .replace("_"," ")
-                .replace(".","")
-                .replace(",","")
-        )
-        # Eliminar acentos de letras
-        final = unidecode(temp_rep)
-    else:
-        final = ""
-
-    return final
+    if texto is None:
+        return ""
+    # Quita los acentos antes que los bordes. Después de unidecode el texto es ASCII, así que solo queda la puntuación
+    temp = quitar_acentos(texto.upper()).strip(bordes)
+    return temp.translate(tabla_puntuacion)
 
 def LimpiaTextov2(texto):
-    if texto is not None:
-        # Convertir a mayúsculas y normalizar Unicode
-        temp = unicodedata.normalize('NFKD', texto.upper())
-        # Eliminar caracteres especiales antes y después del texto
-        temp = temp.strip("""-+*/._:,;{}[]<>&^`¨~´¡!¿?'()=&%$#º°ª¬@¢©®«»±£¤¥§¯µ¶·¸ÆæÇçØß÷Œ×ƒ½¼¾ðÐ¦þ\t¹²³“‘" """)
-        # Reemplazar caracteres especiales por letras
-        temp_rep = (
-            temp.replace("Ñ","N")
-                .replace("É","E")
-                .replace("Ó","O")
-                .replace("Ú","U")
-                .replace("Í","I")
-                .replace("Ñ","N")
-                .replace("‰","A")
-                .replace("¢","O")
-                .replace("Ó","O")  # Tratar específicamente el carácter 'ó'
-                .replace("/"," ")
-                .replace("-"," ")
-                .replace("_"," ")
-                .replace(".","")
-                .replace(",","")
-        )
-        # Eliminar acentos de letras
-        final = ''.join(char for char in temp_rep if unicodedata.category(char) != 'Mn')
-    else:
-        final = ""
-
-    return final
-
+    if texto is None:
+        return ""
+    # Descompone con NFKD y quita las marcas diacríticas en lugar de usar unidecode
+    temp = unicodedata.normalize('NFKD', texto.upper()).strip(bordes)
+    return temp.translate(tabla_texto_nfkd)
 
 def LimpiaEmail(texto):
-    # Eliminar caracteres especiales antes y después del texto
-    temp = texto.upper()
-    temp = temp.strip("""-+*/._:,;{}[]&lt;&gt;^`¨~´¡!¿?\'()=&amp;%$#º°ª¬¢©®«»±£¤¥§¯µ¶·¸ÆæÇçØß÷Œ×ƒ½¼¾ðÐ¦þ\t¹²³“‘" """)
-    # Reemplazar caracteres especiales por letras
-    temp_rep = temp.upper().replace("Ã‘","N").replace("Ã‰","E").replace("Ã“","O").replace("Ãº","U")\
-    .replace("Ã­","I").replace("Ã±","N").replace("‰","A").replace("¢","O").replace("Ã³","O")\
-    .replace("/"," ").replace("-"," ").replace("_"," ")
-    # Eliminar acentos de letras Ej: Ã -> A 
-    final = unidecode(temp_rep)
+    # Como LimpiaTexto, pero conserva '@', '.' y ','
+    temp = texto.upper().strip(bordes_email)
+    return corregir_texto(temp).translate(tabla_email)
+
+# Versiones de Spark: expresiones de Column que corren en la JVM, sin pasar cada valor por Python.
+# Los patrones usan escapes \uXXXX, que Java y Python interpretan igual
+
+# Caracteres no ASCII que la versión nativa translitera igual que unidecode: Latin-1, Latin Extendido A, marcas
+# diacríticas combinables, comillas y guiones tipográficos, ‰ y €, solo en mayúsculas porque el texto ya pasó por
+# F.upper. Los demás se dejan igual
+rangos_transliteracion = [*range(0xA0, 0x180), *range(0x300, 0x370), *range(0x2010, 0x2028), 0x2030, 0x20AC]
+caracteres_spark = [
+    chr(codigo) for codigo in rangos_transliteracion
+    if chr(codigo).upper() == chr(codigo)
+]
+
+# Función para escribir un texto como expresión regular literal
+def literal_regex(texto):
+    return ''.join(f'\\u{ord(char):04X}' for char in texto)
+
+# Función para escribir una clase de caracteres de expresión regular con los caracteres indicados
+def clase_regex(caracteres):
+    return '[' + literal_regex(sorted(set(caracteres))) + ']'
+
+# Función para escapar el texto de reemplazo de regexp_replace ('$' y '\' son especiales en Java)
+def reemplazo_regex(texto):
+    return texto.replace('\\', '\\\\').replace('$', '\\$')
+
+# Función para convertir reemplazos de un carácter en los argumentos de F.translate: los que se cambian por un
+# carácter van primero; los que se cambian por '' quedan al final de matching, sin pareja en replace, y se borran
+def argumentos_translate(reemplazos):
+    cambios = {origen: destino for origen, destino in reemplazos.items() if destino}
+    borrados = [origen for origen, destino in reemplazos.items() if not destino]
+    return ''.join(cambios) + ''.join(borrados), ''.join(cambios.values())
+
+# Transliteración nativa: los caracteres que unidecode cambia por uno o ninguno van en un F.translate;
+# los que cambia por varios (Æ, Œ, ½, €...) necesitan un regexp_replace por cada salida distinta
+translate_acentos = argumentos_translate({char: unidecode(char) for char in caracteres_spark if len(unidecode(char)) <= 1})
+acentos_multiples = {}
+for char in caracteres_spark:
+    if len(unidecode(char)) > 1:
+        acentos_multiples.setdefault(unidecode(char), []).append(char)
+
+# Función para quitar de los bordes de una columna los caracteres indicados, como str.strip
+def strip_spark(columna, caracteres):
+    clase = clase_regex(caracteres)
+    return F.regexp_replace(columna, f'^{clase}+|{clase}+\\z', '')
+
+# Función para corregir el mojibake de una columna, una secuencia tras otra como los replace originales
+def mojibake_spark(columna, secuencias):
+    for secuencia, letra in secuencias.items():
+        columna = F.regexp_replace(columna, literal_regex(secuencia), letra)
+    return columna
+
+# Función para crear un pandas_udf (Arrow) que aplica una función de limpieza de Python a una columna.
+# Los valores viajan a Python por bloques y no uno por uno como en un udf normal. Con conservar_nulos los nulos
+# no se pasan a la función
+def limpieza_pandas_udf(funcion, conservar_nulos=False):
+    import pandas as pd
+
+    def limpiar(serie: pd.Series) -> pd.Series:
+        return serie.map(funcion, na_action='ignore' if conservar_nulos else None)
+    return F.pandas_udf(limpiar, 'string')
+
+# Función para quitar los acentos de una columna. La versión nativa solo conoce caracteres_spark; con exacto=True
+# se usa unidecode en un pandas_udf, que da el mismo resultado que las funciones de Python para cualquier carácter
+def acentos_spark(columna, exacto=False):
+    if exacto:
+        return limpieza_pandas_udf(quitar_acentos, conservar_nulos=True)(columna)
+    for salida, caracteres in acentos_multiples.items():
+        columna = F.regexp_replace(columna, clase_regex(caracteres), reemplazo_regex(salida))
+    return F.translate(columna, *translate_acentos)
+
+def LimpiaCodigosCol(columna, exacto=False):
+    # Igual que LimpiaCodigos, para una columna de Spark
+    temp = strip_spark(F.upper(columna), bordes_entidades)
+    return acentos_spark(mojibake_spark(temp, mojibake_codigos), exacto)
+
+def LimpiaTextoCol(columna, exacto=False):
+    # Igual que LimpiaTexto, para una columna de Spark (los nulos quedan como '')
+    temp = strip_spark(F.upper(columna), bordes_entidades)
+    temp = F.translate(mojibake_spark(temp, mojibake_texto), *argumentos_translate(reemplazos_texto))
+    return F.coalesce(acentos_spark(temp, exacto), F.lit(""))
+
+def LimpiaEmailCol(columna, exacto=False):
+    # Igual que LimpiaEmail, para una columna de Spark
+    temp = strip_spark(F.upper(columna), bordes_email)
+    temp = F.translate(mojibake_spark(temp, mojibake_texto), *argumentos_translate(reemplazos_email))
+    return acentos_spark(temp, exacto)
+
+
+# Separadores de los teléfonos con extensión o con varios números, en orden de prioridad: se conserva lo que sigue a la
+# primera aparición del primer separador que esté en el valor
+separadores_telefono = [",", ";", "/", "Y", "EXT"]
+# Letras que se quitan del teléfono ya en mayúsculas
+letras_telefono = "ABCDEFGHIJKLMNÑOPQRSTUVWXYZ"
+
+# Función para armar la expresión regular (Java y Python) que quita todo hasta el separador de mayor prioridad.
+# Las alternativas se prueban en orden desde el inicio, así que la primera que coincide es la del separador prioritario
+def patron_telefono(separadores):
+    alternativas = [
+        f'[^{literal_regex(separador)}]*{literal_regex(separador)}' if len(separador) == 1 else f'.*?{literal_regex(separador)}'
+        for separador in separadores
+    ]
+    return '(?s)^(?:' + '|'.join(alternativas) + ')'
+
+def LimpiaTelefonoCol(columna, separadores=separadores_telefono):
+    # Teléfono de una columna de Spark: lo que sigue al separador, en mayúsculas y sin letras ('' si tiene menos de 2 caracteres)
+    resto = F.regexp_replace(columna, patron_telefono(separadores), '')
+    return F.when(F.length(columna) < 2, "").otherwise(F.translate(F.upper(resto), letras_telefono, ""))
+
+# Tabla de str.translate que quita las letras del teléfono ya en mayúsculas
+tabla_telefono = str.maketrans('', '', letras_telefono)
 
-    return final
+def LimpiaTelefono(texto, separadores=separadores_telefono):
+    # Igual que LimpiaTelefonoCol, para un valor: lo que sigue al separador de mayor prioridad, en mayúsculas y sin letras
+    if len(texto) < 2:
+        return ''
+    for separador in separadores:
+        if separador in texto:
+            texto = texto.split(separador, 1)[1]
+            break
+    return texto.upper().translate(tabla_telefono)
 
+def LimpiaTelefonoSerie(serie, separadores=separadores_telefono):
+    # LimpiaTelefono valor por valor sobre una serie de pandas (los nulos quedan nulos). Es más rápido que encadenar
+    # operaciones .str (replace, upper, translate, len), que recorren la serie una vez cada una
+    return serie.map(lambda texto: LimpiaTelefono(texto, separadores), na_action='ignore')
 
 def ttelefono(columna_telefono):
-    return F.when(F.length(columna_telefono) < 2, "").otherwise(
-        F.translate(
-            F.upper(
-                F.when(F.instr(columna_telefono, ",") != 0, F.split(columna_telefono, ",", 2).getItem(1))
-                .otherwise(
-                    F.when(F.instr(columna_telefono, ";") != 0, F.split(columna_telefono, ";", 2).getItem(1))
-                    .otherwise(
-                        F.when(F.instr(columna_telefono, "/") != 0, F.split(columna_telefono, "/", 2).getItem(1))
-                        .otherwise(
-                            F.when(F.instr(columna_telefono, "Y") != 0, F.split(columna_telefono, "Y", 2).getItem(1))
-                            .otherwise(
-                                F.when(F.instr(columna_telefono, "EXT") != 0, F.split(columna_telefono, "EXT", 2).getItem(1))
-                                .otherwise(columna_telefono)
-                            )
-                        )
-                    )
-                )
-            ),
-            "ABCDEFGHIJKLMNÑOPQRSTUVWXYZ",
-            ""
-        ))
+    return LimpiaTelefonoCol(columna_telefono)
 
 def tcelular(columna_celular):
-    return F.when(F.length(columna_celular) < 2, "").otherwise(
-        F.translate(
-            F.upper(
-                F.when(F.instr(columna_celular, ",") != 0, F.split(columna_celular, ",", 2).getItem(1))
-                .otherwise(
-                    F.when(F.instr(columna_celular, ";") != 0, F.split(columna_celular, ";", 2).getItem(1))
-                    .otherwise(
-                        F.when(F.instr(columna_celular, "/") != 0, F.split(columna_celular, "/", 2).getItem(1))
-                        .otherwise(
-                            F.when(F.instr(columna_celular, "Y") != 0, F.split(columna_celular, "Y", 2).getItem(1))
-                            .otherwise(
-                                F.when(F.instr(columna_celular, "EXT") != 0, F.split(columna_celular, "EXT", 2).getItem(1))
-                                .otherwise(columna_celular)
-                            )
-                        )
-                    )
-                )
-            ),
-            "ABCDEFGHIJKLMNÑOPQRSTUVWXYZ",
-            ""
-        ))
\ No newline at end of file
+    return LimpiaTelefonoCol(columna_celular)
@@ -0,0 +1,164 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Mediciones de una unidad de trabajo: segundos acumulados por etapa, filas y bytes procesados
+class Medicion:
+    def __init__(self):
+        self.etapas = {}
+        self.filas = 0
+        self.bytes = 0
+
+    # Medir el tiempo de una etapa. Si la etapa se repite (por bloques o reintentos) los segundos se acumulan
+    @contextmanager
+    def etapa(self, nombre):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.sumar(nombre, time.perf_counter() - inicio)
+
+    # Sumar segundos a una etapa
+    def sumar(self, nombre, segundos):
+        self.etapas[nombre] = self.etapas.get(nombre, 0.0) + segundos
+
+    # Segundos totales de las etapas medidas
+    def segundos(self):
+        return sum(self.etapas.values())
+
+    # Resumen de las etapas: segundos y filas por segundo de cada una
+    def resumen_etapas(self):
+        return {
+            nombre: {'segundos': round(segundos, 6), 'filas_por_segundo': filas_por_segundo(self.filas, segundos)}
+            for nombre, segundos in self.etapas.items()
+        }
+
+# Mediciones de un reporte. estado: 'cargado', 'sin_cambios', 'no_encontrado' o 'error'
+class MetricasReporte(Medicion):
+    def __init__(self, reporte):
+        super().__init__()
+        self.reporte = reporte
+        self.estado = None
+
+# Mediciones de un ZIP y de cada uno de sus reportes
+class MetricasZip(Medicion):
+    def __init__(self, archivo, cliente, sucursal, fecha):
+        super().__init__()
+        self.archivo = os.path.basename(archivo)
+        self.cliente = cliente
+        self.sucursal = sucursal
+        self.fecha = fecha
+        self.reportes = {}
+        self.errores = 0
+        self.inicio = time.perf_counter()
+        self.fin = None
+        self.lock = threading.Lock()
+
+    # Mediciones de un reporte del ZIP (los reportes pueden procesarse en hilos distintos)
+    def reporte(self, reporte):
+        with self.lock:
+            return self.reportes.setdefault(reporte, MetricasReporte(reporte))
+
+    # Cerrar la medición del ZIP con el número de reportes con error
+    def cerrar(self, errores):
+        self.errores = errores
+        self.fin = time.perf_counter()
+        self.filas = sum(m.filas for m in self.reportes.values())
+        self.bytes = sum(m.bytes for m in self.reportes.values())
+
+    # Segundos totales del ZIP, de principio a fin
+    def segundos(self):
+        return (self.fin or time.perf_counter()) - self.inicio
+
+    # Registros para el archivo JSON lines: uno por reporte y uno para el ZIP
+    def registros(self):
+        momento = datetime.now().isoformat(timespec='seconds')
+        base = {'momento': momento, 'archivo': self.archivo, 'cliente': self.cliente, 'sucursal': self.sucursal, 'fecha': self.fecha}
+        registros = []
+        for medicion in self.reportes.values():
+            registros.append({
+                **base,
+                'tipo': 'reporte',
+                'reporte': medicion.reporte,
+                'estado': medicion.estado,
+                'bytes': medicion.bytes,
+                'filas': medicion.filas,
+                'segundos': round(medicion.segundos(), 6),
+                'filas_por_segundo': filas_por_segundo(medicion.filas, medicion.segundos()),
+                'etapas': medicion.resumen_etapas(),
+            })
+        registros.append({
+            **base,
+            'tipo': 'zip',
+            'reportes': len(self.reportes),
+            'errores': self.errores,
+            'bytes': self.bytes,
+            'filas': self.filas,
+            'segundos': round(self.segundos(), 6),
+            'filas_por_segundo': filas_por_segundo(self.filas, self.segundos()),
+            'etapas': self.resumen_etapas(),
+        })
+        return registros
+
+# Función para calcular filas por segundo sin dividir entre cero
+def filas_por_segundo(filas, segundos):
+    return round(filas / segundos, 1) if segundos > 0 else None
+
+# Función para agregar los registros de un ZIP al archivo JSON lines (una línea por registro)
+def escribir_jsonl(metricas, archivo):
+    lineas = ''.join(json.dumps(registro, ensure_ascii=False) + '\n' for registro in metricas.registros())
+    # Una sola escritura en modo append, para que los procesos del modo lote no mezclen sus líneas
+    with open(archivo, 'a', encoding='utf-8') as f:
+        f.write(lineas)
+
+# Función para escapar el valor de una etiqueta de Prometheus
+def etiqueta_prometheus(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# Función para dar formato a una muestra de Prometheus con sus etiquetas
+def muestra_prometheus(nombre, etiquetas, valor):
+    lista = ','.join(f'{clave}="{etiqueta_prometheus(v)}"' for clave, v in etiquetas.items())
+    return f"{nombre}{{{lista}}} {valor}\n"
+
+# Función para escribir las métricas de la última carga de una sucursal en el formato textfile de Prometheus
+# (node_exporter --collector.textfile.directory). Un archivo por cliente y sucursal, reemplazado de forma atómica
+def escribir_prometheus(metricas, carpeta):
+    metricas_zip = {'cliente': metricas.cliente, 'sucursal': metricas.sucursal}
+    definiciones = {
+        'ingesta_reporte_segundos': 'Segundos de cada reporte en la última ejecución',
+        'ingesta_reporte_filas': 'Filas de cada reporte en la última ejecución',
+        'ingesta_reporte_bytes': 'Bytes sin comprimir de cada reporte en la última ejecución',
+        'ingesta_reporte_exito': '1 si el reporte terminó sin error en la última ejecución',
+        'ingesta_reporte_omitido': '1 si el reporte se omitió en la última ejecución (sin cambios o no encontrado)',
+        'ingesta_etapa_segundos': 'Segundos de cada etapa de cada reporte en la última ejecución',
+        'ingesta_zip_segundos': 'Segundos de la última carga del ZIP de la sucursal',
+        'ingesta_zip_errores': 'Reportes con error en la última carga del ZIP de la sucursal',
+        'ingesta_zip_ultima_carga_segundos': 'Momento (epoch) de la última carga del ZIP de la sucursal',
+    }
+    muestras = {nombre: [] for nombre in definiciones}
+    for medicion in metricas.reportes.values():
+        etiquetas = {**metricas_zip, 'reporte': medicion.reporte}
+        muestras['ingesta_reporte_segundos'].append(muestra_prometheus('ingesta_reporte_segundos', etiquetas, round(medicion.segundos(), 6)))
+        muestras['ingesta_reporte_filas'].append(muestra_prometheus('ingesta_reporte_filas', etiquetas, medicion.filas))
+        muestras['ingesta_reporte_bytes'].append(muestra_prometheus('ingesta_reporte_bytes', etiquetas, medicion.bytes))
+        muestras['ingesta_reporte_exito'].append(muestra_prometheus('ingesta_reporte_exito', etiquetas, int(medicion.estado != 'error')))
+        muestras['ingesta_reporte_omitido'].append(muestra_prometheus('ingesta_reporte_omitido', etiquetas, int(medicion.estado in ('sin_cambios', 'no_encontrado'))))
+        for etapa, segundos in medicion.etapas.items():
+            muestras['ingesta_etapa_segundos'].append(muestra_prometheus('ingesta_etapa_segundos', {**etiquetas, 'etapa': etapa}, round(segundos, 6)))
+    muestras['ingesta_zip_segundos'].append(muestra_prometheus('ingesta_zip_segundos', metricas_zip, round(metricas.segundos(), 6)))
+    muestras['ingesta_zip_errores'].append(muestra_prometheus('ingesta_zip_errores', metricas_zip, metricas.errores))
+    muestras['ingesta_zip_ultima_carga_segundos'].append(muestra_prometheus('ingesta_zip_ultima_carga_segundos', metricas_zip, int(time.time())))
+
+    contenido = ''
+    for nombre, ayuda in definiciones.items():
+        contenido += f"# HELP {nombre} {ayuda}\n# TYPE {nombre} gauge\n" + ''.join(muestras[nombre])
+
+    os.makedirs(carpeta, exist_ok=True)
+    archivo = os.path.join(carpeta, f"ingesta_{metricas.cliente}_{metricas.sucursal}.prom")
+    temporal = f"{archivo}.{os.getpid()}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        f.write(contenido)
+    os.replace(temporal, archivo)
@@ -0,0 +1,118 @@
+import pandas as pd
+from unidecode import unidecode
+
+import funcionesExternas as fe
+
+# Registro de reglas de limpieza de columnas. Cada regla tiene una versión por motor:
+# - pandas: función de Series a Series
+# - spark: función de Column a Column
+# - sql: función que recibe la expresión SQL de la columna y regresa la expresión limpia (PostgreSQL)
+# En columnas_esperadas, "limpieza": {"Nombre": "LimpiaTexto", "Telefono": "telefono"} aplica una regla por columna.
+# Las reglas con el nombre de una función de funcionesExternas dan lo mismo que ella: LimpiaTexto cambia los nulos por
+# '' en los tres motores y las demás los dejan nulos (la función de Python no acepta None)
+reglas = {}
+motores = ('pandas', 'spark', 'sql')
+
+# Función para registrar una regla de limpieza con sus versiones para cada motor
+def registrar_regla(nombre, pandas, spark, sql):
+    reglas[nombre] = {'pandas': pandas, 'spark': spark, 'sql': sql}
+
+# Función para obtener la versión de una regla para un motor ('pandas', 'spark' o 'sql')
+def compilar_regla(nombre, motor):
+    if nombre not in reglas:
+        raise ValueError(f"no existe la regla de limpieza {nombre!r}; las reglas son {', '.join(sorted(reglas))}")
+    if motor not in motores:
+        raise ValueError(f"motor de limpieza inválido {motor!r}; los motores son {', '.join(motores)}")
+    return reglas[nombre][motor]
+
+# Función para escribir un texto como literal de SQL
+def literal(texto):
+    return "'" + texto.replace("'", "''") + "'"
+
+# Transliteración para PostgreSQL, como unidecode después de upper. Incluye las minúsculas por si upper de la base
+# no las convierte (depende de LC_CTYPE): cada carácter se translitera como su mayúscula en Python
+caracteres_sql = [chr(codigo) for codigo in fe.rangos_transliteracion]
+acentos_sql = {char: unidecode(char.upper()) for char in caracteres_sql}
+translate_acentos_sql = fe.argumentos_translate({char: salida for char, salida in acentos_sql.items() if len(salida) <= 1})
+
+# Función para quitar los acentos de una expresión SQL: un replace por cada carácter que unidecode cambia por varios
+# y un translate para los demás
+def acentos_sql_expresion(expresion):
+    for char, salida in acentos_sql.items():
+        if len(salida) > 1:
+            expresion = f"replace({expresion}, {literal(char)}, {literal(salida)})"
+    origen, destino = translate_acentos_sql
+    return f"translate({expresion}, {literal(origen)}, {literal(destino)})"
+
+# Función para armar la expresión SQL de las funciones de texto: mayúsculas, bordes, mojibake, reemplazos y acentos.
+# Con nulo, los nulos se cambian por ese texto
+def limpieza_sql(expresion, bordes, mojibake, reemplazos, nulo=None):
+    if nulo is not None:
+        expresion = f"coalesce({expresion}, {literal(nulo)})"
+    expresion = f"btrim(upper({expresion}), {literal(bordes)})"
+    for secuencia, letra in mojibake.items():
+        expresion = f"replace({expresion}, {literal(secuencia)}, {literal(letra)})"
+    if reemplazos:
+        origen, destino = fe.argumentos_translate(reemplazos)
+        expresion = f"translate({expresion}, {literal(origen)}, {literal(destino)})"
+    return acentos_sql_expresion(expresion)
+
+# Función para armar la versión de pandas de las funciones de texto con los mismos pasos y la misma tabla de
+# str.translate (reemplazos y unidecode, ver fe.TablaLimpieza) que la función de Python, así da lo mismo con cualquier
+# carácter. Todo son operaciones .str, que dejan los nulos como nulos; con nulo se cambian por ese texto
+def limpieza_pandas(bordes, mojibake, tabla, nulo=None):
+    # str.translate es más rápido con un dict exacto que con la subclase de fe: se copian de la tabla de fe los
+    # caracteres ASCII y los de la transliteración, y solo los textos con otros caracteres pasan por la tabla de fe
+    exacta = {codigo: tabla[codigo] for codigo in [*range(128), *fe.rangos_transliteracion]}
+
+    def limpiar(serie):
+        if nulo is not None:
+            serie = serie.fillna(nulo)
+        serie = serie.str.upper().str.strip(bordes)
+        # Todas las secuencias de mojibake empiezan con 'Ã': sin esa letra en el bloque no se recorre una vez por secuencia
+        if serie.str.contains('Ã', regex=False, na=False).any():
+            for secuencia, letra in mojibake.items():
+                serie = serie.str.replace(secuencia, letra, regex=False)
+        limpia = serie.str.translate(exacta)
+        # Los caracteres que no están en la tabla exacta quedan igual: son los únicos que no son ASCII
+        otros = pd.Series([isinstance(texto, str) and not texto.isascii() for texto in limpia], index=limpia.index, dtype=bool)
+        if otros.any():
+            limpia[otros] = serie[otros].str.translate(tabla)
+        return limpia
+    return limpiar
+
+# Función para armar la expresión SQL del teléfono. Las expresiones regulares de PostgreSQL con alternativas buscan la
+# coincidencia más larga y no la primera alternativa, así que la prioridad de los separadores se arma con CASE
+def telefono_sql(expresion, separadores=fe.separadores_telefono):
+    casos = ' '.join(
+        f"WHEN strpos({expresion}, {literal(separador)}) > 0 "
+        f"THEN substr({expresion}, strpos({expresion}, {literal(separador)}) + {len(separador)})"
+        for separador in separadores
+    )
+    resto = f"CASE {casos} ELSE {expresion} END"
+    return f"CASE WHEN length({expresion}) < 2 THEN '' ELSE translate(upper({resto}), {literal(fe.letras_telefono)}, '') END"
+
+registrar_regla(
+    'LimpiaTexto',
+    pandas=limpieza_pandas(fe.bordes_entidades, fe.mojibake_texto, fe.tabla_texto, nulo=''),
+    spark=fe.LimpiaTextoCol,
+    sql=lambda expresion: limpieza_sql(expresion, fe.bordes_entidades, fe.mojibake_texto, fe.reemplazos_texto, nulo=''),
+)
+registrar_regla(
+    'LimpiaCodigos',
+    pandas=limpieza_pandas(fe.bordes_entidades, fe.mojibake_codigos, fe.tabla_acentos),
+    spark=fe.LimpiaCodigosCol,
+    sql=lambda expresion: limpieza_sql(expresion, fe.bordes_entidades, fe.mojibake_codigos, {}),
+)
+registrar_regla(
+    'LimpiaEmail',
+    pandas=limpieza_pandas(fe.bordes_email, fe.mojibake_texto, fe.tabla_email),
+    spark=fe.LimpiaEmailCol,
+    sql=lambda expresion: limpieza_sql(expresion, fe.bordes_email, fe.mojibake_texto, fe.reemplazos_email),
+)
+registrar_regla(
+    'telefono',
+    pandas=fe.LimpiaTelefonoSerie,
+    spark=fe.LimpiaTelefonoCol,
+    sql=telefono_sql,
+)
@@ -0,0 +1,57 @@
+import json
+import os
+import sys
+
+import pytest
+
+raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, raiz)
+
+# Conexión (DSN de libpq) a un PostgreSQL desechable para las pruebas que cargan datos, por ejemplo:
+#     PRUEBAS_DB="host=localhost user=postgres dbname=pruebas" python -m pytest tests
+# Sin la variable esas pruebas se omiten
+dsn_pruebas = os.environ.get('PRUEBAS_DB')
+
+# api.py lee config.json del directorio actual al importarse: se importa desde una carpeta de trabajo temporal
+@pytest.fixture(scope='session')
+def api(tmp_path_factory):
+    carpeta = tmp_path_factory.mktemp('api')
+    config = {
+        'workng_dir': str(carpeta / '2-Workng'),
+        'sandbx': str(carpeta / '3-Sandbx'),
+        'reportes': ['PRUEBA'],
+        'columnas_esperadas': {'PRUEBA': ['Cuenta', 'Saldo$']},
+        'db': {'host': 'localhost'},
+    }
+    with open(carpeta / 'config.json', 'w', encoding='utf-8') as f:
+        json.dump(config, f)
+    anterior = os.getcwd()
+    os.chdir(carpeta)
+    try:
+        import api as modulo
+        yield modulo
+    finally:
+        os.chdir(anterior)
+
+# Conexiones a un esquema vacío y propio de la prueba, que se borra al terminar
+@pytest.fixture
+def conectar_esquema():
+    if not dsn_pruebas:
+        pytest.skip("Sin PRUEBAS_DB no hay PostgreSQL para la prueba.")
+    import psycopg2
+    esquema = f"pruebas_{os.getpid()}"
+    administrador = psycopg2.connect(dsn_pruebas)
+    administrador.autocommit = True
+    administrador.cursor().execute(f"DROP SCHEMA IF EXISTS {esquema} CASCADE; CREATE SCHEMA {esquema};")
+    conexiones = []
+
+    def conectar():
+        conexion = psycopg2.connect(dsn_pruebas, options=f"-c search_path={esquema}")
+        conexiones.append(conexion)
+        return conexion
+
+    yield conectar
+    for conexion in conexiones:
+        conexion.close()
+    administrador.cursor().execute(f"DROP SCHEMA {esquema} CASCADE;")
+    administrador.close()
@@ -0,0 +1,22 @@
+import json
+
+import almacen_config
+
+# Modificar lo que regresa leer_json no cambia lo que leen las siguientes peticiones
+def test_leer_json_regresa_copia(tmp_path):
+    ruta = str(tmp_path / 'VTAS.json')
+    almacen_config.escribir_json(ruta, {'reportes': ['VTAUSA']})
+    config = almacen_config.leer_json(ruta)
+    config['reportes'].append('VTAUSA02')
+    assert almacen_config.leer_json(ruta) == {'reportes': ['VTAUSA']}
+    with open(ruta) as f:
+        assert json.load(f) == {'reportes': ['VTAUSA']}
+
+# editar_json guarda los cambios y las lecturas siguientes los ven
+def test_editar_json_actualiza_cache(tmp_path):
+    ruta = str(tmp_path / 'VTAS.json')
+    almacen_config.escribir_json(ruta, {'reportes': []})
+    almacen_config.leer_json(ruta)
+    with almacen_config.editar_json(ruta) as config:
+        config['reportes'].append('VTAUSA')
+    assert almacen_config.leer_json(ruta) == {'reportes': ['VTAUSA']}
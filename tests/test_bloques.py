@@ -0,0 +1,23 @@
+import io
+import os
+
+import pytest
+
+@pytest.fixture
+def por_bloques(api, tmp_path, monkeypatch):
+    monkeypatch.setattr(api, 'memoria_reporte_mb', 1)
+    monkeypatch.setattr(api, 'salida_parquet', str(tmp_path / 'parquet'))
+    monkeypatch.setattr(api, 'cache_planes', str(tmp_path / 'planes_carga.json'))
+    monkeypatch.setattr(api, 'cache_codificaciones', str(tmp_path / 'codificaciones.json'))
+    return tmp_path
+
+# Un valor que no cabe en un tipo fijado en "tipos" descarta solo la salida Parquet: el reporte se sigue procesando
+def test_parquet_con_valor_fuera_de_tipo(api, por_bloques, monkeypatch):
+    pytest.importorskip('pyarrow')
+    monkeypatch.setitem(api.columnas_esperadas, 'PRUEBA', {'columnas': ['Cuenta', 'Saldo$'], 'tipos': {'Cuenta': 'INTEGER'}})
+    stream = io.BytesIO(b'Cuenta|Saldo$\n1|2\nabc|3\n')
+    assert api.procesar_reporte(None, 'PRUEBA', stream, '0001', 'AA', '01/02/2024', str(por_bloques), 'PostgreSQL')
+    sucursal = por_bloques / 'parquet' / 'PRUEBA' / 'Client=0001' / 'Branch=AA'
+    assert not os.path.exists(sucursal / 'Date=2024-02-01')
+    assert not os.path.exists(sucursal / 'Date=2024-02-01.tmp')
+    assert os.path.exists(por_bloques / 'PRUEBAAA.sql.dump')
@@ -0,0 +1,32 @@
+import io
+import json
+
+import pytest
+
+@pytest.fixture
+def cache(api, tmp_path, monkeypatch):
+    ruta = tmp_path / 'codificaciones.json'
+    monkeypatch.setattr(api, 'cache_codificaciones', str(ruta))
+    return ruta
+
+# Una codificación guardada que no sirve para la muestra del archivo nuevo se detecta de nuevo
+def test_cache_utf8_con_archivo_latin1(api, cache):
+    cache.write_text(json.dumps({'0001|PRUEBA': 'utf-8'}))
+    stream = io.BytesIO('Cuenta|Descripción\n1|Año\n'.encode('latin-1'))
+    assert api.obtener_codificacion(stream, '0001', 'PRUEBA') != 'utf-8'
+    assert stream.tell() == 0
+
+# Un archivo UTF-8 con acentos no se lee con la codificación de un byte que quedó en el cache
+def test_cache_latin1_con_archivo_utf8(api, cache):
+    cache.write_text(json.dumps({'0001|PRUEBA': 'ISO-8859-1'}))
+    stream = io.BytesIO('Cuenta|Descripción\n1|Año\n'.encode('utf-8'))
+    assert api.decodificar_reporte(stream, '0001', 'PRUEBA') == 'Cuenta|Descripción\n1|Año\n'
+    assert json.loads(cache.read_text()) == {'0001|PRUEBA': 'utf-8'}
+
+# Si el archivo falla a la mitad con la codificación del cache, se lee como ISO-8859-1 y se quita del cache
+def test_cache_descartado_al_fallar(api, cache, monkeypatch):
+    monkeypatch.setattr(api, 'muestra_codificacion', 16)
+    cache.write_text(json.dumps({'0001|PRUEBA': 'utf-8', '0002|PRUEBA': 'utf-8'}))
+    contenido = b'Cuenta|Saldo\n' + b'1|' * 20 + 'Año'.encode('latin-1')
+    assert api.decodificar_reporte(io.BytesIO(contenido), '0001', 'PRUEBA') == contenido.decode('latin-1')
+    assert json.loads(cache.read_text()) == {'0002|PRUEBA': 'utf-8'}
@@ -0,0 +1,52 @@
+import json
+import os
+
+import pytest
+
+from conftest import raiz
+
+carpeta_dms = os.path.join(raiz, 'CLIENTS', 'dms')
+
+with open(os.path.join(carpeta_dms, 'tabs.json'), 'r', encoding='utf-8') as f:
+    tabs = json.load(f)
+
+# Cada reporte de cada pestaña de CLIENTS/dms pasa la validación de la configuración
+@pytest.mark.parametrize('tab', tabs)
+def test_pestanas_validas(api, monkeypatch, tab):
+    with open(os.path.join(carpeta_dms, f'{tab}.json'), 'r', encoding='utf-8') as f:
+        configuracion = json.load(f)
+    monkeypatch.setattr(api, 'columnas_esperadas', configuracion.get('columnas_esperadas', {}))
+    for reporte in configuracion.get('reportes', []):
+        assert api.compilar_plan(reporte)['errores'] == [], reporte
+
+# Las fórmulas antiguas del editor, con columnas seguidas sin operador, se concatenan con una advertencia
+def test_formula_yuxtapuesta(caplog):
+    from formulas import compilar_formulas
+    compiladas, errores = compilar_formulas({'Clave': ' Sucursal CentroCosto'}, ['Sucursal', 'CentroCosto'])
+    assert errores == []
+    assert compiladas['Clave']['arbol'] == ['concatenar', ['columna', 'Sucursal'], ['columna', 'CentroCosto']]
+    assert 'sin operador' in caplog.text
+
+# Un motor de limpieza que api.py no aplica (por ejemplo 'spark') es un error de configuración, no una limpieza omitida
+def test_motor_limpieza_invalido(api, monkeypatch):
+    assert api.validar_configuracion() == []
+    monkeypatch.setattr(api, 'motor_limpieza', 'spark')
+    assert api.validar_configuracion()
+
+# Un motor de fórmulas mal escrito no deja las columnas calculadas vacías: es un error de configuración
+def test_motor_formulas_invalido(api, monkeypatch):
+    monkeypatch.setattr(api, 'motor_formulas', 'Pandas')
+    assert api.validar_configuracion()
+
+# Una fórmula inválida solo descarta su columna calculada (y las que dependen de ella): el reporte se sigue cargando
+def test_formula_invalida_es_local(api, monkeypatch):
+    monkeypatch.setitem(api.columnas_esperadas, 'PRUEBA', {
+        'columnas': ['Cuenta', 'Saldo$'],
+        'formulas': {'Doble': 'Saldo$ * 2', 'Mala': 'Saldo$ +', 'Peor': 'Mala & Cuenta'},
+        'indices': [['Cuenta'], ['Peor']],
+    })
+    plan = api.compilar_plan('PRUEBA')
+    assert plan['errores'] == []
+    assert list(plan['formulas']) == plan['derivadas'] == ['Doble']
+    assert plan['indices'] == [['Cuenta']]
+    assert len(plan['avisos']) == 3
@@ -0,0 +1,79 @@
+import shutil
+
+import pandas as pd
+import pytest
+
+import funcionesExternas as fe
+from conftest import dsn_pruebas
+from reglas_limpieza import compilar_regla
+
+# Valores con nulos, vacíos, bordes, mojibake, reemplazos y caracteres de la transliteración (Latin-1, Latin
+# Extendido A, comillas y guiones tipográficos, ‰ y €)
+valores = [
+    None, '', '  ', 'José Ñúñez', '  --ÁRBOL.  ', 'Ã‘ANDÃº Ã‰', 'Ã³scar', 'a/b-c_d.e,f', 'ñandú@correo.com',
+    'Œuvre – «Æsir»', 'precio 5€ ‰', '¡¿Qué?!', 'ĳssel łódź', '&amp;amp;', None, 'x',
+]
+# Caracteres fuera de fe.rangos_transliteracion: solo pandas y Python los transliteran con unidecode
+fuera_de_rango = ['ƒ', 'Ωmega', 'ǅemal', '北京', 'ﬁn', '½ ≥ ¼']
+reglas = ['LimpiaTexto', 'LimpiaCodigos', 'LimpiaEmail']
+python = {'LimpiaTexto': fe.LimpiaTexto, 'LimpiaCodigos': fe.LimpiaCodigos, 'LimpiaEmail': fe.LimpiaEmail}
+
+def resultado_pandas(regla, entrada=valores):
+    return [None if pd.isna(valor) else valor for valor in compilar_regla(regla, 'pandas')(pd.Series(entrada, dtype=object))]
+
+# La versión de pandas da lo mismo que la función de Python con cualquier carácter. Con nulos, LimpiaTexto da '' como
+# la función de Python y las demás dejan el nulo (la función de Python no acepta None)
+@pytest.mark.parametrize('regla', reglas)
+def test_pandas_como_python(regla):
+    entrada = valores + fuera_de_rango
+    nulo = '' if regla == 'LimpiaTexto' else None
+    esperado = [nulo if valor is None else python[regla](valor) for valor in entrada]
+    assert resultado_pandas(regla, entrada) == esperado
+
+@pytest.mark.parametrize('regla', reglas)
+def test_sql_como_pandas(regla):
+    if not dsn_pruebas:
+        pytest.skip("Sin PRUEBAS_DB no hay PostgreSQL para la prueba.")
+    import psycopg2
+    conexion = psycopg2.connect(dsn_pruebas)
+    try:
+        cursor = conexion.cursor()
+        cursor.execute(
+            "SELECT " + compilar_regla(regla, 'sql')('valor').replace('%', '%%') + " FROM unnest(%s::text[]) WITH ORDINALITY AS t(valor, n) ORDER BY n;",
+            (valores,)
+        )
+        obtenido = [fila[0] for fila in cursor.fetchall()]
+    finally:
+        conexion.close()
+    assert obtenido == resultado_pandas(regla)
+
+@pytest.mark.parametrize('regla', reglas)
+def test_spark_como_pandas(regla):
+    if not shutil.which('java'):
+        pytest.skip("Spark requiere Java.")
+    from pyspark.sql import SparkSession
+    spark = SparkSession.builder.master('local[1]').getOrCreate()
+    df = spark.createDataFrame([(i, valor) for i, valor in enumerate(valores)], 'n int, valor string')
+    filas = df.select('n', compilar_regla(regla, 'spark')(df['valor']).alias('limpio')).orderBy('n').collect()
+    assert [fila['limpio'] for fila in filas] == resultado_pandas(regla)
+
+# Con motor_limpieza sql y motor_formulas pandas la limpieza se hace en pandas, antes de las fórmulas, y no se repite
+# en la base de datos: las fórmulas leen los valores limpios sin importar la combinación de motores
+def test_formulas_pandas_leen_valores_limpios(api, monkeypatch):
+    monkeypatch.setattr(api, 'motor_limpieza', 'sql')
+    monkeypatch.setattr(api, 'motor_formulas', 'pandas')
+    monkeypatch.setitem(api.columnas_esperadas, 'PRUEBA', {
+        'columnas': ['Cuenta', 'Saldo$'], 'limpieza': {'Cuenta': 'LimpiaTexto'}, 'formulas': {'Copia': 'Cuenta'},
+    })
+    plan = api.compilar_plan('PRUEBA')
+    df = pd.DataFrame({'Cuenta': ['  José '], 'Saldo$': ['1']})
+    df = api.calcular_columnas(api.limpiar_columnas(df, plan), plan)
+    assert df['Cuenta'].tolist() == df['Copia'].tolist() == [fe.LimpiaTexto('  José ')]
+    assert api.expresiones_sql(plan, {'Cuenta': 'TEXT', 'Saldo$': 'TEXT', 'Copia': 'TEXT'}) is None
+
+# La versión de pandas del teléfono da lo mismo que LimpiaTelefono valor por valor y deja los nulos como nulos
+def test_telefono_pandas():
+    telefonos = [None, '', '5', '55 1234 5678', '5512345678 EXT 12', '(55) 1234, 9876', 'TEL 123; 456', 'cel: 55/66 Y 77']
+    obtenido = compilar_regla('telefono', 'pandas')(pd.Series(telefonos, dtype=object)).tolist()
+    assert [None if pd.isna(valor) else valor for valor in obtenido] == [None if t is None else fe.LimpiaTelefono(t) for t in telefonos]
+    assert obtenido[4] == ' 12'
@@ -0,0 +1,73 @@
+import json
+import zipfile
+import zlib
+
+# Dos clientes de la misma sucursal cargan la misma tabla <reporte><sucursal>: el primero no puede omitir su
+# reporte sin cambios si el otro cargó la tabla después
+def test_tabla_compartida_entre_clientes(api, conectar_esquema):
+    conexion = conectar_esquema()
+    api.crear_manifiesto(conexion)
+    conexion.cursor().execute("CREATE TABLE PRUEBAAA (Client VARCHAR(255));")
+    conexion.commit()
+
+    api.registrar_carga(conexion, '0001', 'AA', 'PRUEBA', 'PRUEBAAA', 'huella1')
+    assert api.reporte_sin_cambios(conexion, '0001', 'AA', 'PRUEBA', 'PRUEBAAA', 'huella1')
+
+    api.registrar_carga(conexion, '0002', 'AA', 'PRUEBA', 'PRUEBAAA', 'huella2')
+    assert not api.reporte_sin_cambios(conexion, '0001', 'AA', 'PRUEBA', 'PRUEBAAA', 'huella1')
+    assert api.reporte_sin_cambios(conexion, '0002', 'AA', 'PRUEBA', 'PRUEBAAA', 'huella2')
+
+# El manifiesto anterior, por cliente, sucursal y reporte, se reemplaza por el de tabla destino
+def test_migracion_del_manifiesto_anterior(api, conectar_esquema):
+    conexion = conectar_esquema()
+    conexion.cursor().execute(
+        "CREATE TABLE manifiesto_carga (cliente VARCHAR(255), sucursal VARCHAR(255), reporte VARCHAR(255), "
+        "huella VARCHAR(64) NOT NULL, cargado_en TIMESTAMP NOT NULL DEFAULT now(), PRIMARY KEY (cliente, sucursal, reporte));"
+    )
+    conexion.commit()
+    api.crear_manifiesto(conexion)
+    assert 'tabla' in api.tipos_tabla(conexion, 'manifiesto_carga')
+
+# Función para armar dos textos distintos del mismo tamaño y el mismo CRC-32. El CRC de textos del mismo tamaño es
+# lineal en los bits: se busca una combinación de cambios de bit cuyo efecto en el CRC se anule (eliminación en GF(2))
+def colision_crc32(base):
+    cambios = [(posicion, 1 << bit) for posicion in range(len(base)) for bit in range(4)]
+    filas = {}
+    for indice, (posicion, mascara) in enumerate(cambios):
+        texto = bytearray(base)
+        texto[posicion] ^= mascara
+        efecto, combinacion = zlib.crc32(bytes(texto)) ^ zlib.crc32(base), 1 << indice
+        while efecto:
+            alto = efecto.bit_length() - 1
+            if alto not in filas:
+                filas[alto] = (efecto, combinacion)
+                break
+            efecto, combinacion = efecto ^ filas[alto][0], combinacion ^ filas[alto][1]
+        else:
+            otro = bytearray(base)
+            for usado, (posicion, mascara) in enumerate(cambios):
+                if combinacion >> usado & 1:
+                    otro[posicion] ^= mascara
+            return base, bytes(otro)
+
+# Un reporte con otro contenido se vuelve a cargar aunque el ZIP le guarde el mismo tamaño y el mismo CRC-32
+def test_contenido_con_el_mismo_crc(api, conectar_esquema, tmp_path, monkeypatch):
+    monkeypatch.setattr(api, 'conectar_db', lambda *args: conectar_esquema())
+    monkeypatch.setattr(api, 'archivo_metricas', str(tmp_path / 'metricas.jsonl'))
+    monkeypatch.setattr(api, 'carpeta_prometheus', None)
+    monkeypatch.setattr(api, 'salida_parquet', None)
+    monkeypatch.setattr(api, 'cache_planes', str(tmp_path / 'planes_carga.json'))
+    monkeypatch.setattr(api, 'cache_codificaciones', str(tmp_path / 'codificaciones.json'))
+    api.crear_manifiesto(conectar_esquema())
+
+    primero, segundo = colision_crc32(b'@' * 16)
+    assert primero != segundo and zlib.crc32(primero) == zlib.crc32(segundo)
+    workng = tmp_path / '0001AA20240201.zip'
+    estados = []
+    for cuenta in (primero, primero, segundo):
+        with zipfile.ZipFile(workng, 'w') as zip_ref:
+            zip_ref.writestr('PRUEBA.txt', b'Cuenta|Saldo$\n' + cuenta + b'|2\n')
+        assert api.procesar_zip(str(workng), str(tmp_path / 'sandbx')) == 0
+        with open(tmp_path / 'metricas.jsonl') as f:
+            estados.append([json.loads(linea) for linea in f][-2]['estado'])
+    assert estados == ['cargado', 'sin_cambios', 'cargado']
@@ -0,0 +1,36 @@
+import threading
+
+import pandas as pd
+
+definicion = "    Client VARCHAR(255),\n    Branch VARCHAR(255),\n    Date DATE,\n    Cuenta VARCHAR(255),\n    Saldo NUMERIC"
+
+# Varios clientes cargan el mismo reporte a la vez sobre una base sin la tabla consolidada, como en el modo lote
+def test_carga_concurrente_en_base_vacia(api, conectar_esquema, monkeypatch):
+    monkeypatch.setattr(api, 'tablas_particionadas', True)
+    monkeypatch.setattr(api, 'particionar_por_fecha', True)
+    clientes = [f"CLIENTE{i}" for i in range(8)]
+    conexiones = {cliente: conectar_esquema() for cliente in clientes}
+    inicio = threading.Barrier(len(clientes))
+    resultados = {}
+
+    def cargar(cliente):
+        datos = pd.DataFrame({
+            'Client': [cliente] * 3,
+            'Branch': ['01'] * 3,
+            'Date': ['01/02/2024'] * 3,
+            'Cuenta': ['100', '200', '300'],
+            'Saldo': ['1.5', '2', '-3'],
+        })
+        inicio.wait()
+        resultados[cliente] = api.cargar_particion(conexiones[cliente], 'PRUEBA', cliente, '01', '01/02/2024', definicion, datos)
+
+    hilos = [threading.Thread(target=cargar, args=(cliente,)) for cliente in clientes]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert all(resultados[cliente] for cliente in clientes), resultados
+    cursor = conectar_esquema().cursor()
+    cursor.execute("SELECT Client, count(*), sum(Saldo) FROM PRUEBA GROUP BY Client ORDER BY Client;")
+    assert cursor.fetchall() == [(cliente, 3, 0.5) for cliente in clientes]
@@ -0,0 +1,76 @@
+import decimal
+import io
+
+import pandas as pd
+import pytest
+
+contenido = 'Cuenta|Saldo$\n  josé |10\nÁrbol|\n x |-2.5\n'.encode('utf-8')
+
+@pytest.fixture
+def motores_sql(api, tmp_path, monkeypatch):
+    monkeypatch.setattr(api, 'motor_limpieza', 'sql')
+    monkeypatch.setattr(api, 'motor_formulas', 'sql')
+    monkeypatch.setattr(api, 'salida_parquet', str(tmp_path / 'parquet'))
+    monkeypatch.setattr(api, 'cache_planes', str(tmp_path / 'planes_carga.json'))
+    monkeypatch.setattr(api, 'cache_codificaciones', str(tmp_path / 'codificaciones.json'))
+    monkeypatch.setitem(api.columnas_esperadas, 'PRUEBA', {
+        'columnas': ['Cuenta', 'Saldo$'],
+        'limpieza': {'Cuenta': 'LimpiaTexto'},
+        'formulas': {'Doble': 'Saldo$ * 2', 'Etiqueta': 'Cuenta & "-" & Saldo$'},
+    })
+    return tmp_path
+
+# Con la limpieza y las fórmulas en la base de datos, el .sql.dump restaura la misma tabla que se cargó y Parquet
+# lleva sus mismos valores, con y sin memoria_reporte_mb
+@pytest.mark.parametrize('memoria', [None, 1])
+def test_dump_y_parquet_como_la_tabla(api, conectar_esquema, motores_sql, monkeypatch, memoria):
+    pytest.importorskip('pyarrow')
+    monkeypatch.setattr(api, 'memoria_reporte_mb', memoria)
+    conexion = conectar_esquema()
+    assert api.procesar_reporte(conexion, 'PRUEBA', io.BytesIO(contenido), '0001', 'AA', '01/02/2024', str(motores_sql), 'PostgreSQL')
+
+    cursor = conexion.cursor()
+    cursor.execute("SELECT cuenta, \"saldo$\", doble, etiqueta FROM PRUEBAAA ORDER BY cuenta;")
+    cargadas = cursor.fetchall()
+    assert [fila[0] for fila in cargadas] == ['ARBOL', 'JOSE', 'X']
+
+    cursor.execute("ALTER TABLE PRUEBAAA RENAME TO cargada;")
+    with open(motores_sql / 'PRUEBAAA.sql.dump', encoding='utf-8') as f:
+        cursor.execute(f.read())
+    cursor.execute("SELECT count(*) FROM (SELECT * FROM cargada EXCEPT ALL SELECT * FROM PRUEBAAA) AS d;")
+    assert cursor.fetchone()[0] == 0
+    cursor.execute("SELECT count(*) FROM PRUEBAAA;")
+    assert cursor.fetchone()[0] == len(cargadas)
+    conexion.commit()
+
+    parquet = pd.read_parquet(motores_sql / 'parquet' / 'PRUEBA').sort_values('Cuenta')
+    assert parquet['Cuenta'].tolist() == [fila[0] for fila in cargadas]
+    assert parquet['Etiqueta'].tolist() == [fila[3] for fila in cargadas]
+    assert parquet['Doble'].tolist() == [None if fila[2] is None else str(fila[2]) for fila in cargadas]
+
+# Parquet guarda los NUMERIC(p,s) como decimales con los mismos valores exactos que la tabla (float64 perdería dígitos)
+# y los NUMERIC sin precisión como el texto que devuelve PostgreSQL, con la limpieza en pandas o en la base de datos
+@pytest.mark.parametrize('motor', ['pandas', 'sql'])
+def test_parquet_con_numeric_exacto(api, conectar_esquema, tmp_path, monkeypatch, motor):
+    pytest.importorskip('pyarrow')
+    monkeypatch.setattr(api, 'motor_limpieza', motor)
+    monkeypatch.setattr(api, 'memoria_reporte_mb', None)
+    monkeypatch.setattr(api, 'salida_parquet', str(tmp_path / 'parquet'))
+    monkeypatch.setattr(api, 'cache_planes', str(tmp_path / 'planes_carga.json'))
+    monkeypatch.setattr(api, 'cache_codificaciones', str(tmp_path / 'codificaciones.json'))
+    monkeypatch.setitem(api.columnas_esperadas, 'PRUEBA', {
+        'columnas': ['Cuenta', 'Saldo$', 'Tasa'],
+        'tipos': {'Saldo$': 'NUMERIC(20,2)'},
+        'limpieza': {'Cuenta': 'LimpiaTexto'},
+    })
+    contenido = b'Cuenta|Saldo$|Tasa\na|12345678901234567.895|+.5\nb|-0.001|1.50\nc||-0\n'
+    conexion = conectar_esquema()
+    assert api.procesar_reporte(conexion, 'PRUEBA', io.BytesIO(contenido), '0001', 'AA', '01/02/2024', str(tmp_path), 'PostgreSQL')
+
+    cursor = conexion.cursor()
+    cursor.execute("SELECT \"saldo$\", tasa::text FROM PRUEBAAA ORDER BY cuenta;")
+    cargadas = cursor.fetchall()
+    parquet = pd.read_parquet(tmp_path / 'parquet' / 'PRUEBA').sort_values('Cuenta')
+    assert parquet['Saldo$'].tolist() == [fila[0] for fila in cargadas]
+    assert parquet['Saldo$'].tolist()[0] == decimal.Decimal('12345678901234567.90')
+    assert parquet['Tasa'].tolist() == [fila[1] for fila in cargadas] == ['0.5', '1.50', '0']
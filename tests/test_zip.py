@@ -0,0 +1,31 @@
+import json
+import zipfile
+
+# Un error inesperado al procesar un reporte en paralelo se registra como error de ese reporte: los demás se cargan y
+# el ZIP guarda sus métricas
+def test_error_en_un_hilo_no_detiene_el_zip(api, tmp_path, monkeypatch):
+    monkeypatch.setattr(api, 'reportes', ['PRUEBA', 'OTRO'])
+    monkeypatch.setattr(api, 'reportes_paralelos', 2)
+    monkeypatch.setattr(api, 'leer_zip_directo', True)
+    monkeypatch.setattr(api, 'conectar_pool', lambda *args: None)
+    monkeypatch.setattr(api, 'archivo_metricas', str(tmp_path / 'metricas.jsonl'))
+    monkeypatch.setattr(api, 'carpeta_prometheus', None)
+    monkeypatch.setitem(api.columnas_esperadas, 'OTRO', ['Cuenta', 'Saldo$'])
+
+    def procesar_reporte(conexion, reporte, *args):
+        if reporte == 'PRUEBA':
+            raise RuntimeError('falla inesperada')
+        return True
+    monkeypatch.setattr(api, 'procesar_reporte', procesar_reporte)
+
+    workng = tmp_path / '0001AA20240201.zip'
+    with zipfile.ZipFile(workng, 'w') as zip_ref:
+        zip_ref.writestr('PRUEBA.txt', 'Cuenta|Saldo$\n1|2\n')
+        zip_ref.writestr('OTRO.txt', 'Cuenta|Saldo$\n1|2\n')
+
+    assert api.procesar_zip(str(workng), str(tmp_path / 'sandbx')) == 1
+    with open(tmp_path / 'metricas.jsonl') as f:
+        registros = [json.loads(linea) for linea in f]
+    estados = {registro['reporte']: registro['estado'] for registro in registros if registro['tipo'] == 'reporte'}
+    assert estados == {'PRUEBA': 'error', 'OTRO': 'cargado'}
+    assert registros[-1]['errores'] == 1